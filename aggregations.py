@@ -0,0 +1,134 @@
+# aggregations.py
+"""Agrupamentos do resumo: totais por emitente, UF, mês, CFOP, NCM...
+
+Cada agrupamento de config.AGRUPAMENTOS_RESUMO é um groupby vetorizado do
+pandas sobre a tabela de notas ou de produtos: as colunas somadas são as
+de tipo 'moeda' no config.py, convertidas para número uma única vez, e o
+resultado é uma tabela pronta para gravação em uma aba própria.
+"""
+
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+
+from config import AGRUPAMENTOS_RESUMO, CAMPOS_DISPONIVEIS, CAMPOS_PRODUTOS
+from config import TIPOS_COLUNAS_NOTAS, TIPOS_COLUNAS_PRODUTOS
+from event_index import COLUNA_SITUACAO, SITUACAO_CANCELADA
+
+_CAMPOS_NOTAS = {campo_id: config for categoria in CAMPOS_DISPONIVEIS.values() for campo_id, config in categoria.items()}
+
+# Colunas de valor que não fazem sentido somadas (ex.: valor unitário)
+_NAO_TOTALIZAR = {
+    config['label'] for campos in (_CAMPOS_NOTAS, CAMPOS_PRODUTOS) for config in campos.values()
+    if config.get('totalizar') is False
+}
+
+# Por tabela: (campos, tipos das colunas, rótulo da contagem)
+_TABELAS = {
+    'notas': (_CAMPOS_NOTAS, TIPOS_COLUNAS_NOTAS, 'Quantidade de Notas'),
+    'produtos': (CAMPOS_PRODUTOS, TIPOS_COLUNAS_PRODUTOS, 'Quantidade de Itens'),
+}
+
+def _chave_grupo(serie, periodo):
+    """Valores do campo usados como chave do grupo ('' para ausentes)
+    
+    Datas tipadas viram períodos mensais, convertidos em texto só depois
+    do agrupamento (ver _texto_periodos), uma vez por grupo.
+    """
+    if periodo != 'mes':
+        return serie.where(serie.notna(), '')
+    
+    if is_datetime64_any_dtype(serie):
+        return serie.dt.to_period('M')
+    
+    # Texto ISO (AAAA-MM-DD...) do XML ou datetimes em coluna object
+    return serie.astype(str).str[:7].where(serie.notna(), '')
+
+def _texto_periodos(indice):
+    """Índice de períodos do agrupamento como texto AAAA-MM ('' para datas ausentes)"""
+    if not isinstance(indice, pd.PeriodIndex):
+        return indice
+    return pd.Index(['' if pd.isna(periodo) else str(periodo) for periodo in indice])
+
+def agrupar(df, agrupamento, valores=None):
+    """Aplica um agrupamento ao DataFrame; retorna (DataFrame, tipos das colunas) ou None
+    
+    valores, se informado, é o DataFrame numérico das colunas 'moeda' da
+    tabela (ver colunas_valor), para que vários agrupamentos da mesma
+    tabela reaproveitem a conversão. Retorna None se o campo do
+    agrupamento não estiver no DataFrame.
+    """
+    campos, tipos_colunas, rotulo_contagem = _TABELAS[agrupamento['tabela']]
+    config = campos[agrupamento['campo']]
+    rotulo = config['label']
+    if df.empty or rotulo not in df.columns:
+        return None
+    
+    if valores is None:
+        valores = colunas_valor(df, agrupamento['tabela'])
+    valores = valores.drop(columns=[rotulo], errors='ignore')
+    
+    periodo = agrupamento.get('periodo')
+    chave = _chave_grupo(df[rotulo], periodo)
+    grupos = valores.groupby(chave, sort=False, dropna=False)
+    
+    resultado = grupos.sum()
+    resultado.insert(0, rotulo_contagem, grupos.size())
+    
+    descricao = agrupamento.get('descricao')
+    rotulo_descricao = campos[descricao]['label'] if descricao else None
+    if rotulo_descricao in df.columns:
+        resultado.insert(0, rotulo_descricao, df[rotulo_descricao].groupby(chave, sort=False, dropna=False).first())
+    
+    resultado.index = _texto_periodos(resultado.index)
+    
+    # Ordena pelos grupos ou pela maior soma (a do valor total, se houver)
+    if agrupamento.get('ordem') == 'chave':
+        resultado = resultado.sort_index()
+    else:
+        coluna_ordem = 'Valor Total' if 'Valor Total' in valores.columns else rotulo_contagem
+        resultado = resultado.sort_values(coluna_ordem, ascending=False, kind='stable')
+    
+    rotulo_chave = f"Mês ({rotulo})" if periodo == 'mes' else rotulo
+    resultado = resultado.rename_axis(rotulo_chave).reset_index()
+    
+    tipos = {coluna: 'moeda' for coluna in valores.columns}
+    tipos[rotulo_contagem] = 'texto'
+    tipos[rotulo_chave] = 'texto' if periodo else config['tipo']
+    return resultado, tipos
+
+def colunas_valor(df, tabela):
+    """Colunas de tipo 'moeda' da tabela (exceto as não totalizáveis) convertidas para número"""
+    tipos_colunas = _TABELAS[tabela][1]
+    colunas = [coluna for coluna in df.columns
+               if tipos_colunas.get(coluna) == 'moeda' and coluna not in _NAO_TOTALIZAR]
+    return pd.DataFrame({coluna: pd.to_numeric(df[coluna], errors='coerce') for coluna in colunas}, index=df.index)
+
+def gerar_agrupamentos(df_notas, df_produtos, agrupamentos=AGRUPAMENTOS_RESUMO, excluir_canceladas=True):
+    """Aplica os agrupamentos e retorna [(aba, DataFrame, tipos das colunas)]
+    
+    Com excluir_canceladas, as notas com situação 'Cancelada' (ver
+    event_index) e os seus itens, ligados pela chave de acesso, ficam fora
+    dos agrupamentos.
+    """
+    tabelas = {'notas': df_notas, 'produtos': df_produtos}
+    
+    if excluir_canceladas and COLUNA_SITUACAO in df_notas.columns:
+        canceladas = df_notas[COLUNA_SITUACAO] == SITUACAO_CANCELADA
+        if canceladas.any():
+            tabelas['notas'] = df_notas[~canceladas]
+            if 'Chave de Acesso' in df_notas.columns and 'NF Chave' in df_produtos.columns:
+                chaves = set(df_notas.loc[canceladas, 'Chave de Acesso'])
+                tabelas['produtos'] = df_produtos[~df_produtos['NF Chave'].isin(chaves)]
+    
+    valores = {}
+    resultado = []
+    for agrupamento in agrupamentos:
+        tabela = agrupamento['tabela']
+        df = tabelas[tabela]
+        if tabela not in valores and not df.empty:
+            valores[tabela] = colunas_valor(df, tabela)
+        
+        agrupado = agrupar(df, agrupamento, valores.get(tabela))
+        if agrupado is not None:
+            resultado.append((agrupamento['aba'], *agrupado))
+    return resultado
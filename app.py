@@ -1,19 +1,359 @@
 # app.py
 """Aplicação principal - Conversor NF-e"""
 
+import threading
+
 import streamlit as st
 import pandas as pd
 from datetime import datetime
 
 # Imports dos módulos personalizados
 from config import PAGE_CONFIG, CAMPOS_DISPONIVEIS, CAMPOS_PRODUTOS, CAMPOS_PADRAO_NOTAS, CAMPOS_PADRAO_PRODUTOS
+from config import TIPOS_COLUNAS_NOTAS, TIPOS_COLUNAS_PRODUTOS
+from utils import formatar_dataframe
 from styles import get_custom_css, get_header_html, get_info_cards_html, get_metric_card_html, get_footer_html
 from file_processor import FileProcessor
+from streamlit_progress import ProgressoStreamlit
+from extraction_cache import CacheExtracao
 from excel_generator import ExcelGenerator
+from instrumentation import Metricas
+from results_cache import CacheResultados, chave_resultado, hash_arquivos
+from raw_store import ArmazemBruto, CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, projetar_documentos
+from document_types import ABAS_DOCUMENTOS, EVENTO, descrever_tipos
+from event_index import IndiceEventos, COLUNA_SITUACAO, SITUACAO_CANCELADA, SITUACAO_CANCELAMENTO_PENDENTE
+from note_store import BancoNotas
 
 # Configuração da página
 st.set_page_config(**PAGE_CONFIG)
 
+@st.cache_resource
+def obter_cache_extracao():
+    """Cache de extrações em disco, compartilhado entre sessões"""
+    return CacheExtracao()
+
+@st.cache_resource
+def obter_banco():
+    """Banco local de notas (SQLite), compartilhado entre sessões"""
+    return BancoNotas()
+
+@st.cache_resource
+def obter_cache_extracoes():
+    """Extrações brutas (todos os campos) por upload, compartilhadas entre sessões"""
+    return CacheResultados(max_entradas=4)
+
+@st.cache_resource
+def obter_cache_resultados():
+    """Resultados completos (DataFrames e planilhas), compartilhados entre sessões"""
+    return CacheResultados()
+
+def hash_upload(arquivos):
+    """Hash do conteúdo enviado, calculado uma única vez por upload na sessão"""
+    ids = tuple(getattr(arquivo, 'file_id', None) or id(arquivo) for arquivo in arquivos)
+    memorizado = st.session_state.get('hash_upload')
+    if memorizado is None or memorizado[0] != ids:
+        memorizado = (ids, hash_arquivos(arquivos))
+        st.session_state.hash_upload = memorizado
+    return memorizado[1]
+
+def obter_resultado(chave):
+    """Resultado já projetado: primeiro o da sessão, depois o compartilhado"""
+    if st.session_state.get('resultado_chave') == chave and 'resultado' in st.session_state:
+        return st.session_state.resultado
+    return obter_cache_resultados().obter(chave)
+
+def guardar_resultado(chave, resultado):
+    """Guarda o resultado na sessão e no cache compartilhado"""
+    st.session_state.resultado = resultado
+    st.session_state.resultado_chave = chave
+    obter_cache_resultados().gravar(chave, resultado)
+
+def obter_extracao(chave_upload):
+    """Extração bruta do upload: primeiro a da sessão, depois a compartilhada"""
+    if st.session_state.get('extracao_chave') == chave_upload and 'extracao' in st.session_state:
+        return st.session_state.extracao
+    return obter_cache_extracoes().obter(chave_upload)
+
+def guardar_extracao(chave_upload, extracao):
+    """Guarda a extração bruta na sessão e no cache compartilhado"""
+    st.session_state.extracao = extracao
+    st.session_state.extracao_chave = chave_upload
+    obter_cache_extracoes().gravar(chave_upload, extracao)
+
+def extrair_upload(arquivos, modo, eventos=()):
+    """Extrai todos os campos disponíveis dos arquivos enviados, uma única vez por upload
+    
+    eventos são os arquivos (XML ou ZIP) do envio separado de eventos de
+    cancelamento e carta de correção, processados pelo mesmo FileProcessor.
+    """
+    metricas = Metricas()
+    armazem = ArmazemBruto()
+    
+    # Catálogo completo e sem conversão: a seleção e a formatação vêm depois
+    processor = FileProcessor(
+        CAMPOS_TODOS_NOTAS,
+        CAMPOS_TODOS_PRODUTOS,
+        formatar=False,
+        callback_progresso=ProgressoStreamlit(),
+        cache=obter_cache_extracao(),
+        destino=armazem,
+        metricas=metricas
+    )
+    
+    if modo == 'zip':
+        processor.processar_zip(arquivos[0])
+    else:
+        processor.processar_arquivos_individuais(arquivos)
+    
+    for arquivo in eventos:
+        if arquivo.name.lower().endswith('.zip'):
+            processor.processar_zip(arquivo)
+    xmls_eventos = [arquivo for arquivo in eventos if not arquivo.name.lower().endswith('.zip')]
+    if xmls_eventos:
+        processor.processar_arquivos_individuais(xmls_eventos)
+    
+    # Índice montado uma vez por extração; as projeções só consultam
+    with metricas.medir('indice_eventos'):
+        indice = IndiceEventos(processor.documentos[EVENTO])
+    
+    return {
+        'armazem': armazem,
+        'indice_eventos': indice,
+        'documentos': processor.documentos,
+        'tipos': dict(processor.tipos),
+        'duplicadas': processor.duplicadas,
+        'metricas': metricas.relatorio(),
+    }
+
+def projetar_resultado(extracao, formatar):
+    """Monta os DataFrames dos campos selecionados a partir da extração bruta
+    
+    O resultado fica no cache compartilhado entre sessões: prévias,
+    planilhas e métricas só são alteradas com a trava do resultado.
+    """
+    metricas = Metricas()
+    metricas.mesclar(extracao['metricas'])
+    
+    with metricas.medir('projecao'):
+        df_notas, df_produtos = extracao['armazem'].projetar(
+            st.session_state.campos_selecionados_notas,
+            st.session_state.campos_selecionados_produtos,
+            formatar
+        )
+        documentos = projetar_documentos(extracao['documentos'], formatar)
+    
+    # Situação de cada nota pela chave de acesso bruta, selecionada ou não
+    armazem = extracao['armazem']
+    if extracao['indice_eventos'] and not df_notas.empty:
+        with metricas.medir('situacao'):
+            df_notas = extracao['indice_eventos'].aplicar(df_notas, armazem.notas['Chave de Acesso'])
+    
+    return {
+        'df_notas': df_notas,
+        'df_produtos': df_produtos,
+        'documentos': documentos,
+        'tipos': extracao['tipos'],
+        'duplicadas': extracao['duplicadas'],
+        'metricas': metricas,
+        'previas': {},
+        'planilhas': {},
+        'trava': threading.Lock(),
+    }
+
+def obter_previa(resultado, tabela, tipos_colunas, formatar):
+    """DataFrame formatado para exibição, gerado uma vez por resultado
+    
+    tabela é 'notas', 'produtos' ou um tipo de documento (ex.: 'cte').
+    """
+    if tabela in resultado['documentos']:
+        df = resultado['documentos'][tabela]
+    else:
+        df = resultado[f'df_{tabela}']
+    if not formatar:
+        return df
+    
+    with resultado['trava']:
+        if tabela not in resultado['previas']:
+            with resultado['metricas'].medir('formatacao_preview'):
+                resultado['previas'][tabela] = formatar_dataframe(df, tipos_colunas)
+        return resultado['previas'][tabela]
+
+def obter_planilha(resultado, incluir_resumo, formatar, excluir_canceladas):
+    """Bytes do Excel, gerados uma vez por resultado e opções do resumo"""
+    opcoes = (incluir_resumo, excluir_canceladas)
+    with resultado['trava']:
+        if opcoes not in resultado['planilhas']:
+            excel_gen = ExcelGenerator(streaming=True, metricas=resultado['metricas'])
+            excel_file = excel_gen.criar_excel(resultado['df_notas'], resultado['df_produtos'], incluir_resumo,
+                                               formatar, resultado['duplicadas'], resultado['documentos'],
+                                               excluir_canceladas)
+            resultado['planilhas'][opcoes] = excel_file.getvalue()
+        return resultado['planilhas'][opcoes]
+
+def exibir_resultado(resultado, formatar, incluir_resumo, excluir_canceladas):
+    """Mostra métricas, prévias e o botão de download de um resultado"""
+    df_notas = resultado['df_notas']
+    df_produtos = resultado['df_produtos']
+    documentos = resultado['documentos']
+    
+    if df_notas.empty and not documentos:
+        st.error("❌ Nenhum dado foi extraído dos arquivos XML.")
+        return
+    
+    st.success("✅ Processamento concluído com sucesso!")
+    if resultado['tipos']:
+        st.info(f"📑 Documentos recebidos: {descrever_tipos(resultado['tipos'])}.")
+    if resultado['duplicadas']:
+        st.info(f"♻️ {resultado['duplicadas']} nota(s) duplicada(s) descartada(s) pela chave de acesso.")
+    
+    # Notas consideradas nos valores dos cartões
+    df_validas = df_notas
+    if COLUNA_SITUACAO in df_notas.columns:
+        canceladas = df_notas[COLUNA_SITUACAO] == SITUACAO_CANCELADA
+        if canceladas.any():
+            aviso = " (fora dos totais)" if excluir_canceladas else ""
+            st.info(f"🚫 {int(canceladas.sum())} nota(s) cancelada(s){aviso}.")
+        pendentes = int((df_notas[COLUNA_SITUACAO] == SITUACAO_CANCELAMENTO_PENDENTE).sum())
+        if pendentes:
+            st.info(f"⏳ {pendentes} nota(s) com pedido de cancelamento sem retorno da SEFAZ (mantidas nos totais).")
+        if excluir_canceladas:
+            df_validas = df_notas[~canceladas]
+    
+    # Exibe métricas
+    st.markdown("<br>", unsafe_allow_html=True)
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.markdown(get_metric_card_html(len(df_notas), "Notas Fiscais"), unsafe_allow_html=True)
+    with col2:
+        st.markdown(get_metric_card_html(len(df_produtos), "Produtos"), unsafe_allow_html=True)
+    with col3:
+        if 'Valor Total' in df_notas.columns:
+            total = pd.to_numeric(df_validas['Valor Total'], errors='coerce').sum()
+            if formatar:
+                valor_formatado = f"R$ {total:,.0f}".replace(',', '.')
+            else:
+                valor_formatado = f"R$ {total:,.0f}"
+            st.markdown(get_metric_card_html(valor_formatado, "Valor Total"), unsafe_allow_html=True)
+        else:
+            st.markdown(get_metric_card_html("-", "Valor Total"), unsafe_allow_html=True)
+    with col4:
+        if 'Valor Total' in df_notas.columns:
+            media = pd.to_numeric(df_validas['Valor Total'], errors='coerce').mean()
+            if formatar:
+                valor_formatado = f"R$ {media:,.0f}".replace(',', '.')
+            else:
+                valor_formatado = f"R$ {media:,.0f}"
+            st.markdown(get_metric_card_html(valor_formatado, "Valor Médio"), unsafe_allow_html=True)
+        else:
+            st.markdown(get_metric_card_html("-", "Valor Médio"), unsafe_allow_html=True)
+    
+    st.markdown("<br><br>", unsafe_allow_html=True)
+    
+    # Preview dos dados; CT-e e eventos ganham abas próprias quando presentes
+    tipos_documentos = [tipo for tipo in ABAS_DOCUMENTOS if tipo in documentos]
+    tab1, tab2, *tabs_documentos = st.tabs(
+        ["📋 Notas Fiscais", "📦 Produtos"] + [f"🗂️ {ABAS_DOCUMENTOS[tipo][0]}" for tipo in tipos_documentos]
+    )
+    
+    with tab1:
+        st.dataframe(obter_previa(resultado, 'notas', TIPOS_COLUNAS_NOTAS, formatar), use_container_width=True, height=400)
+    
+    with tab2:
+        if not df_produtos.empty:
+            st.dataframe(obter_previa(resultado, 'produtos', TIPOS_COLUNAS_PRODUTOS, formatar),
+                         use_container_width=True, height=400)
+        else:
+            st.info("Nenhum campo de produto foi selecionado.")
+    
+    for tipo, tab in zip(tipos_documentos, tabs_documentos):
+        with tab:
+            st.dataframe(obter_previa(resultado, tipo, ABAS_DOCUMENTOS[tipo][1], formatar),
+                         use_container_width=True, height=400)
+    
+    # Gera arquivo Excel (uma vez; reruns reaproveitam os bytes)
+    excel_bytes = obter_planilha(resultado, incluir_resumo, formatar, excluir_canceladas)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.download_button(
+            label="📥 BAIXAR PLANILHA EXCEL",
+            data=excel_bytes,
+            file_name=f"TRR_Notas_Fiscais_{timestamp}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True
+        )
+    
+    with resultado['trava']:
+        relatorio = resultado['metricas'].relatorio()
+    exibir_metricas(relatorio)
+
+def gravar_no_banco(chave_upload):
+    """Grava no banco local as notas e eventos da extração do upload, só os ainda não gravados"""
+    extracao = obter_extracao(chave_upload)
+    if extracao is None:
+        st.warning("⚠️ A extração deste envio não está mais em memória; processe os arquivos novamente.")
+        return
+    
+    banco = obter_banco()
+    ignoradas = banco.ignoradas
+    with st.spinner("🗄️ Gravando no banco local..."):
+        gravadas = banco.importar(extracao['armazem'], extracao['documentos'][EVENTO])
+        banco.salvar()
+    st.success(f"🗄️ {gravadas} nota(s) gravada(s) no banco local; "
+               f"{banco.ignoradas - ignoradas} já estavam gravadas ({len(banco)} no total).")
+
+def exibir_consulta_banco(formatar, incluir_resumo, excluir_canceladas):
+    """Filtros de consulta ao banco local e download da planilha montada a partir dele"""
+    banco = obter_banco()
+    with st.expander(f"🗄️ Banco local ({len(banco)} nota(s) gravada(s))"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            emitente = st.text_input("CNPJ do emitente", key='banco_emitente')
+            destinatario = st.text_input("CNPJ/CPF do destinatário", key='banco_destinatario')
+        with col2:
+            desde = st.date_input("Emitidas desde", value=None, format="DD/MM/YYYY", key='banco_desde')
+            ate = st.date_input("Emitidas até", value=None, format="DD/MM/YYYY", key='banco_ate')
+        with col3:
+            cfop = st.text_input("CFOP dos itens", key='banco_cfop')
+        
+        if not st.button("🔎 Gerar planilha do banco", key='banco_consultar'):
+            return
+        
+        with st.spinner("🔎 Consultando o banco local..."):
+            df_notas, df_produtos = banco.projetar(
+                st.session_state.campos_selecionados_notas,
+                st.session_state.campos_selecionados_produtos,
+                formatar, emitente=emitente, destinatario=destinatario, desde=desde, ate=ate, cfop=cfop
+            )
+        
+        if df_notas.empty:
+            st.warning("⚠️ Nenhuma nota do banco atende aos filtros.")
+            return
+        
+        excel_gen = ExcelGenerator(streaming=True, metricas=Metricas())
+        excel_file = excel_gen.criar_excel(df_notas, df_produtos, incluir_resumo, formatar,
+                                           excluir_canceladas=excluir_canceladas)
+        st.success(f"✅ {len(df_notas)} nota(s) e {len(df_produtos)} produto(s) encontrados.")
+        st.download_button(
+            label="📥 BAIXAR PLANILHA DO BANCO",
+            data=excel_file.getvalue(),
+            file_name=f"TRR_Notas_Fiscais_Banco_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True
+        )
+
+def exibir_metricas(relatorio):
+    """Mostra o tempo por etapa e os contadores do processamento (relatório de Metricas)"""
+    with st.expander("⏱️ Métricas de desempenho"):
+        etapas = pd.DataFrame.from_dict(relatorio['etapas'], orient='index')
+        if not etapas.empty:
+            etapas = etapas.sort_values('segundos', ascending=False)
+            etapas['segundos'] = etapas['segundos'].round(3)
+            st.dataframe(etapas, use_container_width=True)
+        st.json(relatorio['contadores'])
+
 # Aplica CSS customizado
 st.markdown(get_custom_css(), unsafe_allow_html=True)
 
@@ -26,12 +366,14 @@ with st.sidebar:
     - Arquivo ZIP com múltiplos XMLs
     - Arquivos XML individuais
     - Padrão NF-e nacional
+    - NFC-e, CT-e e eventos (cancelamento, CC-e)
     
     **📊 Funcionalidades:**
     - Seleção personalizada de campos
     - Formatação automática de dados
     - Exportação para Excel organizado
     - Resumos estatísticos
+    - Banco local para consultas entre envios
     """)
 
 # Header personalizado (sem logo)
@@ -54,7 +396,7 @@ st.markdown("<br>", unsafe_allow_html=True)
 st.markdown("---")
 st.markdown("## ⚙️ Configurações")
 
-col1, col2 = st.columns(2)
+col1, col2, col3 = st.columns(3)
 
 with col1:
     formatar_dados = st.checkbox(
@@ -70,6 +412,13 @@ with col2:
         help="Adiciona uma aba com totalizadores e estatísticas no Excel"
     )
 
+with col3:
+    excluir_canceladas = st.checkbox(
+        "✅ Excluir notas canceladas dos totais",
+        value=True,
+        help="Notas com evento de cancelamento no envio ficam fora dos totais do resumo e dos cartões"
+    )
+
 st.markdown("---")
 
 # ========== SELEÇÃO DE CAMPOS NA TELA PRINCIPAL ==========
@@ -117,8 +466,11 @@ if 'campos_selecionados_produtos' not in st.session_state:
 
 campos_selecionados_produtos = []
 
-# Divide produtos em 2 colunas
-campos_produtos_list = list(CAMPOS_PRODUTOS.items())
+# Divide produtos em 2 colunas; os tributos do item (det/imposto) ficam em um grupo à parte
+campos_produtos_list = [(campo_id, config) for campo_id, config in CAMPOS_PRODUTOS.items()
+                        if not config['path'].startswith('imposto/')]
+campos_impostos_list = [(campo_id, config) for campo_id, config in CAMPOS_PRODUTOS.items()
+                        if config['path'].startswith('imposto/')]
 metade = len(campos_produtos_list) // 2
 
 col1, col2 = st.columns(2)
@@ -137,6 +489,14 @@ with col2:
             if st.checkbox(config['label'], value=is_checked, key=f"prod_{campo_id}"):
                 campos_selecionados_produtos.append(campo_id)
 
+with st.expander("🧾 Tributos do Item (ICMS, IPI, PIS e COFINS)"):
+    colunas_impostos = st.columns(4)
+    for posicao, (campo_id, config) in enumerate(campos_impostos_list):
+        with colunas_impostos[posicao % 4]:
+            is_checked = campo_id in st.session_state.campos_selecionados_produtos
+            if st.checkbox(config['label'], value=is_checked, key=f"prod_{campo_id}"):
+                campos_selecionados_produtos.append(campo_id)
+
 st.session_state.campos_selecionados_produtos = campos_selecionados_produtos
 
 st.markdown("---")
@@ -166,92 +526,7 @@ if "🗜️" in upload_option:
         type=['zip'],
         help="Selecione um arquivo ZIP que contenha os XMLs"
     )
-    
-    if uploaded_zip:
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            if st.button("🚀 PROCESSAR ARQUIVOS", use_container_width=True):
-                with st.spinner("⚙️ Processando arquivos..."):
-                    # Cria processador com campos selecionados
-                    processor = FileProcessor(
-                        st.session_state.campos_selecionados_notas,
-                        st.session_state.campos_selecionados_produtos,
-                        formatar_dados
-                    )
-                    
-                    notas_data, produtos_data = processor.processar_zip(uploaded_zip)
-                    
-                    if notas_data:
-                        df_notas = pd.DataFrame(notas_data)
-                        df_produtos = pd.DataFrame(produtos_data)
-                        
-                        st.success("✅ Processamento concluído com sucesso!")
-                        
-                        # Exibe métricas
-                        st.markdown("<br>", unsafe_allow_html=True)
-                        col1, col2, col3, col4 = st.columns(4)
-                        
-                        with col1:
-                            st.markdown(get_metric_card_html(len(df_notas), "Notas Fiscais"), unsafe_allow_html=True)
-                        with col2:
-                            st.markdown(get_metric_card_html(len(df_produtos), "Produtos"), unsafe_allow_html=True)
-                        with col3:
-                            if 'Valor Total' in df_notas.columns:
-                                if formatar_dados:
-                                    valores = df_notas['Valor Total'].str.replace('R$ ', '').str.replace('.', '').str.replace(',', '.')
-                                    total = valores.astype(float).sum()
-                                    valor_formatado = f"R$ {total:,.0f}".replace(',', '.')
-                                else:
-                                    total = df_notas['Valor Total'].astype(float).sum()
-                                    valor_formatado = f"R$ {total:,.0f}"
-                                st.markdown(get_metric_card_html(valor_formatado, "Valor Total"), unsafe_allow_html=True)
-                            else:
-                                st.markdown(get_metric_card_html("-", "Valor Total"), unsafe_allow_html=True)
-                        with col4:
-                            if 'Valor Total' in df_notas.columns:
-                                if formatar_dados:
-                                    valores = df_notas['Valor Total'].str.replace('R$ ', '').str.replace('.', '').str.replace(',', '.')
-                                    media = valores.astype(float).mean()
-                                    valor_formatado = f"R$ {media:,.0f}".replace(',', '.')
-                                else:
-                                    media = df_notas['Valor Total'].astype(float).mean()
-                                    valor_formatado = f"R$ {media:,.0f}"
-                                st.markdown(get_metric_card_html(valor_formatado, "Valor Médio"), unsafe_allow_html=True)
-                            else:
-                                st.markdown(get_metric_card_html("-", "Valor Médio"), unsafe_allow_html=True)
-                        
-                        st.markdown("<br><br>", unsafe_allow_html=True)
-                        
-                        # Preview dos dados
-                        tab1, tab2 = st.tabs(["📋 Notas Fiscais", "📦 Produtos"])
-                        
-                        with tab1:
-                            st.dataframe(df_notas, use_container_width=True, height=400)
-                        
-                        with tab2:
-                            if not df_produtos.empty:
-                                st.dataframe(df_produtos, use_container_width=True, height=400)
-                            else:
-                                st.info("Nenhum campo de produto foi selecionado.")
-                        
-                        # Gera arquivo Excel
-                        excel_gen = ExcelGenerator()
-                        excel_file = excel_gen.criar_excel(df_notas, df_produtos, incluir_resumo)
-                        
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        
-                        col1, col2, col3 = st.columns([1, 2, 1])
-                        with col2:
-                            st.download_button(
-                                label="📥 BAIXAR PLANILHA EXCEL",
-                                data=excel_file,
-                                file_name=f"TRR_Notas_Fiscais_{timestamp}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                use_container_width=True
-                            )
-                    else:
-                        st.error("❌ Nenhum dado foi extraído dos arquivos XML.")
-
+    arquivos_enviados = [uploaded_zip] if uploaded_zip else []
 else:
     uploaded_files = st.file_uploader(
         "Envie os arquivos XML das notas fiscais",
@@ -259,92 +534,64 @@ else:
         accept_multiple_files=True,
         help="Selecione um ou mais arquivos XML"
     )
+    arquivos_enviados = uploaded_files or []
+    
+    if arquivos_enviados:
+        st.info(f"📊 **{len(arquivos_enviados)}** arquivo(s) selecionado(s)")
+
+# Eventos também podem vir no mesmo ZIP/XMLs das notas
+eventos_enviados = st.file_uploader(
+    "Eventos de cancelamento e carta de correção (opcional)",
+    type=['xml', 'zip'],
+    accept_multiple_files=True,
+    key='uploader_eventos',
+    help="XMLs procEventoNFe ou ZIPs com eles; a situação de cada nota sai da chave de acesso"
+) or []
+
+if arquivos_enviados:
+    modo = 'zip' if "🗜️" in upload_option else 'xml'
+    chave_upload = chave_resultado(
+        hash_upload(arquivos_enviados + eventos_enviados),
+        modo=modo,
+        eventos=[arquivo.name for arquivo in eventos_enviados]
+    )
+    chave = chave_resultado(
+        chave_upload,
+        campos_notas=st.session_state.campos_selecionados_notas,
+        campos_produtos=st.session_state.campos_selecionados_produtos,
+        formatar=formatar_dados
+    )
     
-    if uploaded_files:
-        st.info(f"📊 **{len(uploaded_files)}** arquivo(s) selecionado(s)")
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        processar = st.button("🚀 PROCESSAR ARQUIVOS", use_container_width=True)
+    
+    if processar:
+        st.session_state.upload_processado = chave_upload
+    
+    # Depois do primeiro processamento, mudar campos ou formatação só
+    # reprojeta a extração bruta; reruns reexibem o resultado (ex.: após o download)
+    if st.session_state.get('upload_processado') == chave_upload:
+        resultado = obter_resultado(chave)
+        if resultado is None:
+            extracao = obter_extracao(chave_upload)
+            if extracao is None:
+                with st.spinner("⚙️ Processando arquivos..."):
+                    extracao = extrair_upload(arquivos_enviados, modo, eventos_enviados)
+                guardar_extracao(chave_upload, extracao)
+            resultado = projetar_resultado(extracao, formatar_dados)
+            guardar_resultado(chave, resultado)
+        
+        exibir_resultado(resultado, formatar_dados, incluir_resumo, excluir_canceladas)
         
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            if st.button("🚀 PROCESSAR ARQUIVOS", use_container_width=True):
-                with st.spinner("⚙️ Processando arquivos..."):
-                    processor = FileProcessor(
-                        st.session_state.campos_selecionados_notas,
-                        st.session_state.campos_selecionados_produtos,
-                        formatar_dados
-                    )
-                    
-                    notas_data, produtos_data = processor.processar_arquivos_individuais(uploaded_files)
-                    
-                    if notas_data:
-                        df_notas = pd.DataFrame(notas_data)
-                        df_produtos = pd.DataFrame(produtos_data)
-                        
-                        st.success("✅ Processamento concluído com sucesso!")
-                        
-                        # Métricas
-                        st.markdown("<br>", unsafe_allow_html=True)
-                        col1, col2, col3, col4 = st.columns(4)
-                        
-                        with col1:
-                            st.markdown(get_metric_card_html(len(df_notas), "Notas Fiscais"), unsafe_allow_html=True)
-                        with col2:
-                            st.markdown(get_metric_card_html(len(df_produtos), "Produtos"), unsafe_allow_html=True)
-                        with col3:
-                            if 'Valor Total' in df_notas.columns:
-                                if formatar_dados:
-                                    valores = df_notas['Valor Total'].str.replace('R$ ', '').str.replace('.', '').str.replace(',', '.')
-                                    total = valores.astype(float).sum()
-                                    valor_formatado = f"R$ {total:,.0f}".replace(',', '.')
-                                else:
-                                    total = df_notas['Valor Total'].astype(float).sum()
-                                    valor_formatado = f"R$ {total:,.0f}"
-                                st.markdown(get_metric_card_html(valor_formatado, "Valor Total"), unsafe_allow_html=True)
-                            else:
-                                st.markdown(get_metric_card_html("-", "Valor Total"), unsafe_allow_html=True)
-                        with col4:
-                            if 'Valor Total' in df_notas.columns:
-                                if formatar_dados:
-                                    valores = df_notas['Valor Total'].str.replace('R$ ', '').str.replace('.', '').str.replace(',', '.')
-                                    media = valores.astype(float).mean()
-                                    valor_formatado = f"R$ {media:,.0f}".replace(',', '.')
-                                else:
-                                    media = df_notas['Valor Total'].astype(float).mean()
-                                    valor_formatado = f"R$ {media:,.0f}"
-                                st.markdown(get_metric_card_html(valor_formatado, "Valor Médio"), unsafe_allow_html=True)
-                            else:
-                                st.markdown(get_metric_card_html("-", "Valor Médio"), unsafe_allow_html=True)
-                        
-                        st.markdown("<br><br>", unsafe_allow_html=True)
-                        
-                        # Preview
-                        tab1, tab2 = st.tabs(["📋 Notas Fiscais", "📦 Produtos"])
-                        
-                        with tab1:
-                            st.dataframe(df_notas, use_container_width=True, height=400)
-                        
-                        with tab2:
-                            if not df_produtos.empty:
-                                st.dataframe(df_produtos, use_container_width=True, height=400)
-                            else:
-                                st.info("Nenhum campo de produto foi selecionado.")
-                        
-                        # Gera Excel
-                        excel_gen = ExcelGenerator()
-                        excel_file = excel_gen.criar_excel(df_notas, df_produtos, incluir_resumo)
-                        
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        
-                        col1, col2, col3 = st.columns([1, 2, 1])
-                        with col2:
-                            st.download_button(
-                                label="📥 BAIXAR PLANILHA EXCEL",
-                                data=excel_file,
-                                file_name=f"TRR_Notas_Fiscais_{timestamp}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                use_container_width=True
-                            )
-                    else:
-                        st.error("❌ Nenhum dado foi extraído dos arquivos XML.")
+            if st.button("🗄️ GRAVAR NO BANCO LOCAL", use_container_width=True,
+                         help="Guarda as notas deste envio para consultas futuras, sem duplicar as já gravadas"):
+                gravar_no_banco(chave_upload)
+
+st.markdown("<br>", unsafe_allow_html=True)
+exibir_consulta_banco(formatar_dados, incluir_resumo, excluir_canceladas)
 
 # Footer
 st.markdown("<br><br>", unsafe_allow_html=True)
@@ -0,0 +1,269 @@
+# benchmark.py
+"""Medição de desempenho da extração, do processamento de ZIPs e da geração do Excel
+
+Cada cenário roda em um processo separado. A memória comparada é a da
+etapa medida: o pico durante a etapa menos a memória residente no seu
+início, sem os imports, o corpus pré-carregado ou a extração que antecede
+o Excel. No Linux o pico é zerado no início da etapa (/proc/self/clear_refs);
+nos demais sistemas vale o quanto a etapa elevou o pico do processo. Os
+corpora sintéticos (ver synthetic_nfe.py) são gerados uma vez e
+reaproveitados entre execuções.
+
+Exemplos:
+    python benchmark.py --tamanhos 1000 10000 --salvar baseline.json
+    python benchmark.py --tamanhos 1000 10000 --comparar baseline.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from config import CAMPOS_PADRAO_NOTAS, CAMPOS_PADRAO_PRODUTOS
+from synthetic_nfe import gravar_zip, VARIANTES
+
+CENARIOS = ['extracao', 'zip', 'excel']
+TAMANHOS_PADRAO = [1000, 10000, 100000]
+
+# Variações de memória da etapa abaixo disso (em MB) não contam como regressão
+MEMORIA_MINIMA_MB = 5.0
+
+def _status_proc_mb(campo):
+    """Campo de memória de /proc/self/status (ex.: VmRSS) em MB, ou None fora do Linux"""
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith(campo + ':'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _memoria_pico_mb():
+    """Pico de memória residente do processo atual, em MB (None se indisponível)"""
+    pico = _status_proc_mb('VmHWM')
+    if pico is not None:
+        return pico
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+def _iniciar_medicao_memoria():
+    """Zera o pico de memória, se possível, e retorna a base da etapa em MB
+    
+    No Linux a base é a memória residente atual e o pico passa a contar a
+    partir daqui; nos demais sistemas, é o pico até aqui.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return _memoria_pico_mb()
+    return _status_proc_mb('VmRSS')
+
+def _cenario_extracao(caminho_zip, workers):
+    """Parse + extração de XMLs já em memória, sem ZIP nem pool (MB/s dos XMLs descompactados)"""
+    from xml_extractor import NFeExtractor
+    
+    with zipfile.ZipFile(caminho_zip) as z:
+        conteudos = [(nome, z.read(nome)) for nome in z.namelist()]
+    
+    extractor = NFeExtractor(CAMPOS_PADRAO_NOTAS, CAMPOS_PADRAO_PRODUTOS)
+    base = _iniciar_medicao_memoria()
+    inicio = time.perf_counter()
+    
+    notas = itens = 0
+    for nome, conteudo in conteudos:
+        dados, produtos = extractor.extrair_nota_completa(conteudo, nome)
+        notas += dados is not None
+        itens += len(produtos)
+    
+    segundos = time.perf_counter() - inicio
+    return segundos, notas, itens, base, sum(len(conteudo) for _, conteudo in conteudos)
+
+def _cenario_zip(caminho_zip, workers):
+    """FileProcessor.processar_zip sobre o ZIP em disco (MB/s do ZIP)"""
+    from file_processor import FileProcessor
+    
+    processor = FileProcessor(CAMPOS_PADRAO_NOTAS, CAMPOS_PADRAO_PRODUTOS, workers=workers)
+    base = _iniciar_medicao_memoria()
+    inicio = time.perf_counter()
+    
+    notas, produtos = processor.processar_zip(caminho_zip)
+    
+    return time.perf_counter() - inicio, len(notas), len(produtos), base, os.path.getsize(caminho_zip)
+
+def _cenario_excel(caminho_zip, workers):
+    """Geração do workbook (modo streaming) a partir das notas extraídas (MB/s do .xlsx gravado)"""
+    from columnar import AcumuladorColunar
+    from file_processor import FileProcessor
+    from excel_generator import ExcelGenerator
+    
+    acumulador = AcumuladorColunar()
+    FileProcessor(CAMPOS_PADRAO_NOTAS, CAMPOS_PADRAO_PRODUTOS, workers=workers,
+                  destino=acumulador).processar_zip(caminho_zip)
+    df_notas, df_produtos = acumulador.dataframes()
+    del acumulador
+    
+    base = _iniciar_medicao_memoria()
+    inicio = time.perf_counter()
+    
+    excel_file = ExcelGenerator(streaming=True).criar_excel(df_notas, df_produtos)
+    
+    # Aqui MB/s é a taxa de gravação do workbook
+    return time.perf_counter() - inicio, len(df_notas), len(df_produtos), base, excel_file.getbuffer().nbytes
+
+_FUNCOES_CENARIOS = {
+    'extracao': _cenario_extracao,
+    'zip': _cenario_zip,
+    'excel': _cenario_excel,
+}
+
+def _executar_no_processo(cenario, caminho_zip, workers, fila):
+    """Executa um cenário no processo filho e devolve as medições pela fila"""
+    try:
+        segundos, notas, itens, base, tamanho = _FUNCOES_CENARIOS[cenario](caminho_zip, workers)
+        pico = _memoria_pico_mb()
+        fila.put({
+            'segundos': segundos,
+            'notas': notas,
+            'itens': itens,
+            'notas_por_s': notas / segundos if segundos else 0.0,
+            'itens_por_s': itens / segundos if segundos else 0.0,
+            'mb_por_s': tamanho / (1024 * 1024) / segundos if segundos else 0.0,
+            'memoria_base_mb': base,
+            'pico_memoria_mb': pico,
+            'memoria_etapa_mb': pico - base if pico is not None and base is not None else None,
+        })
+    except Exception as e:
+        fila.put({'erro': f"{type(e).__name__}: {e}"})
+
+def executar_cenario(cenario, caminho_zip, workers=1):
+    """Executa um cenário em um processo novo e retorna o dict de medições"""
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    processo = contexto.Process(target=_executar_no_processo, args=(cenario, caminho_zip, workers, fila))
+    processo.start()
+    resultado = fila.get()
+    processo.join()
+    return resultado
+
+def obter_corpus(diretorio, notas, itens, variante):
+    """Caminho do ZIP sintético com os parâmetros informados, gerando-o se necessário"""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"corpus_{notas}_{itens}_{variante}.zip")
+    if not os.path.exists(caminho):
+        print(f"🔧 Gerando corpus de {notas} nota(s) em {caminho}...", file=sys.stderr)
+        temporario = caminho + '.tmp'
+        gravar_zip(temporario, notas, itens, variante)
+        os.replace(temporario, caminho)
+    return caminho
+
+def comparar(resultados, baseline, tolerancia):
+    """Compara tempo e memória da etapa com um baseline e retorna as regressões encontradas
+    
+    Aumentos de memória menores que MEMORIA_MINIMA_MB não contam, para que
+    etapas que quase não alocam não acusem variações relativas grandes.
+    """
+    regressoes = []
+    for chave, atual in resultados.items():
+        anterior = baseline.get('resultados', {}).get(chave)
+        if not anterior or 'erro' in atual or 'erro' in anterior:
+            continue
+        
+        for metrica in ('segundos', 'memoria_etapa_mb'):
+            if not anterior.get(metrica) or atual.get(metrica) is None:
+                continue
+            variacao = atual[metrica] / anterior[metrica] - 1
+            print(f"  {chave:<20} {metrica:<16} {anterior[metrica]:>10.2f} → {atual[metrica]:>10.2f} ({variacao:+.1%})")
+            if metrica == 'memoria_etapa_mb' and atual[metrica] - anterior[metrica] < MEMORIA_MINIMA_MB:
+                continue
+            if variacao > tolerancia:
+                regressoes.append(f"{chave} {metrica} {variacao:+.1%}")
+    
+    return regressoes
+
+def criar_parser():
+    """Cria o parser de argumentos do benchmark"""
+    parser = argparse.ArgumentParser(description="Mede o desempenho do conversor com um corpus sintético de NF-e.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO, help="Quantidades de notas")
+    parser.add_argument('--cenarios', nargs='+', choices=CENARIOS, default=CENARIOS, help="Cenários a medir")
+    parser.add_argument('--itens', type=int, default=5, help="Itens (det) por nota")
+    parser.add_argument('--variante', choices=list(VARIANTES) + ['misto'], default='misto',
+                        help="Variante dos XMLs sintéticos")
+    parser.add_argument('--workers', type=int, default=1, help="Processos usados nos cenários zip e excel")
+    parser.add_argument('--repeticoes', type=int, default=1, help="Execuções de cada cenário; vale a mais rápida")
+    parser.add_argument('--diretorio-corpus', default=os.path.join(tempfile.gettempdir(), 'nfe_benchmark'),
+                        help="Onde os corpora sintéticos são guardados")
+    parser.add_argument('--salvar', metavar='ARQUIVO', help="Grava os resultados como baseline (JSON)")
+    parser.add_argument('--comparar', metavar='ARQUIVO', help="Compara os resultados com um baseline salvo")
+    parser.add_argument('--tolerancia', type=float, default=0.10,
+                        help="Piora relativa aceita antes de acusar regressão (padrão: 0.10)")
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    
+    resultados = {}
+    print(f"{'cenário':<20} {'segundos':>9} {'notas/s':>10} {'itens/s':>11} {'MB/s':>7} {'etapa MB':>9} {'pico MB':>9}")
+    for notas in args.tamanhos:
+        caminho_zip = obter_corpus(args.diretorio_corpus, notas, args.itens, args.variante)
+        for cenario in args.cenarios:
+            chave = f"{cenario}/{notas}"
+            # Com repetições, fica a execução mais rápida (a menos afetada por ruído)
+            execucoes = [executar_cenario(cenario, caminho_zip, args.workers) for _ in range(max(1, args.repeticoes))]
+            resultado = min(execucoes, key=lambda execucao: execucao.get('segundos', float('inf')))
+            resultados[chave] = resultado
+            
+            if 'erro' in resultado:
+                print(f"{chave:<20} ❌ {resultado['erro']}")
+                continue
+            
+            etapa = resultado['memoria_etapa_mb']
+            pico = resultado['pico_memoria_mb']
+            print(f"{chave:<20} {resultado['segundos']:>9.2f} {resultado['notas_por_s']:>10.0f} "
+                  f"{resultado['itens_por_s']:>11.0f} {resultado['mb_por_s']:>7.1f} "
+                  f"{etapa if etapa is not None else float('nan'):>9.1f} "
+                  f"{pico if pico is not None else float('nan'):>9.1f}")
+    
+    if args.salvar:
+        with open(args.salvar, 'w', encoding='utf-8') as f:
+            json.dump({
+                'data': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'plataforma': platform.platform(),
+                'parametros': {
+                    'itens': args.itens, 'variante': args.variante,
+                    'workers': args.workers, 'repeticoes': args.repeticoes,
+                },
+                'resultados': resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"💾 Baseline gravado em {args.salvar}", file=sys.stderr)
+    
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nComparação com {args.comparar} ({baseline.get('data', '?')}):")
+        regressoes = comparar(resultados, baseline, args.tolerancia)
+        if regressoes:
+            print(f"❌ {len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}: {'; '.join(regressoes)}")
+            return 1
+        print("✅ Nenhuma regressão acima da tolerância.")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
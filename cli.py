@@ -0,0 +1,316 @@
+# cli.py
+"""Conversão de NF-e em lote pela linha de comando, sem a interface Streamlit
+
+Exemplos:
+    python cli.py notas_janeiro.zip xmls/ -o janeiro.xlsx --workers 8
+    python cli.py trimestre/*.zip --formato parquet -o dw/trimestre
+    python cli.py notas_janeiro.zip --banco
+    python cli.py --banco --consulta --emitente 12.345.678/0001-95 --desde 2024-01-01 -o fornecedor.xlsx
+"""
+
+import argparse
+import json
+import os
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+
+import pandas as pd
+
+from config import CAMPOS_DISPONIVEIS, CAMPOS_PRODUTOS, CAMPOS_PADRAO_NOTAS, CAMPOS_PADRAO_PRODUTOS
+from columnar import AcumuladorColunar
+from document_types import ABAS_DOCUMENTOS, EVENTO, descrever_tipos
+from event_index import IndiceEventos
+from file_processor import FileProcessor, descrever_progresso
+from excel_generator import ExcelGenerator
+from extraction_cache import CacheExtracao, CAMINHO_CACHE_PADRAO, TAMANHO_MAXIMO_PADRAO
+from exporters import ExportadorCSV, ExportadorParquet
+from instrumentation import Metricas, perfilar, resumo_perfil
+from note_store import BancoNotas, CAMINHO_BANCO_PADRAO
+from raw_store import CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS
+
+FORMATOS_SAIDA = ['xlsx', 'csv', 'csv.gz', 'parquet']
+
+def _lista_campos(valor):
+    """Converte 'campo1,campo2' em lista de campos"""
+    return [campo.strip() for campo in valor.split(',') if campo.strip()]
+
+def _validar_campos(parser, campos, disponiveis, opcao):
+    """Encerra com erro se algum campo não existir no catálogo"""
+    invalidos = [campo for campo in campos if campo not in disponiveis]
+    if invalidos:
+        parser.error(f"{opcao}: campo(s) desconhecido(s): {', '.join(invalidos)}")
+
+def _imprimir_progresso(evento):
+    """Reporta o andamento do FileProcessor no stderr"""
+    tipo = evento['evento']
+    if tipo == 'progresso':
+        print(f"\r🔄 {descrever_progresso(evento)}\033[K", end='', file=sys.stderr, flush=True)
+    elif tipo == 'fim':
+        print(file=sys.stderr)
+    elif tipo == 'aviso':
+        print(evento['mensagem'], file=sys.stderr)
+
+def criar_parser():
+    """Cria o parser de argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(
+        description="Converte XMLs de NF-e (arquivos, diretórios ou ZIPs) em planilha Excel."
+    )
+    parser.add_argument('entradas', nargs='*', help="Arquivos ZIP, arquivos XML ou diretórios com XMLs")
+    parser.add_argument('-o', '--saida',
+                        help="Arquivo .xlsx de saída, ou prefixo dos arquivos de notas e produtos nos demais "
+                             "formatos (padrão: TRR_Notas_Fiscais_<data>)")
+    parser.add_argument('--formato', choices=FORMATOS_SAIDA, default='xlsx',
+                        help="Formato de saída; csv, csv.gz e parquet são gravados em blocos, sem limite de linhas "
+                             "(com --banco, só xlsx)")
+    parser.add_argument('--campos-notas', type=_lista_campos, default=CAMPOS_PADRAO_NOTAS,
+                        help="Campos das notas separados por vírgula, ou 'todos'")
+    parser.add_argument('--campos-produtos', type=_lista_campos, default=CAMPOS_PADRAO_PRODUTOS,
+                        help="Campos dos produtos separados por vírgula, 'todos' ou '' para nenhum")
+    parser.add_argument('--sem-formatacao', action='store_true', help="Não aplica formatação brasileira aos dados")
+    parser.add_argument('--sem-resumo', action='store_true', help="Não inclui a aba de resumo estatístico")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Processos usados na extração dos XMLs (padrão: número de CPUs)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Parse incremental dos XMLs, para notas com muitos itens")
+    parser.add_argument('--cache', nargs='?', const=CAMINHO_CACHE_PADRAO, metavar='CAMINHO',
+                        help=f"Reaproveita extrações de XMLs já processados (padrão: {CAMINHO_CACHE_PADRAO})")
+    parser.add_argument('--cache-tamanho-mb', type=int, default=TAMANHO_MAXIMO_PADRAO // (1024 * 1024),
+                        help="Tamanho máximo do cache em MB")
+    parser.add_argument('--banco', nargs='?', const=CAMINHO_BANCO_PADRAO, metavar='CAMINHO',
+                        help="Importa as entradas para o banco SQLite local, só as notas ainda não gravadas, sem "
+                             f"gerar planilha (padrão: {CAMINHO_BANCO_PADRAO})")
+    parser.add_argument('--substituir', action='store_true',
+                        help="Com --banco, regrava as notas já existentes no banco")
+    parser.add_argument('--consulta', action='store_true',
+                        help="Gera a planilha a partir das notas do --banco que atendem aos filtros abaixo")
+    parser.add_argument('--emitente', metavar='CNPJ', help="Com --consulta, só as notas deste emitente")
+    parser.add_argument('--destinatario', metavar='CNPJ_CPF', help="Com --consulta, só as notas deste destinatário")
+    parser.add_argument('--desde', metavar='AAAA-MM-DD', help="Com --consulta, notas emitidas a partir da data")
+    parser.add_argument('--ate', metavar='AAAA-MM-DD', help="Com --consulta, notas emitidas até a data (inclusive)")
+    parser.add_argument('--cfop', help="Com --consulta, só os itens deste CFOP (e as notas que os contêm)")
+    parser.add_argument('--incluir-canceladas', action='store_true',
+                        help="Soma as notas canceladas (por eventos de cancelamento nas entradas) aos totais do resumo")
+    parser.add_argument('--manter-duplicadas', action='store_true',
+                        help="Não descarta cópias da mesma NF-e (mesma chave de acesso)")
+    parser.add_argument('--metricas', metavar='ARQUIVO',
+                        help="Grava o relatório de tempo por etapa e contadores em JSON ('-' para o stderr)")
+    parser.add_argument('--perfil', metavar='ARQUIVO',
+                        help="Captura um perfil cProfile da execução e grava as estatísticas no arquivo")
+    parser.add_argument('-q', '--silencioso', action='store_true', help="Não exibe o andamento")
+    return parser
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    
+    campos_config_notas = {}
+    for categoria in CAMPOS_DISPONIVEIS.values():
+        campos_config_notas.update(categoria)
+    
+    campos_notas = list(campos_config_notas) if args.campos_notas == ['todos'] else args.campos_notas
+    campos_produtos = list(CAMPOS_PRODUTOS) if args.campos_produtos == ['todos'] else args.campos_produtos
+    _validar_campos(parser, campos_notas, campos_config_notas, '--campos-notas')
+    _validar_campos(parser, campos_produtos, CAMPOS_PRODUTOS, '--campos-produtos')
+    
+    if not campos_notas:
+        parser.error("selecione pelo menos um campo das notas fiscais")
+    
+    if args.consulta and not args.banco:
+        parser.error("--consulta requer --banco")
+    if args.banco and args.formato != 'xlsx':
+        parser.error("--formato não se aplica a --banco: a importação grava só no banco e --consulta gera xlsx")
+    if not args.entradas and not args.consulta:
+        parser.error("informe as entradas, ou --banco com --consulta")
+    
+    for opcao in ('desde', 'ate'):
+        valor = getattr(args, opcao)
+        if valor:
+            try:
+                datetime.strptime(valor, '%Y-%m-%d')
+            except ValueError:
+                parser.error(f"--{opcao}: data inválida '{valor}' (use AAAA-MM-DD)")
+    
+    cache = CacheExtracao(args.cache, args.cache_tamanho_mb * 1024 * 1024) if args.cache else None
+    
+    saida = args.saida or f"TRR_Notas_Fiscais_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    exportador = None
+    if args.formato != 'xlsx':
+        prefixo = saida
+        for extensao in ('.xlsx', '.csv.gz', '.csv', '.parquet'):
+            if prefixo.endswith(extensao):
+                prefixo = prefixo[:-len(extensao)]
+                break
+        
+        if args.formato == 'parquet':
+            try:
+                exportador = ExportadorParquet(prefixo, tipado=not args.sem_formatacao)
+            except ImportError as e:
+                parser.error(str(e))
+        else:
+            exportador = ExportadorCSV(prefixo, compactar=args.formato == 'csv.gz')
+    
+    metricas = Metricas()
+    with perfilar(args.perfil) if args.perfil else nullcontext() as perfil:
+        if args.banco:
+            codigo = _usar_banco(args, campos_notas, campos_produtos, cache, metricas, saida)
+        else:
+            codigo = _converter(args, campos_notas, campos_produtos, cache, exportador, metricas, saida)
+    
+    if args.metricas:
+        relatorio = json.dumps(metricas.relatorio(), ensure_ascii=False, indent=2)
+        if args.metricas == '-':
+            print(relatorio, file=sys.stderr)
+        else:
+            with open(args.metricas, 'w', encoding='utf-8') as f:
+                f.write(relatorio)
+    
+    if perfil is not None:
+        print(resumo_perfil(perfil), file=sys.stderr)
+        print(f"🔬 Perfil gravado em {args.perfil}", file=sys.stderr)
+    
+    return codigo
+
+def _usar_banco(args, campos_notas, campos_produtos, cache, metricas, saida):
+    """Importa as entradas para o banco e, com --consulta, gera a planilha a partir dele"""
+    banco = BancoNotas(args.banco, somente_novas=not args.substituir)
+    try:
+        if args.entradas:
+            processor = FileProcessor(
+                CAMPOS_TODOS_NOTAS,
+                CAMPOS_TODOS_PRODUTOS,
+                False,
+                streaming=args.streaming,
+                workers=args.workers,
+                callback_progresso=None if args.silencioso else _imprimir_progresso,
+                cache=cache,
+                deduplicar=not args.manter_duplicadas,
+                destino=banco,
+                metricas=metricas,
+                chaves_existentes=None if args.substituir else banco
+            )
+            
+            processor.processar_caminhos(args.entradas)
+            with metricas.medir('banco_gravacao'):
+                eventos = banco.adicionar_eventos(processor.documentos[EVENTO])
+                banco.salvar()
+            
+            if processor.tipos:
+                print(f"📑 Documentos: {descrever_tipos(processor.tipos)}", file=sys.stderr)
+            if processor.existentes or banco.ignoradas:
+                print(f"♻️ {processor.existentes + banco.ignoradas} nota(s) já gravada(s) no banco", file=sys.stderr)
+            if banco.sem_chave:
+                print(f"⚠️ {banco.sem_chave} nota(s) sem chave de acesso não gravada(s)", file=sys.stderr)
+            
+            estatisticas = banco.estatisticas()
+            print(f"🗄️ {banco.gravadas} nota(s) e {eventos} evento(s) gravados em {args.banco} "
+                  f"({estatisticas['notas']} nota(s) no banco)", file=sys.stderr)
+        
+        if not args.consulta:
+            return 0
+        
+        with metricas.medir('banco_consulta'):
+            df_notas, df_produtos = banco.projetar(
+                campos_notas, campos_produtos, not args.sem_formatacao, emitente=args.emitente,
+                destinatario=args.destinatario, desde=args.desde, ate=args.ate, cfop=args.cfop
+            )
+    finally:
+        banco.fechar()
+        if cache is not None:
+            cache.fechar()
+    
+    if df_notas.empty:
+        print("❌ Nenhuma nota do banco atende aos filtros.", file=sys.stderr)
+        return 1
+    
+    excel_gen = ExcelGenerator(streaming=True, metricas=metricas)
+    excel_file = excel_gen.criar_excel(df_notas, df_produtos, not args.sem_resumo, not args.sem_formatacao,
+                                       excluir_canceladas=not args.incluir_canceladas)
+    
+    if not saida.endswith('.xlsx'):
+        saida += '.xlsx'
+    with metricas.medir('gravacao_arquivo'):
+        with open(saida, 'wb') as f:
+            f.write(excel_file.getvalue())
+    
+    print(f"✅ {len(df_notas)} nota(s) e {len(df_produtos)} produto(s) do banco gravados em {saida}", file=sys.stderr)
+    return 0
+
+def _converter(args, campos_notas, campos_produtos, cache, exportador, metricas, saida):
+    """Processa as entradas e grava a saída; retorna o código de saída"""
+    # Para o Excel, as notas são acumuladas em colunas até a montagem dos DataFrames
+    acumulador = AcumuladorColunar() if exportador is None else None
+    
+    processor = FileProcessor(
+        campos_notas,
+        campos_produtos,
+        not args.sem_formatacao,
+        streaming=args.streaming,
+        workers=args.workers,
+        callback_progresso=None if args.silencioso else _imprimir_progresso,
+        cache=cache,
+        deduplicar=not args.manter_duplicadas,
+        destino=exportador or acumulador,
+        metricas=metricas
+    )
+    
+    processor.processar_caminhos(args.entradas)
+    
+    if cache is not None:
+        estatisticas = cache.estatisticas()
+        cache.fechar()
+        print(f"💾 Cache: {estatisticas['acertos']} acerto(s), {estatisticas['falhas']} falha(s) "
+              f"({estatisticas['taxa_acerto']:.0%})", file=sys.stderr)
+    
+    if processor.tipos:
+        print(f"📑 Documentos: {descrever_tipos(processor.tipos)}", file=sys.stderr)
+    
+    if processor.duplicadas:
+        print(f"♻️ {processor.duplicadas} nota(s) duplicada(s) descartada(s)", file=sys.stderr)
+    
+    documentos = {tipo: pd.DataFrame(registros) for tipo, registros in processor.documentos.items() if registros}
+    
+    if exportador is not None:
+        if documentos:
+            print("ℹ️ CT-e, eventos e a situação das notas são gravados apenas no formato xlsx", file=sys.stderr)
+        with metricas.medir('exportacao_fechamento'):
+            exportador.fechar()
+        if not exportador.total_notas:
+            print("❌ Nenhum dado foi extraído dos arquivos XML.", file=sys.stderr)
+            return 1
+        
+        print(f"✅ {exportador.total_notas} nota(s) e {exportador.total_produtos} produto(s) gravados em "
+              f"{', '.join(exportador.arquivos)}", file=sys.stderr)
+        return 0
+    
+    if not acumulador.total_notas and not documentos:
+        print("❌ Nenhum dado foi extraído dos arquivos XML.", file=sys.stderr)
+        return 1
+    
+    with metricas.medir('dataframe'):
+        df_notas, df_produtos = acumulador.dataframes()
+    
+    # Situação das notas pelos eventos de cancelamento e carta de correção recebidos
+    if processor.documentos[EVENTO] and not df_notas.empty:
+        if 'Chave de Acesso' in df_notas.columns:
+            with metricas.medir('situacao'):
+                df_notas = IndiceEventos(processor.documentos[EVENTO]).aplicar(df_notas)
+        else:
+            print("⚠️ Inclua o campo 'chave' para aplicar os eventos às notas", file=sys.stderr)
+    
+    excel_gen = ExcelGenerator(streaming=True, metricas=metricas)
+    excel_file = excel_gen.criar_excel(df_notas, df_produtos, not args.sem_resumo, not args.sem_formatacao,
+                                       processor.duplicadas, documentos, not args.incluir_canceladas)
+    
+    if not saida.endswith('.xlsx'):
+        saida += '.xlsx'
+    with metricas.medir('gravacao_arquivo'):
+        with open(saida, 'wb') as f:
+            f.write(excel_file.getvalue())
+    
+    extras = ''.join(f", {len(df)} {ABAS_DOCUMENTOS[tipo][0]}" for tipo, df in documentos.items())
+    print(f"✅ {len(df_notas)} nota(s) e {len(df_produtos)} produto(s){extras} gravados em {saida}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
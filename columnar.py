@@ -0,0 +1,87 @@
+# columnar.py
+"""Acúmulo de notas e produtos em colunas, sem uma lista de dicts por linha
+
+Cada campo vira uma lista; as colunas de referência à nota repetidas em
+todo produto ('NF Número', 'NF Chave', 'Arquivo') são guardadas uma vez
+por nota e expandidas só na montagem do DataFrame.
+
+Exemplo:
+    acumulador = AcumuladorColunar()
+    FileProcessor(campos_notas, campos_produtos, destino=acumulador).processar_zip(arquivo)
+    df_notas, df_produtos = acumulador.dataframes()
+"""
+
+import pandas as pd
+
+# Colunas dos produtos com o mesmo valor para todos os itens de uma nota
+COLUNAS_REFERENCIA = ('NF Número', 'NF Chave', 'Arquivo')
+
+class AcumuladorColunar:
+    """Colunas de notas e produtos, com as referências à nota guardadas uma vez por nota
+    
+    Recebe as notas pelo mesmo protocolo dos exportadores (adicionar/fechar),
+    podendo ser usado como destino de um FileProcessor.
+    """
+    
+    def __init__(self):
+        self.notas = {}
+        self.produtos = {}
+        self.referencias = {}
+        self.itens_por_nota = []
+        self.colunas_produtos = []
+        self.total_notas = 0
+        self.total_produtos = 0
+    
+    def adicionar(self, dados_nota, produtos):
+        """Acrescenta uma nota e seus produtos às colunas"""
+        self._acrescentar(self.notas, dados_nota)
+        self.total_notas += 1
+        
+        if not produtos:
+            return
+        
+        if not self.colunas_produtos:
+            self.colunas_produtos = list(produtos[0])
+        
+        # Referências: o valor do primeiro item vale para toda a nota
+        for label, valor in produtos[0].items():
+            if label in COLUNAS_REFERENCIA:
+                self._coluna_nova(self.referencias, label).append(valor)
+        self.itens_por_nota.append(len(produtos))
+        
+        for label in self.colunas_produtos:
+            if label not in COLUNAS_REFERENCIA:
+                self._coluna_nova(self.produtos, label).extend(produto.get(label) for produto in produtos)
+        self.total_produtos += len(produtos)
+    
+    def _coluna_nova(self, colunas, label):
+        coluna = colunas.get(label)
+        if coluna is None:
+            coluna = colunas[label] = []
+        return coluna
+    
+    def _acrescentar(self, colunas, linha):
+        for label, valor in linha.items():
+            self._coluna_nova(colunas, label).append(valor)
+    
+    def fechar(self):
+        """Sem efeito; mantido para uso como destino de um FileProcessor"""
+    
+    def expandir(self, valores_por_nota):
+        """Repete cada valor por nota pela quantidade de itens da nota"""
+        expandida = []
+        for valor, quantidade in zip(valores_por_nota, self.itens_por_nota):
+            expandida.extend([valor] * quantidade)
+        return expandida
+    
+    def coluna_produtos(self, label):
+        """Coluna de produtos com uma linha por item (referências já expandidas)"""
+        if label in self.referencias:
+            return self.expandir(self.referencias[label])
+        return self.produtos[label]
+    
+    def dataframes(self):
+        """Monta (df_notas, df_produtos), iguais aos de pd.DataFrame sobre as listas de dicts"""
+        df_notas = pd.DataFrame(self.notas)
+        df_produtos = pd.DataFrame({label: self.coluna_produtos(label) for label in self.colunas_produtos})
+        return df_notas, df_produtos
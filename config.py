@@ -70,9 +70,113 @@ CAMPOS_PRODUTOS = {
     "cfop": {"label": "CFOP", "path": "prod/CFOP", "tipo": "texto"},
     "unidade": {"label": "Unidade", "path": "prod/uCom", "tipo": "texto"},
     "quantidade": {"label": "Quantidade", "path": "prod/qCom", "tipo": "numero"},
-    "valor_unitario": {"label": "Valor Unitário", "path": "prod/vUnCom", "tipo": "moeda"},
+    "valor_unitario": {"label": "Valor Unitário", "path": "prod/vUnCom", "tipo": "moeda", "totalizar": False},
     "valor_total": {"label": "Valor Total", "path": "prod/vProd", "tipo": "moeda"},
     "ean": {"label": "EAN", "path": "prod/cEAN", "tipo": "texto"},
+    # Tributos do item (det/imposto); ICMS*, IPI*, PIS* e COFINS* casam com o
+    # grupo presente na nota (ICMS00, ICMS10, ICMSSN102, IPITrib, PISAliq...)
+    "icms_cst": {"label": "CST/CSOSN ICMS", "path": "imposto/ICMS/ICMS*/CST|imposto/ICMS/ICMS*/CSOSN", "tipo": "texto"},
+    "icms_base": {"label": "BC ICMS", "path": "imposto/ICMS/ICMS*/vBC", "tipo": "moeda"},
+    "icms_aliquota": {"label": "Alíquota ICMS", "path": "imposto/ICMS/ICMS*/pICMS", "tipo": "numero"},
+    "icms_valor": {"label": "Valor ICMS", "path": "imposto/ICMS/ICMS*/vICMS", "tipo": "moeda"},
+    "icms_st_base": {"label": "BC ICMS ST", "path": "imposto/ICMS/ICMS*/vBCST", "tipo": "moeda"},
+    "icms_st_aliquota": {"label": "Alíquota ICMS ST", "path": "imposto/ICMS/ICMS*/pICMSST", "tipo": "numero"},
+    "icms_st_valor": {"label": "Valor ICMS ST", "path": "imposto/ICMS/ICMS*/vICMSST", "tipo": "moeda"},
+    "ipi_cst": {"label": "CST IPI", "path": "imposto/IPI/IPI*/CST", "tipo": "texto"},
+    "ipi_base": {"label": "BC IPI", "path": "imposto/IPI/IPITrib/vBC", "tipo": "moeda"},
+    "ipi_aliquota": {"label": "Alíquota IPI", "path": "imposto/IPI/IPITrib/pIPI", "tipo": "numero"},
+    "ipi_valor": {"label": "Valor IPI", "path": "imposto/IPI/IPITrib/vIPI", "tipo": "moeda"},
+    "pis_cst": {"label": "CST PIS", "path": "imposto/PIS/PIS*/CST", "tipo": "texto"},
+    "pis_base": {"label": "BC PIS", "path": "imposto/PIS/PIS*/vBC", "tipo": "moeda"},
+    "pis_aliquota": {"label": "Alíquota PIS", "path": "imposto/PIS/PIS*/pPIS", "tipo": "numero"},
+    "pis_valor": {"label": "Valor PIS", "path": "imposto/PIS/PIS*/vPIS", "tipo": "moeda"},
+    "cofins_cst": {"label": "CST COFINS", "path": "imposto/COFINS/COFINS*/CST", "tipo": "texto"},
+    "cofins_base": {"label": "BC COFINS", "path": "imposto/COFINS/COFINS*/vBC", "tipo": "moeda"},
+    "cofins_aliquota": {"label": "Alíquota COFINS", "path": "imposto/COFINS/COFINS*/pCOFINS", "tipo": "numero"},
+    "cofins_valor": {"label": "Valor COFINS", "path": "imposto/COFINS/COFINS*/vCOFINS", "tipo": "moeda"},
+}
+
+# Campos dos CT-e (infCte), um registro por conhecimento
+CAMPOS_CTE = {
+    "numero": {"label": "Número CT-e", "path": "ide/nCT", "tipo": "texto"},
+    "serie": {"label": "Série", "path": "ide/serie", "tipo": "texto"},
+    "data_emissao": {"label": "Data Emissão", "path": "ide/dhEmi", "tipo": "data"},
+    "chave": {"label": "Chave de Acesso", "path": "@Id", "tipo": "texto"},
+    "modelo": {"label": "Modelo", "path": "ide/mod", "tipo": "texto"},
+    "cfop": {"label": "CFOP", "path": "ide/CFOP", "tipo": "texto"},
+    "natureza_operacao": {"label": "Natureza da Operação", "path": "ide/natOp", "tipo": "texto"},
+    "modal": {"label": "Modal", "path": "ide/modal", "tipo": "texto"},
+    "uf_inicio": {"label": "UF Início", "path": "ide/UFIni", "tipo": "texto"},
+    "municipio_inicio": {"label": "Município Início", "path": "ide/xMunIni", "tipo": "texto"},
+    "uf_fim": {"label": "UF Fim", "path": "ide/UFFim", "tipo": "texto"},
+    "municipio_fim": {"label": "Município Fim", "path": "ide/xMunFim", "tipo": "texto"},
+    "emit_cnpj": {"label": "CNPJ Emitente", "path": "emit/CNPJ", "tipo": "cnpj"},
+    "emit_nome": {"label": "Nome Emitente", "path": "emit/xNome", "tipo": "texto"},
+    "rem_cnpj_cpf": {"label": "CNPJ/CPF Remetente", "path": "rem/CNPJ|rem/CPF", "tipo": "cnpj_cpf"},
+    "rem_nome": {"label": "Nome Remetente", "path": "rem/xNome", "tipo": "texto"},
+    "dest_cnpj_cpf": {"label": "CNPJ/CPF Destinatário", "path": "dest/CNPJ|dest/CPF", "tipo": "cnpj_cpf"},
+    "dest_nome": {"label": "Nome Destinatário", "path": "dest/xNome", "tipo": "texto"},
+    "valor_prestacao": {"label": "Valor Prestação", "path": "vPrest/vTPrest", "tipo": "moeda"},
+    "valor_receber": {"label": "Valor a Receber", "path": "vPrest/vRec", "tipo": "moeda"},
+    "valor_icms": {"label": "Valor ICMS", "path": "imp/ICMS/ICMS*/vICMS", "tipo": "moeda"},
+    "valor_carga": {"label": "Valor Carga", "path": "infCTeNorm/infCarga/vCarga", "tipo": "moeda"},
+}
+
+# Campos dos eventos (procEventoNFe/procEventoCTe): os do infEvento do
+# evento e os do infEvento do retorno (retEvento), quando houver
+CAMPOS_EVENTO = {
+    "chave": {"label": "Chave de Acesso", "path": "chNFe|chCTe", "tipo": "texto"},
+    "tipo_evento": {"label": "Tipo Evento", "path": "tpEvento", "tipo": "texto"},
+    "descricao": {"label": "Descrição Evento", "path": "detEvento/descEvento", "tipo": "texto"},
+    "sequencia": {"label": "Sequência", "path": "nSeqEvento", "tipo": "texto"},
+    "data_evento": {"label": "Data Evento", "path": "dhEvento", "tipo": "data"},
+    "autor_cnpj_cpf": {"label": "CNPJ/CPF Autor", "path": "CNPJ|CPF", "tipo": "cnpj_cpf"},
+    "protocolo_nota": {"label": "Protocolo da Nota", "path": "detEvento/nProt", "tipo": "texto"},
+    "justificativa": {"label": "Justificativa", "path": "detEvento/xJust", "tipo": "texto"},
+    "correcao": {"label": "Correção", "path": "detEvento/xCorrecao", "tipo": "texto"},
+}
+
+CAMPOS_RETORNO_EVENTO = {
+    "status": {"label": "Status Retorno", "path": "cStat", "tipo": "texto"},
+    "motivo": {"label": "Motivo Retorno", "path": "xMotivo", "tipo": "texto"},
+    "protocolo": {"label": "Protocolo Evento", "path": "nProt", "tipo": "texto"},
+    "data_registro": {"label": "Data Registro", "path": "dhRegEvento", "tipo": "data"},
+}
+
+# Agrupamentos gravados junto com o resumo, um por aba: soma das colunas de
+# valor (tipo 'moeda', exceto campos com "totalizar": False) da tabela e
+# contagem de linhas por valor do campo.
+# "descricao" acrescenta o primeiro valor de outro campo a cada grupo;
+# "periodo": "mes" agrupa datas por AAAA-MM; "ordem": "chave" ordena pelos
+# grupos em vez de pelo maior valor. Agrupamentos cujo campo não foi
+# selecionado são omitidos.
+AGRUPAMENTOS_RESUMO = [
+    {"aba": "Resumo por Emitente", "tabela": "notas", "campo": "emit_cnpj", "descricao": "emit_nome"},
+    {"aba": "Resumo por UF Destino", "tabela": "notas", "campo": "dest_uf"},
+    {"aba": "Resumo por Mês", "tabela": "notas", "campo": "data_emissao", "periodo": "mes", "ordem": "chave"},
+    {"aba": "Resumo por CFOP", "tabela": "produtos", "campo": "cfop"},
+    {"aba": "Resumo por NCM", "tabela": "produtos", "campo": "ncm"},
+]
+
+# Tipo de cada coluna exportada, indexado pelo label do campo
+TIPOS_COLUNAS_NOTAS = {
+    config['label']: config['tipo']
+    for categoria in CAMPOS_DISPONIVEIS.values()
+    for config in categoria.values()
+}
+
+TIPOS_COLUNAS_PRODUTOS = {
+    config['label']: config['tipo'] for config in CAMPOS_PRODUTOS.values()
+}
+
+TIPOS_COLUNAS_CTE = {
+    config['label']: config['tipo'] for config in CAMPOS_CTE.values()
+}
+
+TIPOS_COLUNAS_EVENTOS = {
+    config['label']: config['tipo']
+    for campos in (CAMPOS_EVENTO, CAMPOS_RETORNO_EVENTO)
+    for config in campos.values()
 }
 
 # Campos padrão selecionados
@@ -0,0 +1,123 @@
+# document_types.py
+"""Identificação do tipo de documento fiscal pelos bytes iniciais do XML
+
+Antes da extração, cada XML é classificado sem parse, por expressões
+regulares sobre o início do arquivo (o mesmo trecho lido para a chave de
+acesso): NF-e (modelo 55), NFC-e (modelo 65), CT-e e eventos
+(cancelamento, carta de correção...). O DespachanteDocumentos encaminha
+cada tipo ao seu extrator; os de tipo não reconhecido são descartados. Um
+XML de raiz desconhecida maior que o trecho inicial é lido por inteiro
+antes do descarte (ver FileProcessor._triar), pois um envelope pode trazer
+o infNFe além dos primeiros bytes.
+"""
+
+import re
+
+from config import TIPOS_COLUNAS_CTE, TIPOS_COLUNAS_EVENTOS
+from xml_extractor import CTeExtractor, EventoExtractor, ler_chave_acesso
+
+# Tipos de documento
+NFE = 'nfe'
+NFCE = 'nfce'
+CTE = 'cte'
+EVENTO = 'evento'
+OUTRO = 'outro'
+
+# Tipos extraídos pelo NFeExtractor, com notas e produtos
+TIPOS_NOTA = (NFE, NFCE)
+
+# Tipos com um registro por documento, gravados em abas próprias
+TIPOS_DOCUMENTO = (CTE, EVENTO)
+
+NOMES_TIPOS = {
+    NFE: 'NF-e',
+    NFCE: 'NFC-e',
+    CTE: 'CT-e',
+    EVENTO: 'Eventos',
+    OUTRO: 'Não reconhecidos',
+}
+
+# Aba do Excel e tipos das colunas de cada tipo de documento
+ABAS_DOCUMENTOS = {
+    CTE: ('CT-e', TIPOS_COLUNAS_CTE),
+    EVENTO: ('Eventos', TIPOS_COLUNAS_EVENTOS),
+}
+
+# Elemento raiz -> tipo
+_RAIZES = {
+    b'nfeProc': NFE,
+    b'NFe': NFE,
+    b'infNFe': NFE,
+    b'enviNFe': NFE,
+    b'cteProc': CTE,
+    b'CTe': CTE,
+    b'CTeOS': CTE,
+    b'cteOSProc': CTE,
+    b'infCte': CTE,
+    b'procEventoNFe': EVENTO,
+    b'evento': EVENTO,
+    b'procEventoCTe': EVENTO,
+    b'eventoCTe': EVENTO,
+    b'infEvento': EVENTO,
+}
+
+_RE_PROLOGO = re.compile(rb'<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>', re.S)
+_RE_RAIZ = re.compile(rb'<(?:[\w.-]+:)?([A-Za-z_][\w.-]*)')
+_RE_MODELO = re.compile(rb'<(?:[\w.-]+:)?mod>\s*(\d{2})\s*<')
+_RE_INF_NFE = re.compile(rb'<(?:[\w.-]+:)?infNFe\b')
+
+def identificar_tipo(inicio):
+    """Identifica o tipo do documento (NFE, NFCE, CTE, EVENTO ou OUTRO) pelos bytes iniciais
+    
+    O tipo vem do elemento raiz; o modelo da nota (55 ou 65), da chave de
+    acesso ou da tag mod. Raízes desconhecidas com um infNFe no trecho
+    contam como NF-e. Retorna None se a raiz não estiver nos bytes
+    informados (ex.: prólogo muito longo).
+    """
+    texto = _RE_PROLOGO.sub(b'', inicio)
+    raiz = _RE_RAIZ.search(texto)
+    if raiz is None or b'<!--' in texto[:raiz.start()]:
+        return None
+    
+    tipo = _RAIZES.get(raiz.group(1))
+    if tipo is None:
+        tipo = NFE if _RE_INF_NFE.search(texto) else OUTRO
+    
+    if tipo != NFE:
+        return tipo
+    
+    # Dígitos 21 e 22 da chave de acesso: modelo do documento
+    chave, _ = ler_chave_acesso(texto)
+    if chave is not None:
+        modelo = chave[20:22]
+    else:
+        encontrado = _RE_MODELO.search(texto)
+        modelo = encontrado.group(1).decode('ascii') if encontrado else '55'
+    return NFCE if modelo == '65' else NFE
+
+def descrever_tipos(tipos):
+    """Texto com a contagem por tipo, ex.: '120 NF-e, 3 NFC-e, 2 CT-e'"""
+    return ', '.join(f"{tipos[tipo]} {nome}" for tipo, nome in NOMES_TIPOS.items() if tipos.get(tipo))
+
+class DespachanteDocumentos:
+    """Encaminha cada documento ao extrator do seu tipo
+    
+    NF-e e NFC-e vão para o NFeExtractor informado; CT-e e eventos, para
+    extratores criados com a mesma formatação, métricas e backend de parse.
+    """
+    
+    def __init__(self, extractor_nfe):
+        self.extractor_nfe = extractor_nfe
+        self.extratores = {
+            CTE: CTeExtractor(formatar=extractor_nfe.formatar, metricas=extractor_nfe.metricas,
+                              backend=extractor_nfe.backend),
+            EVENTO: EventoExtractor(formatar=extractor_nfe.formatar, metricas=extractor_nfe.metricas,
+                                    backend=extractor_nfe.backend),
+        }
+    
+    def extrair(self, tipo, conteudo, arquivo_nome=''):
+        """Retorna (registro, produtos) do documento; só notas têm produtos"""
+        extrator = self.extratores.get(tipo)
+        if extrator is None:
+            return self.extractor_nfe.extrair_nota_completa(conteudo, arquivo_nome)
+        return extrator.extrair(conteudo, arquivo_nome), []
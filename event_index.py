@@ -0,0 +1,107 @@
+# event_index.py
+"""Índice de eventos (cancelamento e carta de correção) por chave de acesso
+
+Os registros de evento extraídos pelo EventoExtractor (ver
+document_types) são indexados em um dict pela chave de acesso; a situação
+de cada nota é então obtida com uma consulta por nota, em uma única
+passada sobre as chaves, qualquer que seja o número de eventos.
+
+Exemplo:
+    indice = IndiceEventos(processor.documentos['evento'])
+    df_notas = indice.aplicar(df_notas)
+"""
+
+# Tipos de evento (tpEvento)
+EVENTOS_CANCELAMENTO = ('110111', '110112')
+EVENTO_CARTA_CORRECAO = '110110'
+
+# Status de retorno (cStat) de evento registrado
+STATUS_EVENTO_REGISTRADO = ('135', '136', '155')
+
+# Colunas acrescentadas às notas
+COLUNA_SITUACAO = 'Situação'
+COLUNA_CARTAS_CORRECAO = 'Cartas de Correção'
+
+SITUACAO_AUTORIZADA = 'Autorizada'
+SITUACAO_CANCELADA = 'Cancelada'
+SITUACAO_CANCELAMENTO_PENDENTE = 'Cancelamento pendente'
+
+class IndiceEventos:
+    """Cancelamentos e cartas de correção por chave de acesso
+    
+    Só eventos com retorno de registro (STATUS_EVENTO_REGISTRADO) cancelam a
+    nota ou contam como carta de correção. Pedidos de cancelamento sem
+    retorno ficam em cancelamentos_pendentes: a nota sai com a situação
+    'Cancelamento pendente' e continua nos totais do resumo.
+    """
+    
+    def __init__(self, registros=()):
+        self.canceladas = set()
+        self.cancelamentos_pendentes = set()
+        self.cartas_correcao = {}
+        self._vistos = set()
+        self._pendentes = set()
+        for registro in registros:
+            self.adicionar(registro)
+    
+    def __len__(self):
+        return len(self._vistos) + len(self._pendentes)
+    
+    def adicionar(self, registro):
+        """Indexa um registro de evento; cópias do mesmo evento contam uma vez
+        
+        Aceita registros tipados ou em texto bruto (formatar=False). Eventos
+        rejeitados pela SEFAZ (retorno com outro cStat) são ignorados; eventos
+        sem retorno só contam como cancelamento pendente.
+        """
+        chave = registro.get('Chave de Acesso') or ''
+        tipo = registro.get('Tipo Evento') or ''
+        status = registro.get('Status Retorno') or ''
+        if not chave:
+            return
+        
+        evento = (chave, tipo, registro.get('Sequência') or '')
+        if not status:
+            if tipo in EVENTOS_CANCELAMENTO:
+                self._pendentes.add(evento)
+                self.cancelamentos_pendentes.add(chave)
+            return
+        if status not in STATUS_EVENTO_REGISTRADO or evento in self._vistos:
+            return
+        self._vistos.add(evento)
+        
+        if tipo in EVENTOS_CANCELAMENTO:
+            self.canceladas.add(chave)
+        elif tipo == EVENTO_CARTA_CORRECAO:
+            self.cartas_correcao[chave] = self.cartas_correcao.get(chave, 0) + 1
+    
+    def situacoes(self, chaves):
+        """Retorna (situações, cartas de correção), uma posição por chave informada"""
+        canceladas = self.canceladas
+        pendentes = self.cancelamentos_pendentes
+        cartas = self.cartas_correcao
+        situacoes = [
+            SITUACAO_CANCELADA if chave in canceladas
+            else SITUACAO_CANCELAMENTO_PENDENTE if chave in pendentes
+            else SITUACAO_AUTORIZADA
+            for chave in chaves
+        ]
+        return situacoes, [cartas.get(chave, 0) for chave in chaves]
+    
+    def aplicar(self, df_notas, chaves=None):
+        """Acrescenta a situação e as cartas de correção ao DataFrame das notas
+        
+        chaves, se informado, são as chaves de acesso das notas na ordem do
+        DataFrame; senão, vêm da coluna 'Chave de Acesso'. Sem chaves o
+        DataFrame é devolvido sem alteração.
+        """
+        if chaves is None:
+            if 'Chave de Acesso' not in df_notas.columns:
+                return df_notas
+            chaves = df_notas['Chave de Acesso'].tolist()
+        
+        situacoes, cartas = self.situacoes(chaves)
+        df_notas = df_notas.copy()
+        df_notas[COLUNA_SITUACAO] = situacoes
+        df_notas[COLUNA_CARTAS_CORRECAO] = cartas
+        return df_notas
@@ -2,65 +2,365 @@
 """Módulo para geração de arquivos Excel"""
 
 import pandas as pd
+from functools import lru_cache
 from io import BytesIO
+from itertools import chain, islice
+from time import perf_counter
+from openpyxl import Workbook
+from openpyxl.cell import Cell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+from config import TIPOS_COLUNAS_NOTAS, TIPOS_COLUNAS_PRODUTOS, AGRUPAMENTOS_RESUMO
+from aggregations import gerar_agrupamentos
+from document_types import ABAS_DOCUMENTOS
+from event_index import COLUNA_SITUACAO, SITUACAO_CANCELADA
+from utils import formatar_moeda, aplicar_formatacao, aplicar_formatacao_coluna
+from instrumentation import medir_opcional
+
+# Formatos numéricos do Excel por tipo de campo
+FORMATOS_EXCEL = {
+    'moeda': '"R$" #,##0.00',
+    'numero': '0.00',
+    'data': 'DD/MM/YYYY',
+}
+
+# Linhas usadas para estimar a largura das colunas no modo streaming
+AMOSTRA_LARGURA = 1000
+
+# Linhas de um DataFrame convertidas por vez no modo streaming
+LINHAS_POR_BLOCO = 10000
+
+# Limite de linhas de uma planilha do Excel, incluindo o cabeçalho
+LIMITE_LINHAS_EXCEL = 1048576
+
+def _nome_parte(nome_aba, parte):
+    """Nome da parte de uma aba dividida: 'Produtos (1)', 'Produtos (2)', ..."""
+    return f"{nome_aba} ({parte})"
+
+def _linhas_dataframe(df):
+    """Gera as linhas do DataFrame como tuplas, um bloco por vez"""
+    for inicio in range(0, len(df), LINHAS_POR_BLOCO):
+        yield from df.iloc[inicio:inicio + LINHAS_POR_BLOCO].itertuples(index=False, name=None)
+
+class EscritorExcelStreaming:
+    """Grava planilhas no modo write-only do openpyxl, linha a linha
+    
+    Os estilos são definidos por coluna (cabeçalho e formato numérico) e a
+    largura das colunas é estimada a partir de uma amostra das primeiras
+    linhas, de modo que tempo e memória crescem linearmente com os dados.
+    Abas com mais de linhas_por_aba linhas de dados são divididas em
+    '<nome> (1)', '<nome> (2)', ... durante a gravação.
+    """
+    
+    def __init__(self, cor_header="0000CC", cor_texto_header="FFFFFF", formatar=True,
+                 linhas_por_aba=LIMITE_LINHAS_EXCEL - 1):
+        self.workbook = Workbook(write_only=True)
+        self.formatar = formatar
+        self.linhas_por_aba = linhas_por_aba
+        self.cor_header = cor_header
+        self.cor_texto_header = cor_texto_header
+        self._estilo_cabecalho = None
+        self._estilos_tipo = {}
+    
+    def _preparar_estilos(self, worksheet):
+        """Registra no workbook os estilos de cabeçalho e de cada formato numérico"""
+        if self._estilo_cabecalho is not None:
+            return
+        
+        # Estilo do cabeçalho, compartilhado pelas células do cabeçalho
+        modelo = Cell(worksheet)
+        modelo.fill = PatternFill(start_color=self.cor_header, end_color=self.cor_header, fill_type="solid")
+        modelo.font = Font(bold=True, color=self.cor_texto_header, size=11)
+        modelo.alignment = Alignment(horizontal="center", vertical="center")
+        thin = Side(style='thin')
+        modelo.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        self._estilo_cabecalho = modelo._style
+        
+        # Um estilo por formato numérico, compartilhado pelas colunas do mesmo tipo
+        for tipo, formato in FORMATOS_EXCEL.items():
+            modelo = Cell(worksheet)
+            modelo.number_format = formato
+            self._estilos_tipo[tipo] = modelo._style
+    
+    def escrever_aba(self, nome_aba, colunas, linhas, tipos_colunas=None):
+        """Grava uma aba a partir de um iterável de linhas e retorna quantas foram gravadas
+        
+        Cada linha é uma sequência de valores na ordem de colunas. Se as
+        linhas não couberem em uma planilha, a aba já gravada é renomeada
+        para '<nome> (1)' e as seguintes continuam em novas partes.
+        """
+        tipos_colunas = tipos_colunas or {}
+        tipos = [tipos_colunas.get(coluna, 'texto') for coluna in colunas]
+        
+        # No modo write-only as larguras precisam ser definidas antes das linhas
+        linhas = iter(linhas)
+        amostra = list(islice(linhas, AMOSTRA_LARGURA))
+        larguras = self._estimar_larguras(colunas, tipos, amostra)
+        
+        worksheet = self._criar_aba(nome_aba, colunas, larguras)
+        conversores = [self._conversor_coluna(worksheet, tipo) for tipo in tipos]
+        parte = 1
+        linhas_aba = 0
+        total = 0
+        for linha in chain(amostra, linhas):
+            if linhas_aba == self.linhas_por_aba:
+                if parte == 1:
+                    worksheet.title = _nome_parte(nome_aba, 1)
+                parte += 1
+                worksheet = self._criar_aba(_nome_parte(nome_aba, parte), colunas, larguras)
+                conversores = [self._conversor_coluna(worksheet, tipo) for tipo in tipos]
+                linhas_aba = 0
+            
+            worksheet.append([converter(valor) for converter, valor in zip(conversores, linha)])
+            linhas_aba += 1
+            total += 1
+        
+        return total
+    
+    def _criar_aba(self, nome_aba, colunas, larguras):
+        """Cria uma aba com larguras, painel congelado e cabeçalho"""
+        worksheet = self.workbook.create_sheet(nome_aba)
+        self._preparar_estilos(worksheet)
+        
+        for indice, largura in enumerate(larguras, start=1):
+            worksheet.column_dimensions[get_column_letter(indice)].width = largura
+        worksheet.freeze_panes = 'A2'
+        
+        worksheet.append([
+            Cell(worksheet, row=1, column=1, value=coluna, style_array=self._estilo_cabecalho) for coluna in colunas
+        ])
+        return worksheet
+    
+    def salvar(self, destino):
+        """Grava o workbook em um caminho ou objeto de arquivo"""
+        self.workbook.save(destino)
+    
+    def _conversor_coluna(self, worksheet, tipo):
+        """Retorna a função que prepara os valores de uma coluna para gravação"""
+        estilo = self._estilos_tipo.get(tipo) if self.formatar else None
+        
+        if estilo is not None:
+            def converter(valor):
+                if valor is None or valor != valor:
+                    return None
+                return Cell(worksheet, row=1, column=1, value=valor, style_array=estilo)
+        elif self.formatar and tipo in ('cnpj', 'cpf', 'cnpj_cpf'):
+            # Os mesmos documentos se repetem em muitas linhas
+            @lru_cache(maxsize=65536)
+            def converter(valor):
+                return aplicar_formatacao(valor, tipo)
+        else:
+            def converter(valor):
+                # valor != valor identifica NaN/NaT
+                return None if valor is None or valor != valor else valor
+        
+        return converter
+    
+    def _estimar_larguras(self, colunas, tipos, amostra):
+        """Estima a largura de cada coluna pelo texto exibido na amostra"""
+        larguras = []
+        for indice, (coluna, tipo) in enumerate(zip(colunas, tipos)):
+            max_length = len(str(coluna))
+            for linha in amostra:
+                valor = linha[indice]
+                if self.formatar:
+                    texto = aplicar_formatacao(valor, tipo)
+                else:
+                    texto = '' if valor is None or valor != valor else str(valor)
+                max_length = max(max_length, len(texto))
+            larguras.append(min(max_length + 2, 50))
+        return larguras
 
 class ExcelGenerator:
-    """Classe para gerar arquivos Excel formatados"""
+    """Classe para gerar arquivos Excel formatados
+    
+    Com streaming=True o arquivo é gerado pelo EscritorExcelStreaming, sem
+    manter as planilhas inteiras em memória. metricas, se informado
+    (instrumentation.Metricas), recebe o tempo de cada aba e da gravação.
+    agrupamentos são os totais por grupo gravados junto com o resumo, em
+    abas próprias (padrão: config.AGRUPAMENTOS_RESUMO; [] desativa).
+    """
     
-    def __init__(self):
+    def __init__(self, streaming=False, metricas=None, agrupamentos=None):
         self.cor_header = "0000CC"
         self.cor_texto_header = "FFFFFF"
+        self.streaming = streaming
+        self.metricas = metricas
+        self.agrupamentos = AGRUPAMENTOS_RESUMO if agrupamentos is None else agrupamentos
     
-    def criar_excel(self, df_notas, df_produtos, incluir_resumo=True):
-        """Cria arquivo Excel com múltiplas abas e formatação"""
+    def criar_excel(self, df_notas, df_produtos, incluir_resumo=True, formatar=True, duplicadas=0, documentos=None,
+                    excluir_canceladas=True):
+        """Cria arquivo Excel com múltiplas abas e formatação
+        
+        Com formatar=True, colunas de moeda, número e data recebem formato
+        numérico do Excel (os valores continuam numéricos na planilha) e
+        CNPJ/CPF recebem máscara. duplicadas é o número de cópias de notas
+        descartadas no processamento, informado no resumo. documentos, se
+        informado, é um dict tipo -> DataFrame (CT-e, eventos), gravados nas
+        abas de document_types.ABAS_DOCUMENTOS. Com excluir_canceladas, as
+        notas com situação 'Cancelada' (ver event_index) ficam fora dos
+        totais de valores do resumo.
+        """
+        abas_documentos = [
+            (nome_aba, documentos[tipo], tipos_colunas)
+            for tipo, (nome_aba, tipos_colunas) in ABAS_DOCUMENTOS.items()
+            if documentos and tipo in documentos and not documentos[tipo].empty
+        ]
+        
+        if self.streaming:
+            return self._criar_excel_streaming(df_notas, df_produtos, incluir_resumo, formatar, duplicadas,
+                                               abas_documentos, excluir_canceladas)
+        
         output = BytesIO()
         
         with pd.ExcelWriter(output, engine='openpyxl') as writer:
             # Aba de notas fiscais
             if not df_notas.empty:
-                df_notas.to_excel(writer, sheet_name='Notas Fiscais', index=False)
-                self._formatar_planilha(writer.sheets['Notas Fiscais'])
+                with medir_opcional(self.metricas, 'excel_notas'):
+                    self._escrever_aba(writer, 'Notas Fiscais', df_notas, TIPOS_COLUNAS_NOTAS, formatar)
             
             # Aba de produtos
             if not df_produtos.empty:
-                df_produtos.to_excel(writer, sheet_name='Produtos', index=False)
-                self._formatar_planilha(writer.sheets['Produtos'])
+                with medir_opcional(self.metricas, 'excel_produtos'):
+                    self._escrever_aba(writer, 'Produtos', df_produtos, TIPOS_COLUNAS_PRODUTOS, formatar)
+            
+            # Abas de CT-e e eventos
+            for nome_aba, df, tipos_colunas in abas_documentos:
+                with medir_opcional(self.metricas, 'excel_documentos'):
+                    self._escrever_aba(writer, nome_aba, df, tipos_colunas, formatar)
             
             # Aba de resumo estatístico
             if incluir_resumo and not df_notas.empty:
-                df_resumo = self._gerar_resumo(df_notas, df_produtos)
-                df_resumo.to_excel(writer, sheet_name='Resumo', index=False)
-                self._formatar_planilha(writer.sheets['Resumo'])
+                with medir_opcional(self.metricas, 'excel_resumo'):
+                    df_resumo = self._gerar_resumo(df_notas, df_produtos, formatar, duplicadas, abas_documentos,
+                                                   excluir_canceladas)
+                    self._escrever_aba(writer, 'Resumo', df_resumo, {}, False)
+                
+                for nome_aba, df, tipos_colunas in self._agrupar(df_notas, df_produtos, excluir_canceladas):
+                    with medir_opcional(self.metricas, 'excel_agrupamentos'):
+                        self._escrever_aba(writer, nome_aba, df, tipos_colunas, formatar)
+            
+            # A gravação do arquivo acontece ao sair do bloco
+            inicio_gravacao = perf_counter()
+        
+        if self.metricas is not None:
+            self.metricas.registrar('excel_salvar', perf_counter() - inicio_gravacao)
         
         output.seek(0)
         return output
     
-    def _gerar_resumo(self, df_notas, df_produtos):
+    def _criar_excel_streaming(self, df_notas, df_produtos, incluir_resumo, formatar, duplicadas=0,
+                               abas_documentos=(), excluir_canceladas=True):
+        """Cria o arquivo Excel pelo escritor em modo write-only"""
+        escritor = EscritorExcelStreaming(self.cor_header, self.cor_texto_header, formatar)
+        
+        if not df_notas.empty:
+            with medir_opcional(self.metricas, 'excel_notas'):
+                escritor.escrever_aba('Notas Fiscais', list(df_notas.columns), _linhas_dataframe(df_notas),
+                                      TIPOS_COLUNAS_NOTAS)
+        
+        if not df_produtos.empty:
+            with medir_opcional(self.metricas, 'excel_produtos'):
+                escritor.escrever_aba('Produtos', list(df_produtos.columns), _linhas_dataframe(df_produtos),
+                                      TIPOS_COLUNAS_PRODUTOS)
+        
+        for nome_aba, df, tipos_colunas in abas_documentos:
+            with medir_opcional(self.metricas, 'excel_documentos'):
+                escritor.escrever_aba(nome_aba, list(df.columns), _linhas_dataframe(df), tipos_colunas)
+        
+        if incluir_resumo and not df_notas.empty:
+            with medir_opcional(self.metricas, 'excel_resumo'):
+                df_resumo = self._gerar_resumo(df_notas, df_produtos, formatar, duplicadas, abas_documentos,
+                                               excluir_canceladas)
+                escritor.escrever_aba('Resumo', list(df_resumo.columns), _linhas_dataframe(df_resumo))
+            
+            for nome_aba, df, tipos_colunas in self._agrupar(df_notas, df_produtos, excluir_canceladas):
+                with medir_opcional(self.metricas, 'excel_agrupamentos'):
+                    escritor.escrever_aba(nome_aba, list(df.columns), _linhas_dataframe(df), tipos_colunas)
+        
+        output = BytesIO()
+        with medir_opcional(self.metricas, 'excel_salvar'):
+            escritor.salvar(output)
+        output.seek(0)
+        return output
+    
+    def _escrever_aba(self, writer, nome_aba, df, tipos_colunas, formatar):
+        """Grava um DataFrame em uma ou mais abas, respeitando o limite de linhas do Excel"""
+        limite = LIMITE_LINHAS_EXCEL - 1
+        if len(df) <= limite:
+            self._escrever_parte(writer, nome_aba, df, tipos_colunas, formatar)
+            return
+        
+        for parte, inicio in enumerate(range(0, len(df), limite), start=1):
+            self._escrever_parte(writer, _nome_parte(nome_aba, parte), df.iloc[inicio:inicio + limite],
+                                 tipos_colunas, formatar)
+    
+    def _escrever_parte(self, writer, nome_aba, df, tipos_colunas, formatar):
+        """Grava um DataFrame em uma aba aplicando os formatos por tipo de coluna"""
+        formatos = {}
+        
+        if formatar:
+            df = df.copy()
+            for coluna in df.columns:
+                tipo = tipos_colunas.get(coluna)
+                if tipo in ('cnpj', 'cpf', 'cnpj_cpf'):
+                    df[coluna] = aplicar_formatacao_coluna(df[coluna], tipo)
+                elif tipo in FORMATOS_EXCEL:
+                    formatos[coluna] = FORMATOS_EXCEL[tipo]
+        
+        df.to_excel(writer, sheet_name=nome_aba, index=False)
+        worksheet = writer.sheets[nome_aba]
+        
+        # Formato numérico nas colunas tipadas
+        for indice, coluna in enumerate(df.columns, start=1):
+            formato = formatos.get(coluna)
+            if formato:
+                for (cell,) in worksheet.iter_rows(min_row=2, min_col=indice, max_col=indice):
+                    cell.number_format = formato
+        
+        with medir_opcional(self.metricas, 'excel_formatacao'):
+            self._formatar_planilha(worksheet)
+    
+    def _agrupar(self, df_notas, df_produtos, excluir_canceladas):
+        """Tabelas dos agrupamentos configurados (ver aggregations)"""
+        with medir_opcional(self.metricas, 'agrupamentos'):
+            return gerar_agrupamentos(df_notas, df_produtos, self.agrupamentos, excluir_canceladas)
+    
+    def _gerar_resumo(self, df_notas, df_produtos, formatar=True, duplicadas=0, abas_documentos=(),
+                      excluir_canceladas=True):
         """Gera dados de resumo estatístico"""
         resumo_data = {
             'Métrica': ['Total de Notas', 'Total de Produtos'],
             'Valor': [len(df_notas), len(df_produtos)]
         }
         
-        # Identifica colunas de valores (que começam com "R$")
-        colunas_valor = []
-        for col in df_notas.columns:
-            if df_notas[col].dtype == 'object':
-                sample = df_notas[col].iloc[0] if len(df_notas) > 0 else ''
-                if isinstance(sample, str) and sample.startswith('R$'):
-                    colunas_valor.append(col)
+        for nome_aba, df, _ in abas_documentos:
+            resumo_data['Métrica'].append(f'Total de {nome_aba}')
+            resumo_data['Valor'].append(len(df))
+        
+        if duplicadas:
+            resumo_data['Métrica'].append('Notas Duplicadas Descartadas')
+            resumo_data['Valor'].append(duplicadas)
+        
+        # Situação vinda dos eventos de cancelamento (ver event_index)
+        df_totais = df_notas
+        if COLUNA_SITUACAO in df_notas.columns:
+            canceladas = df_notas[COLUNA_SITUACAO] == SITUACAO_CANCELADA
+            resumo_data['Métrica'].append(
+                'Notas Canceladas (fora dos totais)' if excluir_canceladas else 'Notas Canceladas'
+            )
+            resumo_data['Valor'].append(int(canceladas.sum()))
+            if excluir_canceladas:
+                df_totais = df_notas[~canceladas]
+        
+        # Colunas de valores identificadas pelo tipo do campo
+        colunas_valor = [col for col in df_notas.columns if TIPOS_COLUNAS_NOTAS.get(col) == 'moeda']
         
         # Adiciona totais de valores
         for col in colunas_valor:
-            try:
-                # Remove formatação para somar
-                valores = df_notas[col].str.replace('R$ ', '').str.replace('.', '').str.replace(',', '.')
-                total = valores.astype(float).sum()
-                resumo_data['Métrica'].append(f'Total {col}')
-                resumo_data['Valor'].append(f'R$ {total:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.'))
-            except:
-                pass
+            total = pd.to_numeric(df_totais[col], errors='coerce').sum()
+            resumo_data['Métrica'].append(f'Total {col}')
+            resumo_data['Valor'].append(formatar_moeda(total) if formatar else total)
         
         return pd.DataFrame(resumo_data)
     
@@ -0,0 +1,167 @@
+# exporters.py
+"""Exportação de notas e produtos em CSV e Parquet, gravada em blocos
+
+Os exportadores recebem as notas uma a uma (ver FileProcessor, parâmetro
+destino) e gravam um bloco a cada tamanho_bloco linhas, sem montar um
+DataFrame com todo o conjunto. Os valores são gravados com o tipo extraído:
+números como números, datas em ISO 8601 e CNPJ/CPF só com dígitos.
+"""
+
+import csv
+import gzip
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from config import TIPOS_COLUNAS_NOTAS, TIPOS_COLUNAS_PRODUTOS
+
+# Linhas acumuladas antes de gravar um bloco
+TAMANHO_BLOCO_PADRAO = 50000
+
+class _Exportador(ABC):
+    """Base dos exportadores: acumula linhas de notas e produtos e grava em blocos"""
+    
+    def __init__(self, prefixo, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+        self.prefixo = prefixo
+        self.tamanho_bloco = tamanho_bloco
+        self.total_notas = 0
+        self.total_produtos = 0
+        self.arquivos = []
+        self._blocos = {'notas': [], 'produtos': []}
+        self._colunas = {}
+    
+    def adicionar(self, dados_nota, produtos):
+        """Recebe uma nota e seus produtos, gravando os blocos que ficarem cheios"""
+        self._acumular('notas', [dados_nota])
+        self._acumular('produtos', produtos)
+        self.total_notas += 1
+        self.total_produtos += len(produtos)
+    
+    def _acumular(self, tabela, linhas):
+        bloco = self._blocos[tabela]
+        bloco.extend(linhas)
+        if len(bloco) >= self.tamanho_bloco:
+            self._descarregar(tabela)
+    
+    def _descarregar(self, tabela):
+        """Grava o bloco acumulado de uma tabela"""
+        bloco = self._blocos[tabela]
+        if not bloco:
+            return
+        
+        if tabela not in self._colunas:
+            # As colunas vêm da primeira linha; todas as linhas têm as mesmas chaves
+            self._colunas[tabela] = list(bloco[0])
+            self._abrir(tabela, self._colunas[tabela])
+        
+        colunas = self._colunas[tabela]
+        self._gravar(tabela, colunas, [[linha.get(coluna) for coluna in colunas] for linha in bloco])
+        self._blocos[tabela] = []
+    
+    def fechar(self):
+        """Grava os blocos pendentes e fecha os arquivos"""
+        for tabela in self._blocos:
+            self._descarregar(tabela)
+        self._finalizar()
+    
+    @abstractmethod
+    def _abrir(self, tabela, colunas):
+        """Cria o arquivo de uma tabela, com as colunas do primeiro bloco"""
+    
+    @abstractmethod
+    def _gravar(self, tabela, colunas, linhas):
+        """Grava um bloco de linhas (listas na ordem das colunas) de uma tabela"""
+    
+    @abstractmethod
+    def _finalizar(self):
+        """Fecha os arquivos abertos"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.fechar()
+
+class ExportadorCSV(_Exportador):
+    """Grava <prefixo>_notas.csv e <prefixo>_produtos.csv (ou .csv.gz com compactar)"""
+    
+    def __init__(self, prefixo, compactar=False, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+        super().__init__(prefixo, tamanho_bloco)
+        self.compactar = compactar
+        self._arquivos_abertos = {}
+        self._escritores = {}
+    
+    def _abrir(self, tabela, colunas):
+        caminho = f"{self.prefixo}_{tabela}.csv" + ('.gz' if self.compactar else '')
+        if self.compactar:
+            arquivo = gzip.open(caminho, 'wt', encoding='utf-8', newline='')
+        else:
+            arquivo = open(caminho, 'w', encoding='utf-8', newline='')
+        
+        self._arquivos_abertos[tabela] = arquivo
+        self._escritores[tabela] = csv.writer(arquivo)
+        self._escritores[tabela].writerow(colunas)
+        self.arquivos.append(caminho)
+    
+    def _gravar(self, tabela, colunas, linhas):
+        for linha in linhas:
+            for posicao, valor in enumerate(linha):
+                if isinstance(valor, datetime):
+                    linha[posicao] = valor.isoformat()
+        self._escritores[tabela].writerows(linhas)
+    
+    def _finalizar(self):
+        for arquivo in self._arquivos_abertos.values():
+            arquivo.close()
+        self._arquivos_abertos = {}
+        self._escritores = {}
+
+class ExportadorParquet(_Exportador):
+    """Grava <prefixo>_notas.parquet e <prefixo>_produtos.parquet, um row group por bloco
+    
+    Requer o pacote opcional pyarrow. Com tipado=True (extração com
+    formatar), colunas de moeda/número viram float64 e datas viram
+    timestamp; as demais, e todas com tipado=False, são texto.
+    """
+    
+    def __init__(self, prefixo, tipado=True, tamanho_bloco=TAMANHO_BLOCO_PADRAO):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("A exportação Parquet requer o pacote pyarrow (pip install pyarrow).")
+        
+        super().__init__(prefixo, tamanho_bloco)
+        self.tipado = tipado
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._escritores = {}
+        self._esquemas = {}
+    
+    def _tipo_arrow(self, tabela, coluna):
+        tipos = TIPOS_COLUNAS_NOTAS if tabela == 'notas' else TIPOS_COLUNAS_PRODUTOS
+        tipo = tipos.get(coluna) if self.tipado else None
+        if tipo in ('moeda', 'numero'):
+            return self._pa.float64()
+        if tipo == 'data':
+            return self._pa.timestamp('us')
+        return self._pa.string()
+    
+    def _abrir(self, tabela, colunas):
+        caminho = f"{self.prefixo}_{tabela}.parquet"
+        esquema = self._pa.schema([(coluna, self._tipo_arrow(tabela, coluna)) for coluna in colunas])
+        self._esquemas[tabela] = esquema
+        self._escritores[tabela] = self._pq.ParquetWriter(caminho, esquema)
+        self.arquivos.append(caminho)
+    
+    def _gravar(self, tabela, colunas, linhas):
+        esquema = self._esquemas[tabela]
+        arrays = [
+            self._pa.array([linha[posicao] for linha in linhas], type=esquema.field(posicao).type)
+            for posicao in range(len(colunas))
+        ]
+        self._escritores[tabela].write_table(self._pa.Table.from_arrays(arrays, schema=esquema))
+    
+    def _finalizar(self):
+        for escritor in self._escritores.values():
+            escritor.close()
+        self._escritores = {}
@@ -0,0 +1,153 @@
+# extraction_cache.py
+"""Cache em disco dos resultados de extração, endereçado pelo conteúdo dos XMLs"""
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# Local padrão do arquivo de cache
+CAMINHO_CACHE_PADRAO = os.path.join(os.path.expanduser('~'), '.cache', 'nfe_converter', 'extracao.sqlite')
+
+# Tamanho máximo padrão do cache (soma dos resultados serializados)
+TAMANHO_MAXIMO_PADRAO = 512 * 1024 * 1024
+
+# Gravações acumuladas antes de um commit no SQLite
+GRAVACOES_POR_COMMIT = 500
+
+class CacheExtracao:
+    """Cache SQLite de (dados_nota, produtos) indexado pelo hash do XML
+    
+    A chave combina o SHA-256 dos bytes do XML com a assinatura do extrator
+    (campos selecionados e formatação), de modo que mudar a configuração
+    nunca reaproveita resultados incompatíveis. Quando o tamanho total passa
+    de tamanho_maximo, as entradas acessadas há mais tempo são removidas.
+    """
+    
+    def __init__(self, caminho=CAMINHO_CACHE_PADRAO, tamanho_maximo=TAMANHO_MAXIMO_PADRAO):
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        
+        self.caminho = caminho
+        self.tamanho_maximo = tamanho_maximo
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        
+        self.acertos = 0
+        self.falhas = 0
+        self.removidos = 0
+        
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.conexao.execute('PRAGMA journal_mode=WAL')
+        self.conexao.execute('PRAGMA synchronous=NORMAL')
+        self.conexao.execute('''
+            CREATE TABLE IF NOT EXISTS extracoes (
+                chave TEXT PRIMARY KEY,
+                resultado BLOB NOT NULL,
+                tamanho INTEGER NOT NULL,
+                ultimo_acesso REAL NOT NULL
+            )
+        ''')
+        self.conexao.execute('CREATE INDEX IF NOT EXISTS idx_extracoes_acesso ON extracoes (ultimo_acesso)')
+        self.conexao.commit()
+        
+        self.tamanho_total = self.conexao.execute('SELECT COALESCE(SUM(tamanho), 0) FROM extracoes').fetchone()[0]
+    
+    @staticmethod
+    def calcular_chave(conteudo, assinatura):
+        """Chave do cache para os bytes de um XML e a assinatura do extrator"""
+        h = hashlib.sha256(assinatura.encode('utf-8'))
+        h.update(b'\0')
+        h.update(conteudo)
+        return h.hexdigest()
+    
+    def obter(self, chave):
+        """Retorna o resultado armazenado para a chave, ou None se não houver"""
+        with self._lock:
+            linha = self.conexao.execute('SELECT resultado FROM extracoes WHERE chave = ?', (chave,)).fetchone()
+            
+            if linha is None:
+                self.falhas += 1
+                return None
+            
+            self.acertos += 1
+            self.conexao.execute('UPDATE extracoes SET ultimo_acesso = ? WHERE chave = ?', (time.time(), chave))
+            self._registrar_escrita()
+        
+        return pickle.loads(linha[0])
+    
+    def gravar(self, chave, resultado):
+        """Armazena o resultado da extração de um XML"""
+        blob = pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        with self._lock:
+            anterior = self.conexao.execute('SELECT tamanho FROM extracoes WHERE chave = ?', (chave,)).fetchone()
+            self.conexao.execute(
+                'INSERT OR REPLACE INTO extracoes (chave, resultado, tamanho, ultimo_acesso) VALUES (?, ?, ?, ?)',
+                (chave, blob, len(blob), time.time())
+            )
+            self.tamanho_total += len(blob) - (anterior[0] if anterior else 0)
+            
+            if self.tamanho_total > self.tamanho_maximo:
+                self._liberar_espaco()
+            
+            self._registrar_escrita()
+    
+    def _registrar_escrita(self):
+        """Faz commit a cada GRAVACOES_POR_COMMIT escritas (chamar com o lock)"""
+        self._pendentes += 1
+        if self._pendentes >= GRAVACOES_POR_COMMIT:
+            self.conexao.commit()
+            self._pendentes = 0
+    
+    def _liberar_espaco(self):
+        """Remove as entradas menos usadas até ficar em 90% do limite (chamar com o lock)"""
+        alvo = self.tamanho_maximo * 0.9
+        cursor = self.conexao.execute('SELECT chave, tamanho FROM extracoes ORDER BY ultimo_acesso')
+        
+        remover = []
+        for chave, tamanho in cursor:
+            if self.tamanho_total <= alvo:
+                break
+            remover.append((chave,))
+            self.tamanho_total -= tamanho
+        
+        self.conexao.executemany('DELETE FROM extracoes WHERE chave = ?', remover)
+        self.removidos += len(remover)
+    
+    def salvar(self):
+        """Confirma as gravações pendentes"""
+        with self._lock:
+            self.conexao.commit()
+            self._pendentes = 0
+    
+    def limpar(self):
+        """Remove todas as entradas do cache"""
+        with self._lock:
+            self.conexao.execute('DELETE FROM extracoes')
+            self.conexao.commit()
+            self.tamanho_total = 0
+            self._pendentes = 0
+    
+    def fechar(self):
+        """Confirma as gravações pendentes e fecha a conexão"""
+        self.salvar()
+        self.conexao.close()
+    
+    def estatisticas(self):
+        """Retorna contadores de uso do cache"""
+        consultas = self.acertos + self.falhas
+        with self._lock:
+            entradas = self.conexao.execute('SELECT COUNT(*) FROM extracoes').fetchone()[0]
+        
+        return {
+            'acertos': self.acertos,
+            'falhas': self.falhas,
+            'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+            'entradas': entradas,
+            'bytes': self.tamanho_total,
+            'removidos': self.removidos,
+        }
@@ -1,88 +1,676 @@
 # file_processor.py
-"""Módulo para processamento de arquivos ZIP e XML"""
+"""Módulo para processamento de arquivos ZIP e XML
 
+Não depende do Streamlit: o andamento é reportado por eventos (dicts)
+entregues a um callback, o que permite usar o mesmo núcleo na interface
+web e no processamento em lote pela linha de comando.
+"""
+
+import os
 import zipfile
-import streamlit as st
-from xml_extractor import NFeExtractor
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from time import perf_counter
+from instrumentation import Metricas
+from xml_extractor import NFeExtractor, ler_chave_acesso, TAMANHO_INICIO_CHAVE
+from document_types import DespachanteDocumentos, identificar_tipo, NFE, OUTRO, TIPOS_NOTA, TIPOS_DOCUMENTO
+from zip_ingestion import ZipMapeado
+
+# Intervalo mínimo, em segundos, entre eventos 'progresso' (o último arquivo é sempre reportado)
+INTERVALO_PROGRESSO = 0.25
+
+# Limites de agrupamento dos membros enviados a cada tarefa do pool
+BYTES_POR_LOTE = 4 * 1024 * 1024
+ARQUIVOS_POR_LOTE = 256
+
+# Trecho lido, na triagem, de itens cuja raiz não foi reconhecida nos primeiros bytes
+TAMANHO_JANELA_TIPO = 64 * 1024
+
+# Despachante (com os extratores) e ZIP de cada processo do pool, abertos uma vez no initializer
+_despachante_worker = None
+_zip_worker = None
+
+def _inicializar_worker(campos_notas, campos_produtos, formatar, streaming, caminho_zip=None):
+    """Cria os extratores usados pelo processo do pool e mapeia o ZIP em disco, se houver"""
+    global _despachante_worker, _zip_worker
+    extractor = NFeExtractor(campos_notas, campos_produtos, formatar, streaming, Metricas())
+    _despachante_worker = DespachanteDocumentos(extractor)
+    _zip_worker = ZipMapeado(caminho_zip) if caminho_zip else None
+
+def _extrair_lote(lote):
+    """Extrai um lote de (indice, nome, conteudo, tipo)
+    
+    Retorna ([(indice, tipo, registro, produtos)], [(indice, nome, tipo,
+    mensagem)] dos XMLs que não puderam ser processados, relatorio das
+    métricas do lote). conteudo None indica que o membro deve ser lido pelo
+    próprio worker, do ZIP mapeado no initializer, sem passar os bytes pelo
+    processo principal.
+    """
+    metricas = _despachante_worker.extractor_nfe.metricas
+    metricas.zerar()
+    
+    resultados = []
+    erros = []
+    for indice, nome, conteudo, tipo in lote:
+        try:
+            if conteudo is None:
+                with metricas.medir('leitura'):
+                    conteudo = _zip_worker.ler(nome)
+                metricas.contar('bytes_lidos', len(conteudo))
+            resultados.append((indice, tipo, *_despachante_worker.extrair(tipo, conteudo, nome)))
+        except Exception as e:
+            erros.append((indice, nome, tipo, str(e)))
+    return resultados, erros, metricas.relatorio()
+
+def _com_arquivo(resultado, arquivo_nome):
+    """Copia um resultado do cache trocando o nome do arquivo de origem"""
+    dados_nota, produtos = resultado
+    if not dados_nota:
+        return resultado
+    
+    dados_nota = dict(dados_nota)
+    dados_nota['Arquivo'] = arquivo_nome
+    return dados_nota, [dict(produto, Arquivo=arquivo_nome) for produto in produtos]
+
+def _formatar_duracao(segundos):
+    """Duração em segundos como MM:SS ou H:MM:SS"""
+    minutos, segundos = divmod(int(segundos), 60)
+    horas, minutos = divmod(minutos, 60)
+    return f"{horas}:{minutos:02d}:{segundos:02d}" if horas else f"{minutos:02d}:{segundos:02d}"
+
+def descrever_progresso(evento):
+    """Texto de um evento 'progresso', ex.: '1200/5000 · 850 arquivos/s · 12.4 MB/s · 00:01 · faltam 00:04'"""
+    texto = (f"{evento['concluidos']}/{evento['total']} · {evento['arquivos_por_segundo']:.0f} arquivos/s · "
+             f"{evento['mb_por_segundo']:.1f} MB/s · {_formatar_duracao(evento['decorrido'])}")
+    if evento['eta'] is not None and evento['concluidos'] < evento['total']:
+        texto += f" · faltam {_formatar_duracao(evento['eta'])}"
+    return texto
+
+def _nome_item(item):
+    """Nome de um item da triagem: membro de ZIP (str) ou arquivo com name"""
+    return item if isinstance(item, str) else item.name
+
+def _ler_inicio_arquivo(arquivo, tamanho):
+    """Lê o início de um arquivo (upload ou _ArquivoLocal) e volta ao começo"""
+    inicio = arquivo.read(tamanho)
+    arquivo.seek(0)
+    return inicio
 
 class FileProcessor:
-    """Classe para processar arquivos XML e ZIP"""
+    """Classe para processar arquivos XML e ZIP
+    
+    callback_progresso, se informado, recebe um dict por evento, com a chave
+    'evento' valendo:
+    - 'inicio': início de um conjunto de arquivos ('total')
+    - 'progresso': andamento ('concluidos', 'total', 'arquivo', 'bytes',
+      'decorrido' e 'eta' em segundos, 'arquivos_por_segundo', 'mb_por_segundo')
+    - 'aviso': problema não fatal ('mensagem')
+    - 'fim': conjunto concluído ('total', 'decorrido', 'metricas' e 'tipos')
+    Sem callback, os avisos são impressos na saída padrão. Os eventos
+    'progresso' são limitados a um a cada intervalo_progresso segundos
+    (0 para um por arquivo), sempre com o último arquivo do conjunto; o
+    texto pronto para exibição sai de descrever_progresso(evento).
+    
+    cache, se informado, é um CacheExtracao: XMLs já vistos com a mesma
+    configuração do extrator não são processados de novo.
+    
+    Antes da extração, o tipo de cada XML é identificado pelos bytes
+    iniciais (ver document_types): NF-e e NFC-e seguem para o NFeExtractor;
+    CT-e e eventos, para os seus extratores, com um registro por documento
+    acumulado em self.documentos[tipo]; os demais são descartados. A
+    contagem por tipo fica em self.tipos.
+    
+    Com deduplicar, cópias da mesma NF-e (mesma chave de acesso) são
+    descartadas antes da extração, inclusive entre entradas processadas pela
+    mesma instância; o total descartado fica em self.duplicadas. Dentro de
+    uma entrada (um ZIP ou um conjunto de arquivos) fica a versão nfeProc
+    e, se a cópia mantida não puder ser extraída, as descartadas são
+    tentadas em seguida. Entre entradas fica a primeira cópia processada:
+    uma nfeProc de uma entrada posterior não substitui a nota já entregue.
+    
+    chaves_existentes, se informado, é um contêiner de chaves de acesso
+    (ex.: um note_store.BancoNotas): notas com essas chaves são descartadas
+    na triagem, sem extração, e contadas em self.existentes.
+    
+    destino, se informado, recebe cada nota extraída, na ordem dos arquivos,
+    por destino.adicionar(dados_nota, produtos) (ver exporters.py); nesse
+    caso nada é acumulado em memória e os métodos processar_* retornam
+    listas vazias.
+    
+    self.metricas (uma instrumentation.Metricas, criada se não informada)
+    acumula tempo por etapa e contadores, inclusive dos workers; o evento
+    'fim' leva o relatório em 'metricas'.
+    """
+    
+    def __init__(self, campos_notas, campos_produtos, formatar=True, streaming=False, workers=1,
+                 callback_progresso=None, cache=None, deduplicar=True, destino=None, metricas=None,
+                 chaves_existentes=None, intervalo_progresso=INTERVALO_PROGRESSO):
+        self.metricas = metricas if metricas is not None else Metricas()
+        self.extractor = NFeExtractor(campos_notas, campos_produtos, formatar, streaming, self.metricas)
+        self.despachante = DespachanteDocumentos(self.extractor)
+        self.workers = max(1, workers or 1)
+        self.callback_progresso = callback_progresso
+        self.cache = cache
+        self.deduplicar = deduplicar
+        self.duplicadas = 0
+        self._chaves_vistas = set()
+        self._reservas = {}
+        self.chaves_existentes = chaves_existentes
+        self.existentes = 0
+        self.destino = destino
+        self.tipos = {}
+        self.documentos = {tipo: [] for tipo in TIPOS_DOCUMENTO}
+        self.intervalo_progresso = intervalo_progresso
+        self._inicio = None
+        self._ultimo_progresso = 0.0
+        self._bytes_concluidos = 0
+        self._assinatura = self.extractor.assinatura()
+    
+    def _emitir(self, evento, **dados):
+        """Entrega um evento de andamento ao callback configurado"""
+        dados['evento'] = evento
+        if evento == 'inicio':
+            self._inicio = self._ultimo_progresso = perf_counter()
+            self._bytes_concluidos = 0
+        if self.callback_progresso is not None:
+            self.callback_progresso(dados)
+        elif evento == 'aviso':
+            print(dados['mensagem'])
+    
+    def _avancar(self, concluidos, total, arquivo, tamanho):
+        """Contabiliza arquivos concluídos e emite 'progresso' se o intervalo mínimo já passou"""
+        self._bytes_concluidos += tamanho
+        agora = perf_counter()
+        if concluidos < total and agora - self._ultimo_progresso < self.intervalo_progresso:
+            return
+        self._ultimo_progresso = agora
+        
+        decorrido = agora - self._inicio
+        taxa = concluidos / decorrido if decorrido > 0 else 0.0
+        self._emitir(
+            'progresso',
+            concluidos=concluidos,
+            total=total,
+            arquivo=arquivo,
+            bytes=self._bytes_concluidos,
+            decorrido=decorrido,
+            arquivos_por_segundo=taxa,
+            mb_por_segundo=self._bytes_concluidos / (1024 * 1024) / decorrido if decorrido > 0 else 0.0,
+            eta=(total - concluidos) / taxa if taxa > 0 else None
+        )
+    
+    def _finalizar(self, total):
+        """Confirma o cache, registra as métricas e emite o evento de fim"""
+        if self.cache is not None:
+            self.cache.salvar()
+        
+        decorrido = 0.0
+        if self._inicio is not None:
+            decorrido = perf_counter() - self._inicio
+            self.metricas.registrar('total', decorrido)
+            self._inicio = None
+        self.metricas.contar('arquivos', total)
+        self.metricas.registrar_log(total=total)
+        
+        self._emitir('fim', total=total, decorrido=decorrido, metricas=self.metricas.relatorio(),
+                     tipos=dict(self.tipos))
     
-    def __init__(self, campos_notas, campos_produtos, formatar=True):
-        self.extractor = NFeExtractor(campos_notas, campos_produtos, formatar)
+    def _coletar(self, todas_notas, todos_produtos, tipo, dados_nota, produtos):
+        """Acumula o resultado de um XML nas listas ou o entrega ao destino
+        
+        CT-e e eventos vão sempre para self.documentos.
+        """
+        if not dados_nota:
+            return
+        
+        if tipo in TIPOS_DOCUMENTO:
+            self.documentos[tipo].append(dados_nota)
+        elif self.destino is not None:
+            self.destino.adicionar(dados_nota, produtos)
+        else:
+            todas_notas.append(dados_nota)
+            todos_produtos.extend(produtos)
+    
+    def _consultar_cache(self, conteudo, arquivo_nome):
+        """Retorna (chave, resultado) do cache; resultado é None se ausente"""
+        with self.metricas.medir('cache'):
+            chave = self.cache.calcular_chave(conteudo, self._assinatura)
+            resultado = self.cache.obter(chave)
+        if resultado is not None:
+            resultado = _com_arquivo(resultado, arquivo_nome)
+        return chave, resultado
+    
+    def _extrair(self, conteudo, arquivo_nome, tipo=NFE):
+        """Extrai o documento com um único parse, consultando o cache se houver (só notas)"""
+        if self.cache is None or tipo not in TIPOS_NOTA:
+            return self.despachante.extrair(tipo, conteudo, arquivo_nome)
+        
+        chave, resultado = self._consultar_cache(conteudo, arquivo_nome)
+        if resultado is None:
+            resultado = self.extractor.extrair_nota_completa(conteudo, arquivo_nome)
+            self.cache.gravar(chave, resultado)
+        
+        return resultado
+    
+    def _triar(self, itens, ler_inicio):
+        """Identifica o tipo de cada item e remove cópias da mesma nota antes da extração
+        
+        Os bytes iniciais de cada item são lidos uma vez, por
+        ler_inicio(item, TAMANHO_INICIO_CHAVE), e servem, sem parse, para
+        identificar o tipo e ler a chave de acesso. Se a raiz não é
+        reconhecida e o item é maior que o trecho lido, uma janela maior
+        (ler_inicio(item, TAMANHO_JANELA_TIPO)) é lida antes de descartá-lo:
+        um envelope pode trazer o infNFe depois dos primeiros bytes. Itens de tipo não
+        reconhecido são descartados; itens cujo início não pôde ser lido ou
+        não mostra a raiz seguem como NF-e. Entre cópias de uma nota, fica a versão nfeProc (autorizada);
+        entre versões equivalentes, a primeira. Itens sem chave legível são
+        mantidos e seguem para a extração normalmente. Notas com chave já
+        vista em entradas anteriores são descartadas.
+        
+        Retorna a lista de (item, tipo) mantidos. As cópias descartadas de
+        cada item mantido, nfeProc primeiro, ficam em self._reservas pela
+        posição do item na lista (ver _extrair_reserva).
+        """
+        inicio = perf_counter()
+        tipos = [NFE] * len(itens)
+        manter = [True] * len(itens)
+        escolhidos = {}  # chave -> (posição, eh_proc)
+        descartadas = {}  # chave -> [(posição, eh_proc)] das cópias descartadas
+        
+        for posicao, item in enumerate(itens):
+            try:
+                bytes_iniciais = ler_inicio(item, TAMANHO_INICIO_CHAVE)
+            except Exception:
+                continue
+            
+            tipo = tipos[posicao] = identificar_tipo(bytes_iniciais) or NFE
+            if tipo == OUTRO and len(bytes_iniciais) >= TAMANHO_INICIO_CHAVE:
+                try:
+                    bytes_iniciais = ler_inicio(item, TAMANHO_JANELA_TIPO)
+                    tipo = tipos[posicao] = identificar_tipo(bytes_iniciais) or NFE
+                except Exception:
+                    pass
+            if tipo == OUTRO:
+                manter[posicao] = False
+                continue
+            
+            if tipo not in TIPOS_NOTA or not (self.deduplicar or self.chaves_existentes is not None):
+                continue
+            
+            chave, eh_proc = ler_chave_acesso(bytes_iniciais)
+            if chave is None:
+                continue
+            
+            if self.chaves_existentes is not None and chave in self.chaves_existentes:
+                manter[posicao] = False
+                self.existentes += 1
+                self.metricas.contar('notas_existentes')
+                continue
+            
+            if not self.deduplicar:
+                continue
+            
+            if chave in self._chaves_vistas:
+                manter[posicao] = False
+            elif chave not in escolhidos:
+                escolhidos[chave] = (posicao, eh_proc)
+                continue
+            elif eh_proc and not escolhidos[chave][1]:
+                manter[escolhidos[chave][0]] = False
+                descartadas.setdefault(chave, []).append(escolhidos[chave])
+                escolhidos[chave] = (posicao, eh_proc)
+            else:
+                manter[posicao] = False
+                descartadas.setdefault(chave, []).append((posicao, eh_proc))
+            
+            self.duplicadas += 1
+        
+        self._chaves_vistas.update(escolhidos)
+        
+        reservas = {}
+        for chave, copias in descartadas.items():
+            copias.sort(key=lambda copia: (not copia[1], copia[0]))
+            reservas[escolhidos[chave][0]] = [itens[posicao] for posicao, _ in copias]
+        
+        mantidos = []
+        self._reservas = {}
+        for posicao, (item, tipo, mantido) in enumerate(zip(itens, tipos, manter)):
+            if mantido:
+                if posicao in reservas:
+                    self._reservas[len(mantidos)] = reservas[posicao]
+                mantidos.append((item, tipo))
+            if mantido or tipo == OUTRO:
+                self.tipos[tipo] = self.tipos.get(tipo, 0) + 1
+                self.metricas.contar(f'documentos_{tipo}')
+        
+        self.metricas.registrar('triagem', perf_counter() - inicio)
+        
+        ignorados = tipos.count(OUTRO)
+        if ignorados:
+            self._emitir('aviso', mensagem=f"⚠️ {ignorados} arquivo(s) ignorado(s): tipo de documento não reconhecido.")
+        return mantidos
+    
+    def _extrair_reserva(self, idx, tipo, ler):
+        """Extrai uma cópia descartada do item idx da triagem, cuja extração falhou
+        
+        As cópias são lidas por ler(item) e tentadas em ordem; retorna
+        (dados_nota, produtos) da primeira extraída, ou (None, []).
+        """
+        for item in self._reservas.pop(idx, ()):
+            nome = _nome_item(item)
+            try:
+                with self.metricas.medir('leitura'):
+                    conteudo = ler(item)
+                self.metricas.contar('bytes_lidos', len(conteudo))
+                dados_nota, produtos = self._extrair(conteudo, nome, tipo)
+            except Exception as e:
+                self._emitir('aviso', mensagem=f"⚠️ Erro ao processar {nome}: {str(e)}")
+                continue
+            
+            if dados_nota is not None:
+                self.duplicadas -= 1
+                self._emitir('aviso', mensagem=f"⚠️ Nota extraída da cópia {nome}.")
+                return dados_nota, produtos
+        
+        return None, []
     
     def processar_zip(self, zip_file):
-        """Processa arquivos XML dentro de um ZIP"""
+        """Processa arquivos XML dentro de um ZIP
+        
+        zip_file pode ser um caminho ou um objeto de arquivo; uploads grandes
+        são copiados para o disco e lidos por mmap (ver ZipMapeado).
+        """
         todas_notas = []
         todos_produtos = []
         
-        with zipfile.ZipFile(zip_file, 'r') as z:
-            xml_files = [f for f in z.namelist() if f.endswith('.xml')]
+        with ZipMapeado(zip_file) as z:
+            xml_files = z.membros_xml()
             
             if not xml_files:
-                st.warning("⚠️ Nenhum arquivo XML encontrado no ZIP.")
+                self._emitir('aviso', mensagem="⚠️ Nenhum arquivo XML encontrado no ZIP.")
                 return todas_notas, todos_produtos
             
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+            xml_files = self._triar(xml_files, z.ler_inicio)
             
-            for idx, filename in enumerate(xml_files):
-                status_text.text(f"🔄 Processando: {filename} ({idx+1}/{len(xml_files)})")
-                
+            if self.workers > 1:
+                return self._processar_paralelo(xml_files, z.ler, z.tamanho, z.caminho)
+            
+            self._emitir('inicio', total=len(xml_files))
+            
+            for idx, (filename, tipo) in enumerate(xml_files):
+                dados_nota, produtos = None, []
                 try:
-                    with z.open(filename) as xml_file:
-                        xml_content = xml_file.read()
-                        
-                        # Extrai dados da nota
-                        dados_nota = self.extractor.extrair_dados_nota(xml_content, filename)
+                    with z.abrir(filename) as xml_file:
+                        # Sem cache, o parse incremental descompacta o membro conforme avança
+                        if self.extractor.streaming and self.cache is None and tipo in TIPOS_NOTA:
+                            xml_content = xml_file
+                            self.metricas.contar('bytes_lidos', z.tamanho(filename))
+                        else:
+                            with self.metricas.medir('leitura'):
+                                xml_content = xml_file.read()
+                            self.metricas.contar('bytes_lidos', len(xml_content))
                         
-                        if dados_nota:
-                            todas_notas.append(dados_nota)
-                            
-                            # Extrai produtos
-                            produtos = self.extractor.extrair_produtos(xml_content, dados_nota)
-                            todos_produtos.extend(produtos)
+                        dados_nota, produtos = self._extrair(xml_content, filename, tipo)
                 
                 except Exception as e:
-                    st.warning(f"⚠️ Erro ao processar {filename}: {str(e)}")
+                    self._emitir('aviso', mensagem=f"⚠️ Erro ao processar {filename}: {str(e)}")
                 
-                progress_bar.progress((idx + 1) / len(xml_files))
+                if dados_nota is None and idx in self._reservas:
+                    dados_nota, produtos = self._extrair_reserva(idx, tipo, z.ler)
+                self._coletar(todas_notas, todos_produtos, tipo, dados_nota, produtos)
+                
+                self._avancar(idx + 1, len(xml_files), filename, z.tamanho(filename))
             
-            status_text.empty()
-            progress_bar.empty()
+            self._finalizar(len(xml_files))
         
         return todas_notas, todos_produtos
     
-    def processar_arquivos_individuais(self, uploaded_files):
-        """Processa arquivos XML individuais"""
+    def _montar_lotes(self, xml_files, tamanho):
+        """Agrupa os arquivos em lotes, dos maiores para os menores
+        
+        Os arquivos grandes são agendados primeiro para equilibrar a carga
+        entre os processos; os pequenos são agrupados para reduzir o custo
+        de comunicação com o pool. tamanho(item) é o tamanho do arquivo.
+        """
+        membros = sorted(
+            enumerate(xml_files),
+            key=lambda membro: tamanho(membro[1][0]),
+            reverse=True
+        )
+        
+        lotes = []
+        lote = []
+        bytes_lote = 0
+        for idx, (item, tipo) in membros:
+            lote.append((idx, _nome_item(item), tipo))
+            bytes_lote += tamanho(item)
+            if bytes_lote >= BYTES_POR_LOTE or len(lote) >= ARQUIVOS_POR_LOTE:
+                lotes.append(lote)
+                lote = []
+                bytes_lote = 0
+        if lote:
+            lotes.append(lote)
+        
+        return lotes
+    
+    def _processar_paralelo(self, xml_files, ler, tamanho, caminho_zip=None):
+        """Processa os XMLs (membros de um ZIP ou arquivos soltos) em um pool de processos
+        
+        xml_files é a lista de (item, tipo) da triagem, com item sendo o nome
+        do membro ou o arquivo; ler(item) e tamanho(item) leem o conteúdo e
+        informam o tamanho do arquivo. O resultado
+        é reagrupado na ordem original, de modo que a saída é a mesma do
+        processamento sequencial; cada resultado é entregue assim que todos
+        os anteriores estiverem prontos. Com caminho_zip (ZIP em disco) e
+        sem cache, cada worker lê os membros do próprio mmap do arquivo.
+        """
         todas_notas = []
         todos_produtos = []
+        resultados = [None] * len(xml_files)
+        proximo = 0
+        
+        def entregar_prontos():
+            """Entrega, na ordem original, os resultados já disponíveis"""
+            nonlocal proximo
+            while proximo < len(resultados) and resultados[proximo] is not None:
+                tipo, dados_nota, produtos = resultados[proximo]
+                if dados_nota is None and proximo in self._reservas:
+                    dados_nota, produtos = self._extrair_reserva(proximo, tipo, ler)
+                self._coletar(todas_notas, todos_produtos, tipo, dados_nota, produtos)
+                resultados[proximo] = ()
+                proximo += 1
+        
+        self._emitir('inicio', total=len(xml_files))
         
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        lotes = iter(self._montar_lotes(xml_files, tamanho))
+        extractor = self.extractor
+        ler_no_worker = caminho_zip is not None and self.cache is None
+        initargs = (
+            extractor.campos_notas, extractor.campos_produtos, extractor.formatar, extractor.streaming,
+            caminho_zip if ler_no_worker else None
+        )
         
-        for idx, uploaded_file in enumerate(uploaded_files):
-            status_text.text(f"🔄 Processando: {uploaded_file.name} ({idx+1}/{len(uploaded_files)})")
+        concluidos = 0
+        
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_inicializar_worker, initargs=initargs) as pool:
+            pendentes = {}
             
-            try:
-                xml_content = uploaded_file.read()
+            def submeter_proximo():
+                """Lê o próximo lote e envia ao pool os XMLs ausentes do cache"""
+                nonlocal concluidos
+                
+                for lote in lotes:
+                    conteudos = []
+                    chaves = {}
+                    for idx, filename, tipo in lote:
+                        if ler_no_worker:
+                            conteudos.append((idx, filename, None, tipo))
+                            continue
+                        
+                        try:
+                            with self.metricas.medir('leitura'):
+                                conteudo = ler(xml_files[idx][0])
+                            self.metricas.contar('bytes_lidos', len(conteudo))
+                        except Exception as e:
+                            self._emitir('aviso', mensagem=f"⚠️ Erro ao processar {filename}: {str(e)}")
+                            resultados[idx] = (tipo, None, [])
+                            continue
+                        
+                        if self.cache is not None and tipo in TIPOS_NOTA:
+                            chave, resultado = self._consultar_cache(conteudo, filename)
+                            if resultado is not None:
+                                resultados[idx] = (tipo, *resultado)
+                                continue
+                            chaves[idx] = chave
+                        
+                        conteudos.append((idx, filename, conteudo, tipo))
+                    
+                    if conteudos:
+                        pendentes[pool.submit(_extrair_lote, conteudos)] = (lote, chaves)
+                        return True
+                    
+                    # Lote inteiro atendido pelo cache
+                    concluidos += len(lote)
+                    self._avancar(concluidos, len(xml_files), lote[-1][1], sum(tamanho(xml_files[idx][0]) for idx, _, _ in lote))
+                    entregar_prontos()
                 
-                # Extrai dados da nota
-                dados_nota = self.extractor.extrair_dados_nota(xml_content, uploaded_file.name)
+                return False
+            
+            # Mantém poucos lotes em voo para limitar a memória ocupada
+            for _ in range(self.workers * 2):
+                if not submeter_proximo():
+                    break
+            
+            while pendentes:
+                prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
                 
-                if dados_nota:
-                    todas_notas.append(dados_nota)
+                for futuro in prontos:
+                    lote, chaves = pendentes.pop(futuro)
+                    try:
+                        resultados_lote, erros, relatorio = futuro.result()
+                        self.metricas.mesclar(relatorio)
+                        for idx, tipo, dados_nota, produtos in resultados_lote:
+                            resultados[idx] = (tipo, dados_nota, produtos)
+                            if idx in chaves:
+                                self.cache.gravar(chaves[idx], (dados_nota, produtos))
+                        for idx, filename, tipo, mensagem in erros:
+                            self._emitir('aviso', mensagem=f"⚠️ Erro ao processar {filename}: {mensagem}")
+                            resultados[idx] = (tipo, None, [])
+                    except Exception as e:
+                        self._emitir('aviso', mensagem=f"⚠️ Erro ao processar lote de {len(lote)} arquivo(s): {str(e)}")
+                        self.metricas.erro('pool', len(lote))
+                        for idx, _, tipo in lote:
+                            if resultados[idx] is None:
+                                resultados[idx] = (tipo, None, [])
                     
-                    # Extrai produtos
-                    produtos = self.extractor.extrair_produtos(xml_content, dados_nota)
-                    todos_produtos.extend(produtos)
+                    concluidos += len(lote)
+                    self._avancar(concluidos, len(xml_files), lote[-1][1], sum(tamanho(xml_files[idx][0]) for idx, _, _ in lote))
+                    entregar_prontos()
+                    submeter_proximo()
+        
+        self._finalizar(len(xml_files))
+        
+        return todas_notas, todos_produtos
+    
+    def processar_arquivos_individuais(self, uploaded_files):
+        """Processa arquivos XML individuais
+        
+        Com workers > 1 e mais de um arquivo, a extração usa o mesmo pool de
+        processos dos ZIPs; os arquivos são lidos no processo principal.
+        """
+        todas_notas = []
+        todos_produtos = []
+        
+        uploaded_files = self._triar(list(uploaded_files), _ler_inicio_arquivo)
+        
+        if self.workers > 1 and len(uploaded_files) > 1:
+            return self._processar_paralelo(
+                uploaded_files,
+                lambda arquivo: arquivo.read(),
+                lambda arquivo: getattr(arquivo, 'size', 0)
+            )
+        
+        self._emitir('inicio', total=len(uploaded_files))
+        
+        for idx, (uploaded_file, tipo) in enumerate(uploaded_files):
+            tamanho = 0
+            dados_nota, produtos = None, []
+            try:
+                with self.metricas.medir('leitura'):
+                    xml_content = uploaded_file.read()
+                tamanho = len(xml_content)
+                self.metricas.contar('bytes_lidos', tamanho)
+                
+                dados_nota, produtos = self._extrair(xml_content, uploaded_file.name, tipo)
             
             except Exception as e:
-                st.warning(f"⚠️ Erro ao processar {uploaded_file.name}: {str(e)}")
+                self._emitir('aviso', mensagem=f"⚠️ Erro ao processar {uploaded_file.name}: {str(e)}")
+            
+            if dados_nota is None and idx in self._reservas:
+                dados_nota, produtos = self._extrair_reserva(idx, tipo, lambda arquivo: arquivo.read())
+            self._coletar(todas_notas, todos_produtos, tipo, dados_nota, produtos)
+            
+            self._avancar(idx + 1, len(uploaded_files), uploaded_file.name, tamanho)
+        
+        self._finalizar(len(uploaded_files))
+        
+        return todas_notas, todos_produtos
+    
+    def processar_diretorio(self, diretorio):
+        """Processa os arquivos XML de um diretório (incluindo subdiretórios)"""
+        caminhos = []
+        for raiz, _, arquivos in os.walk(diretorio):
+            caminhos.extend(os.path.join(raiz, nome) for nome in arquivos if nome.lower().endswith('.xml'))
+        caminhos.sort()
+        
+        if not caminhos:
+            self._emitir('aviso', mensagem=f"⚠️ Nenhum arquivo XML encontrado em {diretorio}.")
+            return [], []
+        
+        return self.processar_arquivos_individuais([_ArquivoLocal(caminho, diretorio) for caminho in caminhos])
+    
+    def processar_caminhos(self, caminhos):
+        """Processa uma lista de ZIPs, diretórios e arquivos XML do disco"""
+        todas_notas = []
+        todos_produtos = []
+        xmls_avulsos = []
+        
+        for caminho in caminhos:
+            if os.path.isdir(caminho):
+                notas, produtos = self.processar_diretorio(caminho)
+            elif zipfile.is_zipfile(caminho):
+                notas, produtos = self.processar_zip(caminho)
+            elif caminho.lower().endswith('.xml') and os.path.isfile(caminho):
+                xmls_avulsos.append(_ArquivoLocal(caminho))
+                continue
+            else:
+                self._emitir('aviso', mensagem=f"⚠️ Entrada ignorada (não é ZIP, XML nem diretório): {caminho}")
+                continue
             
-            progress_bar.progress((idx + 1) / len(uploaded_files))
+            todas_notas.extend(notas)
+            todos_produtos.extend(produtos)
         
-        status_text.empty()
-        progress_bar.empty()
+        if xmls_avulsos:
+            notas, produtos = self.processar_arquivos_individuais(xmls_avulsos)
+            todas_notas.extend(notas)
+            todos_produtos.extend(produtos)
         
-        return todas_notas, todos_produtos
\ No newline at end of file
+        return todas_notas, todos_produtos
+
+class _ArquivoLocal:
+    """Arquivo do disco com a mesma interface (name/read) dos uploads do Streamlit"""
+    
+    def __init__(self, caminho, base=None):
+        self.caminho = caminho
+        self.name = os.path.relpath(caminho, base) if base else os.path.basename(caminho)
+    
+    @property
+    def size(self):
+        return os.path.getsize(self.caminho)
+    
+    def read(self, tamanho=-1):
+        with open(self.caminho, 'rb') as f:
+            return f.read(tamanho)
+    
+    def seek(self, posicao):
+        # Cada leitura abre o arquivo de novo, a partir do início
+        pass
\ No newline at end of file
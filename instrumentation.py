@@ -0,0 +1,113 @@
+# instrumentation.py
+"""Cronômetros e contadores por etapa do processamento
+
+Uma instância de Metricas é compartilhada por FileProcessor, NFeExtractor e
+ExcelGenerator; relatorio() devolve um dict serializável em JSON, exibido
+na interface e gravado em log pela linha de comando.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import pstats
+from contextlib import contextmanager
+from time import perf_counter
+
+logger = logging.getLogger('nfe_converter.metricas')
+
+class Metricas:
+    """Tempo, chamadas e erros por etapa, mais contadores livres (bytes, notas, itens...)"""
+    
+    def __init__(self):
+        self.etapas = {}
+        self.contadores = {}
+    
+    def _etapa(self, etapa):
+        registro = self.etapas.get(etapa)
+        if registro is None:
+            registro = self.etapas[etapa] = {'segundos': 0.0, 'chamadas': 0, 'erros': 0}
+        return registro
+    
+    def registrar(self, etapa, segundos, chamadas=1):
+        """Soma o tempo de uma ou mais execuções de uma etapa"""
+        registro = self._etapa(etapa)
+        registro['segundos'] += segundos
+        registro['chamadas'] += chamadas
+    
+    def erro(self, etapa, quantidade=1):
+        """Conta erros ocorridos em uma etapa"""
+        self._etapa(etapa)['erros'] += quantidade
+    
+    def contar(self, contador, quantidade=1):
+        """Soma um valor a um contador"""
+        self.contadores[contador] = self.contadores.get(contador, 0) + quantidade
+    
+    @contextmanager
+    def medir(self, etapa):
+        """Mede o bloco como uma execução da etapa; exceções contam como erro"""
+        inicio = perf_counter()
+        try:
+            yield
+        except Exception:
+            self.erro(etapa)
+            raise
+        finally:
+            self.registrar(etapa, perf_counter() - inicio)
+    
+    def mesclar(self, relatorio):
+        """Soma ao acumulado um relatorio() de outra instância (ex.: de um worker)"""
+        for etapa, valores in relatorio.get('etapas', {}).items():
+            registro = self._etapa(etapa)
+            for chave in ('segundos', 'chamadas', 'erros'):
+                registro[chave] += valores.get(chave, 0)
+        for contador, quantidade in relatorio.get('contadores', {}).items():
+            self.contar(contador, quantidade)
+    
+    def relatorio(self):
+        """Retorna o acumulado como dict (etapas e contadores)"""
+        return {
+            'etapas': {etapa: dict(valores) for etapa, valores in self.etapas.items()},
+            'contadores': dict(self.contadores),
+        }
+    
+    def zerar(self):
+        """Descarta o acumulado"""
+        self.etapas = {}
+        self.contadores = {}
+    
+    def registrar_log(self, **contexto):
+        """Emite o relatório como uma linha JSON no logger nfe_converter.metricas"""
+        logger.info(json.dumps(dict(contexto, **self.relatorio()), ensure_ascii=False))
+
+@contextmanager
+def medir_opcional(metricas, etapa):
+    """Como Metricas.medir, mas sem efeito quando metricas é None"""
+    if metricas is None:
+        yield
+    else:
+        with metricas.medir(etapa):
+            yield
+
+@contextmanager
+def perfilar(caminho=None):
+    """Captura um perfil cProfile do bloco
+    
+    Com caminho, grava as estatísticas (abríveis com pstats ou snakeviz).
+    O objeto Profile é entregue ao bloco; resumo_perfil() formata as
+    funções mais custosas.
+    """
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield perfil
+    finally:
+        perfil.disable()
+        if caminho:
+            perfil.dump_stats(caminho)
+
+def resumo_perfil(perfil, limite=20, ordem='cumulative'):
+    """Texto com as funções mais custosas de um perfil"""
+    saida = io.StringIO()
+    pstats.Stats(perfil, stream=saida).sort_stats(ordem).print_stats(limite)
+    return saida.getvalue()
@@ -0,0 +1,354 @@
+# note_store.py
+"""Banco local (SQLite) de notas extraídas, consultável entre execuções
+
+As notas ficam gravadas em texto bruto (formatar=False), com todos os
+campos do catálogo, uma linha por chave de acesso; os itens, em uma tabela
+ligada pela chave, e os eventos (cancelamento, carta de correção), em
+outra. Há índices por CNPJ do emitente e do destinatário, data de emissão
+e CFOP dos itens, para que a consulta de um período ou fornecedor não
+percorra o banco inteiro.
+
+Uma consulta devolve um ArmazemBruto (ver raw_store) com as notas
+selecionadas, projetado nos mesmos DataFrames de uma extração direta dos
+XMLs e pronto para o ExcelGenerator.
+
+Exemplo:
+    banco = BancoNotas('notas.sqlite')
+    processor = FileProcessor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, formatar=False,
+                              destino=banco, chaves_existentes=banco)
+    processor.processar_zip(arquivo)
+    banco.adicionar_eventos(processor.documentos['evento'])
+    df_notas, df_produtos = banco.projetar(campos_notas, campos_produtos, emitente='12345678000195',
+                                           desde='2024-01-01', ate='2024-12-31')
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+from config import CAMPOS_DISPONIVEIS, CAMPOS_PRODUTOS, CAMPOS_EVENTO, CAMPOS_RETORNO_EVENTO
+from event_index import IndiceEventos
+from raw_store import ArmazemBruto
+
+# Local padrão do banco
+CAMINHO_BANCO_PADRAO = os.path.join(os.path.expanduser('~'), '.local', 'share', 'nfe_converter', 'notas.sqlite')
+
+# Notas gravadas antes de um commit no SQLite
+GRAVACOES_POR_COMMIT = 500
+
+# Colunas de cada tabela: campo_id -> label (os campo_id são os nomes das colunas no SQLite)
+_COLUNAS_NOTAS = {campo_id: config['label'] for categoria in CAMPOS_DISPONIVEIS.values()
+                  for campo_id, config in categoria.items()}
+_COLUNAS_PRODUTOS = {campo_id: config['label'] for campo_id, config in CAMPOS_PRODUTOS.items()}
+_COLUNAS_EVENTOS = {campo_id: config['label'] for campos in (CAMPOS_EVENTO, CAMPOS_RETORNO_EVENTO)
+                    for campo_id, config in campos.items()}
+
+_INDICES = [
+    ('idx_notas_emitente', 'notas', 'emit_cnpj'),
+    ('idx_notas_destinatario', 'notas', 'dest_cnpj_cpf'),
+    ('idx_notas_emissao', 'notas', 'data_emissao'),
+    ('idx_produtos_cfop', 'produtos', 'cfop'),
+    ('idx_eventos_chave', 'eventos', 'chave'),
+]
+
+def _somente_digitos(valor):
+    """CNPJ/CPF ou CFOP sem pontuação ('12.345.678/0001-95' -> '12345678000195')"""
+    return re.sub(r'\D', '', str(valor))
+
+def _texto(valor):
+    """Valor lido do banco como texto bruto ('' para colunas acrescentadas depois da gravação)"""
+    return '' if valor is None else valor
+
+class BancoNotas:
+    """Notas, itens e eventos em SQLite, indexados pela chave de acesso
+    
+    Recebe as notas pelo mesmo protocolo dos exportadores
+    (adicionar/fechar), podendo ser usado como destino de um FileProcessor
+    configurado com CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS e
+    formatar=False. Com somente_novas, notas já gravadas são mantidas;
+    senão, são substituídas (com os seus itens). Implementa "chave in
+    banco", para ser passado como chaves_existentes ao FileProcessor e
+    descartar na triagem as notas já gravadas.
+    
+    Campos acrescentados ao config.py depois da criação do banco viram
+    colunas novas, vazias nas notas já gravadas.
+    """
+    
+    def __init__(self, caminho=CAMINHO_BANCO_PADRAO, somente_novas=True):
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        
+        self.caminho = caminho
+        self.somente_novas = somente_novas
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        
+        self.gravadas = 0
+        self.ignoradas = 0
+        self.sem_chave = 0
+        
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.conexao.execute('PRAGMA journal_mode=WAL')
+        self.conexao.execute('PRAGMA synchronous=NORMAL')
+        self.conexao.execute('PRAGMA foreign_keys=ON')
+        
+        colunas_notas = ''.join(f', {campo_id} TEXT' for campo_id in _COLUNAS_NOTAS if campo_id != 'chave')
+        colunas_produtos = ''.join(f', {campo_id} TEXT' for campo_id in _COLUNAS_PRODUTOS)
+        colunas_eventos = ''.join(f', {campo_id} TEXT' for campo_id in _COLUNAS_EVENTOS
+                                  if campo_id not in ('chave', 'tipo_evento', 'sequencia'))
+        self.conexao.execute(f'CREATE TABLE IF NOT EXISTS notas (chave TEXT PRIMARY KEY, arquivo TEXT{colunas_notas})')
+        self.conexao.execute(f'''
+            CREATE TABLE IF NOT EXISTS produtos (
+                chave TEXT NOT NULL REFERENCES notas (chave) ON DELETE CASCADE,
+                item INTEGER NOT NULL{colunas_produtos},
+                PRIMARY KEY (chave, item)
+            )
+        ''')
+        self.conexao.execute(f'''
+            CREATE TABLE IF NOT EXISTS eventos (
+                chave TEXT NOT NULL,
+                tipo_evento TEXT NOT NULL,
+                sequencia TEXT NOT NULL{colunas_eventos},
+                PRIMARY KEY (chave, tipo_evento, sequencia)
+            )
+        ''')
+        
+        self._acrescentar_colunas('notas', _COLUNAS_NOTAS)
+        self._acrescentar_colunas('produtos', _COLUNAS_PRODUTOS)
+        self._acrescentar_colunas('eventos', _COLUNAS_EVENTOS)
+        
+        for nome, tabela, coluna in _INDICES:
+            self.conexao.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({coluna})')
+        self.conexao.commit()
+        
+        colunas = ['chave', 'arquivo'] + [campo_id for campo_id in _COLUNAS_NOTAS if campo_id != 'chave']
+        marcadores = ', '.join('?' * len(colunas))
+        insercao = f"INTO notas ({', '.join(colunas)}) VALUES ({marcadores})"
+        self._sql_nota = 'INSERT OR IGNORE ' + insercao
+        self._sql_nota_upsert = ('INSERT ' + insercao + ' ON CONFLICT (chave) DO UPDATE SET '
+                                 + ', '.join(f'{coluna} = excluded.{coluna}' for coluna in colunas[1:]))
+        
+        colunas = ['chave', 'item'] + list(_COLUNAS_PRODUTOS)
+        self._sql_produto = f"INSERT INTO produtos ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+        
+        colunas = list(_COLUNAS_EVENTOS)
+        self._sql_evento = f"INSERT OR REPLACE INTO eventos ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+    
+    def _acrescentar_colunas(self, tabela, colunas):
+        """Cria as colunas do catálogo que ainda não existem na tabela"""
+        existentes = {linha[1] for linha in self.conexao.execute(f'PRAGMA table_info({tabela})')}
+        for campo_id in colunas:
+            if campo_id not in existentes:
+                self.conexao.execute(f'ALTER TABLE {tabela} ADD COLUMN {campo_id} TEXT')
+    
+    def __contains__(self, chave):
+        with self._lock:
+            return self.conexao.execute('SELECT 1 FROM notas WHERE chave = ?', (chave,)).fetchone() is not None
+    
+    def __len__(self):
+        with self._lock:
+            return self.conexao.execute('SELECT COUNT(*) FROM notas').fetchone()[0]
+    
+    def adicionar(self, dados_nota, produtos):
+        """Grava uma nota e seus itens, extraídos com formatar=False
+        
+        Notas sem chave de acesso não são gravadas (ficam em self.sem_chave);
+        com somente_novas, notas já gravadas ficam em self.ignoradas.
+        """
+        chave = dados_nota.get('Chave de Acesso')
+        if not chave:
+            self.sem_chave += 1
+            return
+        
+        linha = [chave, dados_nota.get('Arquivo')]
+        linha.extend(dados_nota.get(label) for campo_id, label in _COLUNAS_NOTAS.items() if campo_id != 'chave')
+        itens = [
+            (chave, item, *(produto.get(label) for label in _COLUNAS_PRODUTOS.values()))
+            for item, produto in enumerate(produtos, 1)
+        ]
+        
+        with self._lock:
+            if self.somente_novas:
+                if self.conexao.execute(self._sql_nota, linha).rowcount == 0:
+                    self.ignoradas += 1
+                    return
+            else:
+                self.conexao.execute(self._sql_nota_upsert, linha)
+                self.conexao.execute('DELETE FROM produtos WHERE chave = ?', (chave,))
+            
+            self.conexao.executemany(self._sql_produto, itens)
+            self.gravadas += 1
+            self._registrar_escrita()
+    
+    def adicionar_eventos(self, registros):
+        """Grava registros de evento do EventoExtractor (formatar=False); repetidos são substituídos"""
+        linhas = [
+            tuple(registro.get(label) or '' for label in _COLUNAS_EVENTOS.values())
+            for registro in registros if registro.get('Chave de Acesso')
+        ]
+        with self._lock:
+            self.conexao.executemany(self._sql_evento, linhas)
+            self.conexao.commit()
+            self._pendentes = 0
+        return len(linhas)
+    
+    def importar(self, armazem, eventos=()):
+        """Grava as notas de um ArmazemBruto e os eventos informados; retorna as notas gravadas"""
+        gravadas = self.gravadas
+        labels_notas = list(armazem.notas)
+        labels_produtos = [label for label in _COLUNAS_PRODUTOS.values() if label in armazem.produtos]
+        
+        # Itens agrupados pela chave da nota (só as notas com itens têm referências)
+        itens_por_chave = {}
+        colunas = [armazem.produtos[label] for label in labels_produtos]
+        inicio = 0
+        for chave, quantidade in zip(armazem.referencias.get('NF Chave', ()), armazem.itens_por_nota):
+            itens_por_chave[chave] = [
+                dict(zip(labels_produtos, valores))
+                for valores in zip(*(coluna[inicio:inicio + quantidade] for coluna in colunas))
+            ]
+            inicio += quantidade
+        
+        for valores in zip(*(armazem.notas[label] for label in labels_notas)):
+            dados_nota = dict(zip(labels_notas, valores))
+            self.adicionar(dados_nota, itens_por_chave.get(dados_nota.get('Chave de Acesso'), []))
+        
+        self.adicionar_eventos(eventos)
+        return self.gravadas - gravadas
+    
+    def _filtro(self, emitente=None, destinatario=None, desde=None, ate=None, cfop=None):
+        """Cláusula WHERE sobre as notas (alias n) e os seus parâmetros"""
+        condicoes = []
+        parametros = []
+        if emitente:
+            condicoes.append('n.emit_cnpj = ?')
+            parametros.append(_somente_digitos(emitente))
+        if destinatario:
+            condicoes.append('n.dest_cnpj_cpf = ?')
+            parametros.append(_somente_digitos(destinatario))
+        # Datas em texto ISO: comparação direta, pelo índice de data de emissão
+        if desde:
+            condicoes.append('n.data_emissao >= ?')
+            parametros.append(date.fromisoformat(str(desde)).isoformat())
+        if ate:
+            condicoes.append('n.data_emissao < ?')
+            parametros.append((date.fromisoformat(str(ate)) + timedelta(days=1)).isoformat())
+        if cfop:
+            condicoes.append('EXISTS (SELECT 1 FROM produtos p WHERE p.chave = n.chave AND p.cfop = ?)')
+            parametros.append(_somente_digitos(cfop))
+        return (' WHERE ' + ' AND '.join(condicoes)) if condicoes else '', parametros
+    
+    def consultar(self, emitente=None, destinatario=None, desde=None, ate=None, cfop=None):
+        """Notas gravadas que atendem aos filtros; retorna (ArmazemBruto, IndiceEventos)
+        
+        desde e ate são datas de emissão 'AAAA-MM-DD' (ou date), inclusive;
+        CNPJs podem vir com pontuação. Com cfop, entram as notas com algum
+        item desse CFOP, só com esses itens. As notas vêm na ordem de emissão.
+        """
+        where, parametros = self._filtro(emitente, destinatario, desde, ate, cfop)
+        colunas_notas = [campo_id for campo_id in _COLUNAS_NOTAS if campo_id != 'chave']
+        # Com cfop o WHERE já existe (filtro das notas); os itens são filtrados também
+        filtro_itens = ' AND p.cfop = ?' if cfop else ''
+        parametros_itens = parametros + [_somente_digitos(cfop)] if cfop else parametros
+        
+        with self._lock:
+            notas = self.conexao.execute(
+                f"SELECT n.chave, n.arquivo, {', '.join('n.' + c for c in colunas_notas)} FROM notas n{where} "
+                'ORDER BY n.data_emissao, n.chave', parametros
+            ).fetchall()
+            
+            itens_por_chave = {}
+            cursor = self.conexao.execute(
+                f"SELECT p.chave, {', '.join('p.' + c for c in _COLUNAS_PRODUTOS)} FROM notas n "
+                f"JOIN produtos p ON p.chave = n.chave{where}{filtro_itens} ORDER BY p.chave, p.item",
+                parametros_itens
+            )
+            for chave, *valores in cursor:
+                itens_por_chave.setdefault(chave, []).append(valores)
+            
+            eventos = self.conexao.execute(
+                f"SELECT {', '.join('e.' + c for c in _COLUNAS_EVENTOS)} FROM eventos e "
+                f"WHERE e.chave IN (SELECT n.chave FROM notas n{where})", parametros
+            ).fetchall()
+        
+        # Colunas montadas direto das linhas, como o AcumuladorColunar as acumularia nota a nota
+        armazem = ArmazemBruto()
+        if notas:
+            colunas = [list(map(_texto, coluna)) for coluna in zip(*notas)]
+            armazem.notas['Arquivo'] = colunas[1]
+            armazem.notas['Chave de Acesso'] = colunas[0]
+            for campo_id, coluna in zip(colunas_notas, colunas[2:]):
+                armazem.notas[_COLUNAS_NOTAS[campo_id]] = coluna
+            armazem.total_notas = len(notas)
+        
+        itens = []
+        referencias = {'NF Número': [], 'NF Chave': [], 'Arquivo': []}
+        for chave, numero, arquivo in zip(armazem.notas.get('Chave de Acesso', ()), armazem.notas.get('Número NF', ()),
+                                          armazem.notas.get('Arquivo', ())):
+            itens_nota = itens_por_chave.get(chave)
+            if itens_nota:
+                itens.extend(itens_nota)
+                armazem.itens_por_nota.append(len(itens_nota))
+                referencias['NF Número'].append(numero)
+                referencias['NF Chave'].append(chave)
+                referencias['Arquivo'].append(arquivo)
+        
+        if itens:
+            armazem.referencias = referencias
+            armazem.colunas_produtos = list(referencias) + list(_COLUNAS_PRODUTOS.values())
+            for label, coluna in zip(_COLUNAS_PRODUTOS.values(), zip(*itens)):
+                armazem.produtos[label] = list(map(_texto, coluna))
+            armazem.total_produtos = len(itens)
+        
+        labels_eventos = list(_COLUNAS_EVENTOS.values())
+        indice = IndiceEventos(dict(zip(labels_eventos, evento)) for evento in eventos)
+        return armazem, indice
+    
+    def projetar(self, campos_notas, campos_produtos, formatar=True, **filtros):
+        """Monta (df_notas, df_produtos) das notas gravadas que atendem aos filtros (ver consultar)
+        
+        As colunas são as de uma extração dos XMLs com os mesmos campos;
+        se houver eventos gravados e o campo 'chave' for selecionado, as
+        notas ganham a situação e as cartas de correção (ver event_index).
+        """
+        armazem, indice = self.consultar(**filtros)
+        df_notas, df_produtos = armazem.projetar(campos_notas, campos_produtos, formatar)
+        if len(indice) and not df_notas.empty and 'Chave de Acesso' in df_notas.columns:
+            df_notas = indice.aplicar(df_notas, armazem.notas['Chave de Acesso'])
+        return df_notas, df_produtos
+    
+    def _registrar_escrita(self):
+        """Faz commit a cada GRAVACOES_POR_COMMIT notas (chamar com o lock)"""
+        self._pendentes += 1
+        if self._pendentes >= GRAVACOES_POR_COMMIT:
+            self.conexao.commit()
+            self._pendentes = 0
+    
+    def estatisticas(self):
+        """Totais do banco e das gravações desta instância"""
+        with self._lock:
+            contagens = {
+                tabela: self.conexao.execute(f'SELECT COUNT(*) FROM {tabela}').fetchone()[0]
+                for tabela in ('notas', 'produtos', 'eventos')
+            }
+        return {
+            **contagens,
+            'gravadas': self.gravadas,
+            'ignoradas': self.ignoradas,
+            'sem_chave': self.sem_chave,
+        }
+    
+    def salvar(self):
+        """Confirma as gravações pendentes"""
+        with self._lock:
+            self.conexao.commit()
+            self._pendentes = 0
+    
+    def fechar(self):
+        """Confirma as gravações pendentes e fecha a conexão"""
+        with self._lock:
+            self.conexao.commit()
+            self.conexao.close()
@@ -0,0 +1,132 @@
+# raw_store.py
+"""Armazenamento colunar de todos os campos extraídos, em texto bruto
+
+Um lote é extraído uma única vez com o catálogo completo de campos
+(CAMPOS_DISPONIVEIS e CAMPOS_PRODUTOS) e sem conversão de tipos; depois,
+qualquer seleção de campos, com ou sem formatar, é montada só projetando
+e convertendo colunas, sem reabrir os XMLs.
+
+Exemplo:
+    armazem = ArmazemBruto()
+    FileProcessor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, formatar=False,
+                  destino=armazem).processar_zip(arquivo)
+    df_notas, df_produtos = armazem.projetar(campos_notas, campos_produtos)
+"""
+
+import pandas as pd
+
+from columnar import AcumuladorColunar
+from config import CAMPOS_DISPONIVEIS, CAMPOS_PRODUTOS
+from document_types import ABAS_DOCUMENTOS
+from utils import converter_valor
+
+# Catálogo completo, na ordem de config.py
+CAMPOS_TODOS_NOTAS = [campo_id for categoria in CAMPOS_DISPONIVEIS.values() for campo_id in categoria]
+CAMPOS_TODOS_PRODUTOS = list(CAMPOS_PRODUTOS)
+
+# Colunas de referência à nota nos produtos: (coluna, campo da nota que as habilita)
+_REFERENCIAS_PRODUTO = [('NF Número', 'numero_nf'), ('NF Chave', 'chave')]
+
+class ArmazemBruto(AcumuladorColunar):
+    """Colunas de texto bruto de notas e produtos, projetadas sob demanda
+    
+    Usado como destino de um FileProcessor configurado com
+    CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS e formatar=False. Colunas
+    convertidas são guardadas após o primeiro uso.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._convertidas = {}
+        
+        campos_config = {}
+        for categoria in CAMPOS_DISPONIVEIS.values():
+            campos_config.update(categoria)
+        self._campos_config_notas = campos_config
+    
+    def adicionar(self, dados_nota, produtos):
+        """Acrescenta uma nota e seus produtos às colunas"""
+        super().adicionar(dados_nota, produtos)
+        self._convertidas = {}
+    
+    def _coluna(self, tabela, label, tipo, formatar):
+        """Coluna bruta ou convertida para o tipo (cada valor distinto é convertido uma vez)
+        
+        Referências à nota nos produtos são convertidas uma vez por nota e
+        expandidas depois.
+        """
+        if tabela == 'notas':
+            bruta = self.notas[label]
+        elif label in self.referencias:
+            bruta = self.referencias[label]
+        else:
+            bruta = self.produtos[label]
+        
+        if formatar:
+            chave = (tabela, label, tipo)
+            convertida = self._convertidas.get(chave)
+            if convertida is None:
+                conversoes = {valor: converter_valor(valor, tipo) for valor in set(bruta)}
+                convertida = self._convertidas[chave] = [conversoes[valor] for valor in bruta]
+            bruta = convertida
+        
+        if tabela == 'produtos' and label in self.referencias:
+            return self.expandir(bruta)
+        return bruta
+    
+    def projetar(self, campos_notas, campos_produtos, formatar=True):
+        """Monta (df_notas, df_produtos) como uma extração só dos campos informados
+        
+        O resultado é o mesmo de FileProcessor(campos_notas, campos_produtos,
+        formatar) sobre os mesmos arquivos: mesmas colunas, na mesma ordem,
+        e valores tipados com formatar=True.
+        """
+        if not self.total_notas:
+            return pd.DataFrame(), pd.DataFrame()
+        
+        colunas_notas = {'Arquivo': self.notas['Arquivo']}
+        selecionados = []
+        for campo_id in campos_notas:
+            config = self._campos_config_notas.get(campo_id)
+            if config is not None:
+                colunas_notas[config['label']] = self._coluna('notas', config['label'], config['tipo'], formatar)
+                selecionados.append(campo_id)
+        
+        # Sem campos de produto a extração não percorre os det
+        if not campos_produtos or not self.total_produtos:
+            return pd.DataFrame(colunas_notas), pd.DataFrame()
+        
+        colunas_produtos = {}
+        for coluna, campo_id in _REFERENCIAS_PRODUTO:
+            if campo_id in selecionados:
+                tipo = self._campos_config_notas[campo_id]['tipo']
+                colunas_produtos[coluna] = self._coluna('produtos', coluna, tipo, formatar)
+        colunas_produtos['Arquivo'] = self.coluna_produtos('Arquivo')
+        
+        for campo_id in campos_produtos:
+            config = CAMPOS_PRODUTOS.get(campo_id)
+            if config is not None:
+                colunas_produtos[config['label']] = self._coluna('produtos', config['label'], config['tipo'], formatar)
+        
+        return pd.DataFrame(colunas_notas), pd.DataFrame(colunas_produtos)
+
+def projetar_documentos(documentos, formatar=True):
+    """DataFrames dos CT-e e eventos extraídos com formatar=False (dict tipo -> registros)
+    
+    Com formatar=True cada coluna é convertida para o tipo do campo, um
+    valor distinto por vez; tipos sem registros ficam de fora.
+    """
+    dataframes = {}
+    for tipo, registros in documentos.items():
+        if not registros:
+            continue
+        
+        df = pd.DataFrame(registros)
+        if formatar:
+            tipos_colunas = ABAS_DOCUMENTOS[tipo][1]
+            for coluna in df.columns:
+                if coluna in tipos_colunas:
+                    conversoes = {valor: converter_valor(valor, tipos_colunas[coluna]) for valor in set(df[coluna])}
+                    df[coluna] = [conversoes[valor] for valor in df[coluna]]
+        dataframes[tipo] = df
+    return dataframes
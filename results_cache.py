@@ -0,0 +1,62 @@
+# results_cache.py
+"""Cache em memória de resultados de processamento completos
+
+Guarda, por conteúdo enviado e opções selecionadas, os DataFrames já
+montados e as planilhas geradas, para que a interface reapresente o
+resultado sem reprocessar os XMLs. Não depende do Streamlit.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# Resultados mantidos por padrão; os menos usados saem primeiro
+MAX_ENTRADAS_PADRAO = 8
+
+def hash_arquivos(arquivos):
+    """SHA-256 do conteúdo (e dos nomes) de um ou mais arquivos enviados
+    
+    arquivos são objetos com .name e .getvalue() (como o UploadedFile do
+    Streamlit); a ordem não altera o resultado.
+    """
+    resumos = sorted(
+        (arquivo.name, hashlib.sha256(arquivo.getvalue()).hexdigest())
+        for arquivo in arquivos
+    )
+    return hashlib.sha256(json.dumps(resumos).encode('utf-8')).hexdigest()
+
+def chave_resultado(hash_conteudo, **opcoes):
+    """Chave de um resultado: hash do conteúdo mais as opções que alteram a extração"""
+    return hashlib.sha256(
+        json.dumps([hash_conteudo, opcoes], sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+
+class CacheResultados:
+    """LRU de resultados, seguro para uso por várias sessões ao mesmo tempo"""
+    
+    def __init__(self, max_entradas=MAX_ENTRADAS_PADRAO):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obter(self, chave):
+        """Retorna o resultado da chave, ou None se não houver"""
+        with self._lock:
+            resultado = self._entradas.get(chave)
+            if resultado is not None:
+                self._entradas.move_to_end(chave)
+            return resultado
+    
+    def gravar(self, chave, resultado):
+        """Armazena um resultado, descartando os menos usados além do limite"""
+        with self._lock:
+            self._entradas[chave] = resultado
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+    
+    def limpar(self):
+        """Remove todos os resultados"""
+        with self._lock:
+            self._entradas.clear()
@@ -0,0 +1,37 @@
+# streamlit_progress.py
+"""Exibição no Streamlit dos eventos de andamento do FileProcessor
+
+O FileProcessor já limita os eventos 'progresso' a poucos por segundo
+(ver INTERVALO_PROGRESSO); cada um redesenha a barra e o status uma vez.
+"""
+
+import streamlit as st
+
+from file_processor import descrever_progresso
+
+class ProgressoStreamlit:
+    """Callback de progresso que desenha barra, status e avisos no Streamlit"""
+    
+    def __init__(self):
+        self.progress_bar = None
+        self.status_text = None
+    
+    def __call__(self, evento):
+        tipo = evento['evento']
+        
+        if tipo == 'inicio':
+            self.progress_bar = st.progress(0)
+            self.status_text = st.empty()
+        
+        elif tipo == 'progresso' and self.progress_bar is not None:
+            self.status_text.text(f"🔄 Processando: {evento['arquivo']} ({descrever_progresso(evento)})")
+            self.progress_bar.progress(evento['concluidos'] / evento['total'])
+        
+        elif tipo == 'aviso':
+            st.warning(evento['mensagem'])
+        
+        elif tipo == 'fim' and self.progress_bar is not None:
+            self.status_text.empty()
+            self.progress_bar.empty()
+            self.progress_bar = None
+            self.status_text = None
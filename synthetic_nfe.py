@@ -0,0 +1,165 @@
+# synthetic_nfe.py
+"""Gerador de XMLs sintéticos de NF-e 4.00 para testes de desempenho
+
+Exemplo:
+    python synthetic_nfe.py corpus.zip --notas 10000 --itens 5 --variante misto
+"""
+
+import argparse
+import random
+import sys
+import zipfile
+from datetime import datetime, timedelta
+
+NAMESPACE_NFE = 'http://www.portalfiscal.inf.br/nfe'
+
+# Variantes de documento: (com namespace, dentro de nfeProc)
+VARIANTES = {
+    'ns-proc': (True, True),
+    'ns-nfe': (True, False),
+    'semns-proc': (False, True),
+    'semns-nfe': (False, False),
+}
+
+UFS = [('35', 'SP', 'Sao Paulo'), ('33', 'RJ', 'Rio de Janeiro'), ('31', 'MG', 'Belo Horizonte'),
+       ('41', 'PR', 'Curitiba'), ('43', 'RS', 'Porto Alegre'), ('29', 'BA', 'Salvador')]
+CFOPS = ['5102', '5405', '6102', '6108', '5949']
+UNIDADES = ['UN', 'KG', 'CX', 'PC', 'LT']
+
+def digito_chave(chave43):
+    """Dígito verificador (módulo 11) da chave de acesso"""
+    soma = 0
+    peso = 2
+    for digito in reversed(chave43):
+        soma += int(digito) * peso
+        peso = 2 if peso == 9 else peso + 1
+    resto = soma % 11
+    return '0' if resto < 2 else str(11 - resto)
+
+def gerar_chave(cuf, emissao, cnpj, modelo, serie, numero, codigo):
+    """Monta uma chave de acesso de 44 dígitos com dígito verificador"""
+    chave = f"{cuf}{emissao:%y%m}{cnpj}{modelo}{serie:03d}{numero:09d}1{codigo:08d}"
+    return chave + digito_chave(chave)
+
+def _grupo_icms(rng, v_prod):
+    """Grupo de ICMS variado (regime normal ou Simples Nacional)"""
+    if rng.random() < 0.3:
+        return '<ICMSSN102><orig>0</orig><CSOSN>102</CSOSN></ICMSSN102>'
+    v_icms = v_prod * 0.18
+    return (f'<ICMS00><orig>0</orig><CST>00</CST><modBC>3</modBC><vBC>{v_prod:.2f}</vBC>'
+            f'<pICMS>18.00</pICMS><vICMS>{v_icms:.2f}</vICMS></ICMS00>')
+
+def _item(rng, n_item):
+    """XML de um det com produto e impostos"""
+    codigo = rng.randrange(1, 50000)
+    quantidade = rng.randrange(1, 100)
+    unitario = rng.randrange(100, 100000) / 100
+    v_prod = quantidade * unitario
+    v_pis = v_prod * 0.0165
+    v_cofins = v_prod * 0.076
+    return (
+        f'<det nItem="{n_item}"><prod><cProd>P{codigo:05d}</cProd><cEAN>789{codigo:010d}</cEAN>'
+        f'<xProd>PRODUTO SINTETICO {codigo}</xProd><NCM>{rng.randrange(10000000, 99999999)}</NCM>'
+        f'<CFOP>{rng.choice(CFOPS)}</CFOP><uCom>{rng.choice(UNIDADES)}</uCom>'
+        f'<qCom>{quantidade:.4f}</qCom><vUnCom>{unitario:.10f}</vUnCom><vProd>{v_prod:.2f}</vProd>'
+        f'<cEANTrib>789{codigo:010d}</cEANTrib><uTrib>UN</uTrib><qTrib>{quantidade:.4f}</qTrib>'
+        f'<vUnTrib>{unitario:.10f}</vUnTrib><indTot>1</indTot></prod>'
+        f'<imposto><ICMS>{_grupo_icms(rng, v_prod)}</ICMS>'
+        f'<PIS><PISAliq><CST>01</CST><vBC>{v_prod:.2f}</vBC><pPIS>1.65</pPIS><vPIS>{v_pis:.2f}</vPIS></PISAliq></PIS>'
+        f'<COFINS><COFINSAliq><CST>01</CST><vBC>{v_prod:.2f}</vBC><pCOFINS>7.60</pCOFINS>'
+        f'<vCOFINS>{v_cofins:.2f}</vCOFINS></COFINSAliq></COFINS></imposto></det>'
+    ), v_prod, v_pis, v_cofins
+
+def gerar_nota(numero, itens=3, namespace=True, proc=True, semente=None):
+    """Gera o XML (str) de uma NF-e 4.00 com o número e a quantidade de itens informados
+    
+    Com a mesma semente (por padrão, o próprio número) o XML gerado é sempre o mesmo.
+    """
+    rng = random.Random(numero if semente is None else semente)
+    cuf, uf_emit, mun_emit = rng.choice(UFS)
+    _, uf_dest, mun_dest = rng.choice(UFS)
+    cnpj_emit = f"{rng.randrange(10**13):014d}"
+    emissao = datetime(2024, 1, 1, 8) + timedelta(minutes=rng.randrange(366 * 24 * 60))
+    serie = rng.randrange(1, 10)
+    chave = gerar_chave(cuf, emissao, cnpj_emit, '55', serie, numero, rng.randrange(10**8))
+    
+    if rng.random() < 0.7:
+        doc_dest = f'<CNPJ>{rng.randrange(10**13):014d}</CNPJ>'
+    else:
+        doc_dest = f'<CPF>{rng.randrange(10**10):011d}</CPF>'
+    
+    dets = []
+    v_prod = v_pis = v_cofins = 0.0
+    for n_item in range(1, itens + 1):
+        xml_item, v_item, v_pis_item, v_cofins_item = _item(rng, n_item)
+        dets.append(xml_item)
+        v_prod += v_item
+        v_pis += v_pis_item
+        v_cofins += v_cofins_item
+    
+    xmlns = f' xmlns="{NAMESPACE_NFE}"' if namespace else ''
+    nfe = (
+        f'<NFe{xmlns}><infNFe versao="4.00" Id="NFe{chave}">'
+        f'<ide><cUF>{cuf}</cUF><cNF>{chave[35:43]}</cNF><natOp>VENDA DE MERCADORIA</natOp><mod>55</mod>'
+        f'<serie>{serie}</serie><nNF>{numero}</nNF><dhEmi>{emissao:%Y-%m-%dT%H:%M:%S}-03:00</dhEmi>'
+        f'<tpNF>1</tpNF><idDest>1</idDest><tpImp>1</tpImp><tpEmis>1</tpEmis><cDV>{chave[-1]}</cDV>'
+        f'<tpAmb>2</tpAmb><finNFe>1</finNFe><indFinal>0</indFinal><indPres>1</indPres><procEmi>0</procEmi>'
+        f'<verProc>sintetico</verProc></ide>'
+        f'<emit><CNPJ>{cnpj_emit}</CNPJ><xNome>EMITENTE SINTETICO {cnpj_emit[:4]} LTDA</xNome>'
+        f'<xFant>EMITENTE {cnpj_emit[:4]}</xFant><enderEmit><xLgr>RUA A</xLgr><nro>1</nro><xBairro>CENTRO</xBairro>'
+        f'<xMun>{mun_emit}</xMun><UF>{uf_emit}</UF><CEP>01000000</CEP></enderEmit>'
+        f'<IE>{rng.randrange(10**11):012d}</IE><CRT>3</CRT></emit>'
+        f'<dest>{doc_dest}<xNome>DESTINATARIO {numero}</xNome><enderDest><xLgr>RUA B</xLgr><nro>2</nro>'
+        f'<xBairro>CENTRO</xBairro><xMun>{mun_dest}</xMun><UF>{uf_dest}</UF></enderDest>'
+        f'<indIEDest>9</indIEDest></dest>'
+        f'{"".join(dets)}'
+        f'<total><ICMSTot><vBC>0.00</vBC><vICMS>0.00</vICMS><vProd>{v_prod:.2f}</vProd><vFrete>0.00</vFrete>'
+        f'<vSeg>0.00</vSeg><vDesc>0.00</vDesc><vIPI>0.00</vIPI><vPIS>{v_pis:.2f}</vPIS>'
+        f'<vCOFINS>{v_cofins:.2f}</vCOFINS><vOutro>0.00</vOutro><vNF>{v_prod:.2f}</vNF></ICMSTot></total>'
+        f'<transp><modFrete>9</modFrete></transp>'
+        f'<infAdic><infCpl>NOTA GERADA PARA TESTES DE DESEMPENHO</infCpl></infAdic>'
+        f'</infNFe></NFe>'
+    )
+    
+    declaracao = '<?xml version="1.0" encoding="UTF-8"?>'
+    if not proc:
+        return declaracao + nfe
+    
+    return (
+        f'{declaracao}<nfeProc{xmlns} versao="4.00">{nfe}'
+        f'<protNFe versao="4.00"><infProt><tpAmb>2</tpAmb><verAplic>sintetico</verAplic><chNFe>{chave}</chNFe>'
+        f'<dhRecbto>{emissao:%Y-%m-%dT%H:%M:%S}-03:00</dhRecbto><nProt>1{numero:014d}</nProt>'
+        f'<cStat>100</cStat><xMotivo>Autorizado o uso da NF-e</xMotivo></infProt></protNFe></nfeProc>'
+    )
+
+def gerar_corpus(quantidade, itens=3, variante='ns-proc', inicio=1):
+    """Gera (nome, bytes) de quantidade notas; variante 'misto' alterna entre as quatro variantes"""
+    nomes_variantes = list(VARIANTES)
+    for numero in range(inicio, inicio + quantidade):
+        nome_variante = nomes_variantes[numero % len(nomes_variantes)] if variante == 'misto' else variante
+        namespace, proc = VARIANTES[nome_variante]
+        xml = gerar_nota(numero, itens, namespace, proc)
+        yield f"nfe_{numero:09d}.xml", xml.encode('utf-8')
+
+def gravar_zip(caminho, quantidade, itens=3, variante='ns-proc'):
+    """Grava o corpus sintético em um ZIP e retorna o caminho"""
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as z:
+        for nome, conteudo in gerar_corpus(quantidade, itens, variante):
+            z.writestr(nome, conteudo)
+    return caminho
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um ZIP com XMLs sintéticos de NF-e 4.00.")
+    parser.add_argument('saida', help="Arquivo ZIP de saída")
+    parser.add_argument('--notas', type=int, default=1000, help="Quantidade de notas")
+    parser.add_argument('--itens', type=int, default=3, help="Itens (det) por nota")
+    parser.add_argument('--variante', choices=list(VARIANTES) + ['misto'], default='ns-proc',
+                        help="Com/sem namespace e nfeProc/NFe; 'misto' alterna entre todas")
+    args = parser.parse_args(argv)
+    
+    gravar_zip(args.saida, args.notas, args.itens, args.variante)
+    print(f"✅ {args.notas} nota(s) gravadas em {args.saida}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
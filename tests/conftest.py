@@ -0,0 +1,7 @@
+# conftest.py
+"""Torna os módulos da raiz do projeto importáveis pelos testes"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+# test_backends.py
+"""Paridade entre os backends de parse lxml (XPath) e etree (árvore de prefixos)
+
+Os dois backends do NFeExtractor devem produzir o mesmo resultado sobre o
+corpus sintético (synthetic_nfe), com e sem namespace, com e sem nfeProc,
+e também em casos de borda: grupos ausentes, vários det e valores com os
+separadores da expressão XPath única e da transformação XSLT dos det
+(fallback de um slot ou de um det por vez).
+"""
+
+import re
+
+import pytest
+
+pytest.importorskip('lxml')
+
+from raw_store import CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS
+from synthetic_nfe import VARIANTES, gerar_nota
+from xml_extractor import NFeExtractor, _SEPARADOR_ITENS, _SEPARADOR_XPATH
+
+def _extrair(xml, backend, formatar):
+    extractor = NFeExtractor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, formatar, backend=backend)
+    return extractor.extrair_nota_completa(xml, 'nota.xml')
+
+def _comparar(xml, formatar):
+    """Extrai com os dois backends, confere a igualdade e retorna o resultado"""
+    resultado_lxml = _extrair(xml, 'lxml', formatar)
+    resultado_etree = _extrair(xml, 'etree', formatar)
+    assert resultado_lxml == resultado_etree
+    assert resultado_lxml[0] is not None
+    return resultado_lxml
+
+@pytest.mark.parametrize('formatar', [True, False])
+@pytest.mark.parametrize('variante', list(VARIANTES))
+def test_variantes_do_corpus(variante, formatar):
+    namespace, proc = VARIANTES[variante]
+    for numero in range(1, 21):
+        xml = gerar_nota(numero, itens=3, namespace=namespace, proc=proc).encode('utf-8')
+        _comparar(xml, formatar)
+
+@pytest.mark.parametrize('formatar', [True, False])
+@pytest.mark.parametrize('namespace', [True, False])
+def test_varios_det(namespace, formatar):
+    xml = gerar_nota(7, itens=12, namespace=namespace).encode('utf-8')
+    dados, produtos = _comparar(xml, formatar)
+    
+    assert len(produtos) == 12
+    assert len({produto['Código'] for produto in produtos}) > 1
+    assert {produto['NF Chave'] for produto in produtos} == {dados['Chave de Acesso']}
+
+@pytest.mark.parametrize('formatar', [True, False])
+@pytest.mark.parametrize('namespace', [True, False])
+def test_grupos_ausentes(namespace, formatar):
+    xml = gerar_nota(3, itens=4, namespace=namespace)
+    # Sem imposto em nenhum item e sem o grupo de totais da nota
+    xml = re.sub(r'<imposto>.*?</imposto>', '', xml)
+    xml = re.sub(r'<total>.*?</total>', '', xml)
+    dados, produtos = _comparar(xml.encode('utf-8'), formatar)
+    
+    vazio = None if formatar else ''
+    assert dados['Valor Total'] == vazio
+    assert all(produto['Valor ICMS'] == vazio and produto['CST PIS'] == '' for produto in produtos)
+    assert all(produto['CFOP'] for produto in produtos)
+
+@pytest.mark.parametrize('separador', [_SEPARADOR_XPATH, _SEPARADOR_ITENS])
+@pytest.mark.parametrize('formatar', [True, False])
+@pytest.mark.parametrize('namespace', [True, False])
+def test_separador_nos_valores(namespace, formatar, separador):
+    xml = gerar_nota(5, itens=3, namespace=namespace)
+    marcado = f'PRODUTO{separador}COM SEPARADOR'
+    xml = xml.replace('<xProd>', f'<xProd>{marcado} ', 1)
+    xml = xml.replace('<xNome>', f'<xNome>{marcado} ', 1)
+    dados, produtos = _comparar(xml.encode('utf-8'), formatar)
+    
+    assert dados['Nome Emitente'].startswith(marcado)
+    assert produtos[0]['Descrição'].startswith(marcado)
+    assert not produtos[1]['Descrição'].startswith(marcado)
+
+@pytest.mark.parametrize('namespace', [True, False])
+def test_texto_acentuado(namespace):
+    xml = gerar_nota(6, itens=2, namespace=namespace)
+    xml = xml.replace('<xProd>', '<xProd>AÇÚCAR CRISTAL SÃO JOÃO ', 1)
+    _, produtos = _comparar(xml.encode('utf-8'), False)
+    
+    assert produtos[0]['Descrição'].startswith('AÇÚCAR CRISTAL SÃO JOÃO')
@@ -0,0 +1,24 @@
+# test_event_index.py
+"""Situação das notas pelo IndiceEventos conforme o retorno dos eventos"""
+
+from event_index import (IndiceEventos, SITUACAO_AUTORIZADA, SITUACAO_CANCELADA,
+                         SITUACAO_CANCELAMENTO_PENDENTE)
+
+def _evento(chave, tipo='110111', status='135', sequencia='1'):
+    return {'Chave de Acesso': chave, 'Tipo Evento': tipo, 'Status Retorno': status, 'Sequência': sequencia}
+
+def test_so_eventos_registrados_cancelam():
+    indice = IndiceEventos([
+        _evento('A'),
+        _evento('B', status=''),
+        _evento('C', status='573'),
+        _evento('D', status=''),
+        _evento('D', status='155'),
+        _evento('E', tipo='110110', status=''),
+        _evento('E', tipo='110110', status='135', sequencia='2'),
+    ])
+    situacoes, cartas = indice.situacoes(['A', 'B', 'C', 'D', 'E'])
+    
+    assert situacoes == [SITUACAO_CANCELADA, SITUACAO_CANCELAMENTO_PENDENTE, SITUACAO_AUTORIZADA,
+                         SITUACAO_CANCELADA, SITUACAO_AUTORIZADA]
+    assert cartas == [0, 0, 0, 0, 1]
@@ -0,0 +1,59 @@
+# test_excel_generator.py
+"""Paridade entre a planilha gravada em streaming e a gravada pelo pandas
+
+Com streaming=True o ExcelGenerator deve gravar as mesmas abas, na mesma
+ordem, com os mesmos valores, inclusive quando a aba de produtos passa do
+limite de linhas e é dividida em partes numeradas.
+"""
+
+from functools import partial
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import excel_generator
+from excel_generator import ExcelGenerator
+from file_processor import FileProcessor
+from raw_store import CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS
+from synthetic_nfe import gravar_zip
+
+def _conteudo(arquivo):
+    """Nomes das abas e valores de cada uma, linha a linha"""
+    workbook = load_workbook(arquivo)
+    return workbook.sheetnames, {
+        planilha.title: [list(linha) for linha in planilha.iter_rows(values_only=True)]
+        for planilha in workbook.worksheets
+    }
+
+@pytest.fixture(scope='module')
+def dataframes(tmp_path_factory):
+    caminho = gravar_zip(str(tmp_path_factory.mktemp('corpus') / 'corpus.zip'), 12, itens=3, variante='misto')
+    processor = FileProcessor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, callback_progresso=lambda evento: None)
+    notas, produtos = processor.processar_zip(caminho)
+    return pd.DataFrame(notas), pd.DataFrame(produtos)
+
+def _comparar(df_notas, df_produtos, formatar):
+    """Gera a planilha nos dois modos, confere a igualdade e retorna as abas"""
+    pandas = _conteudo(ExcelGenerator().criar_excel(df_notas, df_produtos, formatar=formatar))
+    streaming = _conteudo(ExcelGenerator(streaming=True).criar_excel(df_notas, df_produtos, formatar=formatar))
+    assert streaming == pandas
+    return pandas[0]
+
+@pytest.mark.parametrize('formatar', [True, False])
+def test_mesmos_valores(dataframes, formatar):
+    abas = _comparar(*dataframes, formatar)
+    
+    assert abas[:2] == ['Notas Fiscais', 'Produtos']
+
+@pytest.mark.parametrize('formatar', [True, False])
+def test_divisao_de_abas(dataframes, formatar, monkeypatch):
+    limite = 11
+    monkeypatch.setattr(excel_generator, 'LIMITE_LINHAS_EXCEL', limite)
+    monkeypatch.setattr(excel_generator, 'EscritorExcelStreaming',
+                        partial(excel_generator.EscritorExcelStreaming, linhas_por_aba=limite - 1))
+    abas = _comparar(*dataframes, formatar)
+    
+    # 12 notas e 36 itens, 10 linhas de dados por aba
+    assert abas[:6] == ['Notas Fiscais (1)', 'Notas Fiscais (2)',
+                        'Produtos (1)', 'Produtos (2)', 'Produtos (3)', 'Produtos (4)']
@@ -0,0 +1,98 @@
+# test_file_processor.py
+"""Processamento de arquivos pelo FileProcessor, sequencial e em pool"""
+
+import pandas as pd
+import pytest
+
+from columnar import AcumuladorColunar
+from file_processor import FileProcessor, TAMANHO_JANELA_TIPO
+from raw_store import CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS
+from synthetic_nfe import gerar_nota, gravar_zip
+
+class _Arquivo:
+    """Arquivo em memória com a interface do UploadedFile do Streamlit"""
+    
+    def __init__(self, name, conteudo):
+        self.name = name
+        self.conteudo = conteudo
+        self.size = len(conteudo)
+    
+    def read(self, tamanho=-1):
+        return self.conteudo if tamanho < 0 else self.conteudo[:tamanho]
+    
+    def seek(self, posicao):
+        pass
+
+def _processar(arquivos, workers):
+    eventos = []
+    processor = FileProcessor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, workers=workers,
+                              callback_progresso=eventos.append)
+    notas, produtos = processor.processar_arquivos_individuais(arquivos)
+    avisos = [evento['mensagem'] for evento in eventos if evento['evento'] == 'aviso']
+    return notas, produtos, avisos
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_xml_invalido_gera_aviso(workers):
+    arquivos = [
+        _Arquivo('nota1.xml', gerar_nota(1, itens=2).encode('utf-8')),
+        _Arquivo('quebrado.xml', gerar_nota(2, itens=2).encode('utf-8')[:-200]),
+        _Arquivo('nota3.xml', gerar_nota(3, itens=2).encode('utf-8')),
+    ]
+    notas, produtos, avisos = _processar(arquivos, workers)
+    
+    assert [nota['Arquivo'] for nota in notas] == ['nota1.xml', 'nota3.xml']
+    assert len(produtos) == 4
+    assert len(avisos) == 1 and 'quebrado.xml' in avisos[0]
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_copia_descartada_substitui_a_mantida_com_erro(workers):
+    proc = gerar_nota(1, itens=2, proc=True).encode('utf-8')
+    arquivos = [
+        _Arquivo('nota1.xml', gerar_nota(1, itens=2, proc=False).encode('utf-8')),
+        _Arquivo('nota1-proc.xml', proc[:-200]),
+        _Arquivo('nota2.xml', gerar_nota(2, itens=2).encode('utf-8')),
+    ]
+    eventos = []
+    processor = FileProcessor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, workers=workers,
+                              callback_progresso=eventos.append)
+    notas, produtos = processor.processar_arquivos_individuais(arquivos)
+    
+    assert [nota['Arquivo'] for nota in notas] == ['nota1.xml', 'nota2.xml']
+    assert len(produtos) == 4
+    assert processor.duplicadas == 0
+    avisos = [evento['mensagem'] for evento in eventos if evento['evento'] == 'aviso']
+    assert any('nota1-proc.xml' in aviso for aviso in avisos)
+
+def test_envelope_com_inf_nfe_alem_do_trecho_inicial():
+    nota = gerar_nota(1, itens=2, namespace=False, proc=False)
+    nota = nota[nota.index('<NFe'):]
+    envelope = f'<lote><cabecalho>{"x" * 5000}</cabecalho>{nota}</lote>'.encode('utf-8')
+    arquivos = [
+        _Arquivo('envelope.xml', envelope),
+        _Arquivo('outro.xml', f'<lote><cabecalho>{"x" * 5000}</cabecalho></lote>'.encode('utf-8')),
+        _Arquivo('distante.xml', f'<lote><cabecalho>{"x" * TAMANHO_JANELA_TIPO}</cabecalho>{nota}</lote>'.encode('utf-8')),
+    ]
+    notas, produtos, avisos = _processar(arquivos, 1)
+    
+    assert [nota['Arquivo'] for nota in notas] == ['envelope.xml']
+    assert len(produtos) == 2
+    assert len(avisos) == 1 and '2 arquivo(s) ignorado(s)' in avisos[0]
+
+@pytest.mark.parametrize('formatar', [True, False])
+def test_pool_e_acumulador_iguais_ao_sequencial(tmp_path, formatar):
+    caminho = gravar_zip(str(tmp_path / 'corpus.zip'), 40, itens=3, variante='misto')
+    
+    def processar(workers, destino=None):
+        processor = FileProcessor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, formatar, workers=workers,
+                                  destino=destino, callback_progresso=lambda evento: None)
+        return processor.processar_zip(caminho)
+    
+    notas, produtos = processar(1)
+    assert processar(2) == (notas, produtos)
+    
+    for workers in (1, 2):
+        acumulador = AcumuladorColunar()
+        processar(workers, acumulador)
+        df_notas, df_produtos = acumulador.dataframes()
+        pd.testing.assert_frame_equal(df_notas, pd.DataFrame(notas))
+        pd.testing.assert_frame_equal(df_produtos, pd.DataFrame(produtos))
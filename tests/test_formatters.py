@@ -0,0 +1,53 @@
+# test_formatters.py
+"""Paridade entre os formatadores de coluna e os formatadores de valor de utils
+
+Cada formatar_*_coluna (e aplicar_formatacao_coluna) deve produzir, valor
+a valor, o mesmo texto que a versão escalar, inclusive para nulos, textos
+vazios, valores repetidos e valores fora do formato esperado.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+NUMEROS = [1234.5, 0.0, -7.125, 1234.5, None, np.nan, 10, 'abc', 1e9]
+DATAS = ['2024-03-05T10:20:30-03:00', '2024-03-05', datetime(2023, 12, 31, 23, 59), None, '', 'invalida',
+         '2024-03-05']
+DOCUMENTOS = ['12345678000195', '12.345.678/0001-95', '12345678909', '123.456.789-09', '1234', None, '',
+              12345678909, '12345678000195']
+
+FORMATADORES = [
+    (utils.formatar_moeda_coluna, utils.formatar_moeda, NUMEROS),
+    (utils.formatar_numero_coluna, utils.formatar_numero, NUMEROS),
+    (utils.formatar_data_coluna, utils.formatar_data, DATAS),
+    (utils.formatar_cnpj_coluna, utils.formatar_cnpj, DOCUMENTOS),
+    (utils.formatar_cpf_coluna, utils.formatar_cpf, DOCUMENTOS),
+    (utils.formatar_cnpj_cpf_coluna, utils.formatar_cnpj_cpf, DOCUMENTOS),
+]
+
+@pytest.mark.parametrize('coluna, escalar, valores', FORMATADORES,
+                         ids=[escalar.__name__ for _, escalar, _ in FORMATADORES])
+def test_formatadores_de_coluna(coluna, escalar, valores):
+    assert list(coluna(valores)) == [escalar(valor) for valor in valores]
+
+@pytest.mark.parametrize('tipo, valores', [
+    ('moeda', NUMEROS),
+    ('numero', NUMEROS),
+    ('data', DATAS),
+    ('cnpj', DOCUMENTOS),
+    ('cpf', DOCUMENTOS),
+    ('cnpj_cpf', DOCUMENTOS),
+    ('texto', ['a', '', None, 3, 'a']),
+])
+def test_aplicar_formatacao_coluna(tipo, valores):
+    assert list(utils.aplicar_formatacao_coluna(valores, tipo)) == [
+        utils.aplicar_formatacao(valor, tipo) for valor in valores
+    ]
+
+def test_coluna_de_datas_do_pandas():
+    datas = pd.Series(pd.to_datetime(['2024-01-02', None, '2024-01-02', '2023-07-15']))
+    assert list(utils.formatar_data_coluna(datas)) == [utils.formatar_data(valor) for valor in datas]
@@ -0,0 +1,45 @@
+# test_raw_store.py
+"""Paridade entre a projeção do ArmazemBruto e a extração direta
+
+ArmazemBruto.projetar deve montar, para qualquer seleção de campos, com e
+sem formatar, os mesmos DataFrames de um FileProcessor configurado só com
+os campos selecionados: mesmas colunas, na mesma ordem, e mesmos valores.
+"""
+
+import pandas as pd
+import pytest
+
+from config import CAMPOS_PADRAO_NOTAS, CAMPOS_PADRAO_PRODUTOS
+from file_processor import FileProcessor
+from raw_store import ArmazemBruto, CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS
+from synthetic_nfe import gravar_zip
+
+SELECOES = {
+    'padrao': (CAMPOS_PADRAO_NOTAS, CAMPOS_PADRAO_PRODUTOS),
+    'todos': (CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS),
+    'sem-produtos': (CAMPOS_PADRAO_NOTAS, []),
+    'sem-chave': (['serie', 'data_emissao', 'valor_total'], ['descricao', 'icms_valor', 'pis_cst']),
+}
+
+def _processar(caminho, campos_notas, campos_produtos, formatar, destino=None):
+    processor = FileProcessor(campos_notas, campos_produtos, formatar, destino=destino,
+                              callback_progresso=lambda evento: None)
+    return processor.processar_zip(caminho)
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    caminho = gravar_zip(str(tmp_path_factory.mktemp('corpus') / 'corpus.zip'), 15, itens=3, variante='misto')
+    armazem = ArmazemBruto()
+    _processar(caminho, CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, False, armazem)
+    return caminho, armazem
+
+@pytest.mark.parametrize('formatar', [True, False])
+@pytest.mark.parametrize('selecao', list(SELECOES))
+def test_projecao_igual_a_extracao(corpus, selecao, formatar):
+    caminho, armazem = corpus
+    campos_notas, campos_produtos = SELECOES[selecao]
+    notas, produtos = _processar(caminho, campos_notas, campos_produtos, formatar)
+    df_notas, df_produtos = armazem.projetar(campos_notas, campos_produtos, formatar)
+    
+    pd.testing.assert_frame_equal(df_notas, pd.DataFrame(notas))
+    pd.testing.assert_frame_equal(df_produtos, pd.DataFrame(produtos))
@@ -0,0 +1,41 @@
+# test_streaming.py
+"""Paridade entre a extração incremental (iterparse) e a extração pela árvore
+
+Com streaming=True o NFeExtractor deve produzir o mesmo resultado da
+extração pela árvore, em todas as variantes do corpus sintético, com e sem
+formatar, e também quando faltam grupos inteiros da nota ou dos itens.
+"""
+
+import re
+
+import pytest
+
+from raw_store import CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS
+from synthetic_nfe import VARIANTES, gerar_nota
+from xml_extractor import NFeExtractor
+
+def _comparar(xml, formatar):
+    """Extrai nos dois modos, confere a igualdade e retorna o resultado"""
+    arvore = NFeExtractor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, formatar, backend='etree')
+    streaming = NFeExtractor(CAMPOS_TODOS_NOTAS, CAMPOS_TODOS_PRODUTOS, formatar, streaming=True)
+    resultado = arvore.extrair_nota_completa(xml, 'nota.xml')
+    assert streaming.extrair_nota_completa(xml, 'nota.xml') == resultado
+    assert resultado[0] is not None
+    return resultado
+
+@pytest.mark.parametrize('formatar', [True, False])
+@pytest.mark.parametrize('variante', list(VARIANTES))
+def test_variantes_do_corpus(variante, formatar):
+    namespace, proc = VARIANTES[variante]
+    for numero in range(1, 11):
+        xml = gerar_nota(numero, itens=4, namespace=namespace, proc=proc).encode('utf-8')
+        _comparar(xml, formatar)
+
+@pytest.mark.parametrize('formatar', [True, False])
+def test_grupos_ausentes(formatar):
+    xml = gerar_nota(3, itens=4)
+    xml = re.sub(r'<imposto>.*?</imposto>', '', xml)
+    xml = re.sub(r'<total>.*?</total>', '', xml)
+    _, produtos = _comparar(xml.encode('utf-8'), formatar)
+    
+    assert len(produtos) == 4
@@ -1,9 +1,12 @@
 # utils.py
 """Funções utilitárias para formatação e manipulação de dados"""
 
-from datetime import datetime
+from datetime import datetime, date
 import re
 
+import numpy as np
+import pandas as pd
+
 def formatar_moeda(valor):
     """Formata valor numérico como moeda brasileira"""
     try:
@@ -29,6 +32,8 @@ def formatar_data(data_str):
     try:
         if not data_str:
             return ''
+        if isinstance(data_str, (datetime, date)):
+            return data_str.strftime('%d/%m/%Y')
         # Remove timezone se existir
         data_str = data_str.split('-03:00')[0].split('T')[0]
         if len(data_str) == 10:  # YYYY-MM-DD
@@ -68,8 +73,16 @@ def formatar_cnpj_cpf(documento):
     return documento
 
 def aplicar_formatacao(valor, tipo):
-    """Aplica formatação baseada no tipo do campo"""
-    if valor is None or valor == '':
+    """Aplica formatação baseada no tipo do campo
+    
+    Aceita também uma coluna inteira (Series, lista, tupla ou array), que é
+    formatada de uma vez por aplicar_formatacao_coluna.
+    """
+    if isinstance(valor, (pd.Series, list, tuple, np.ndarray)):
+        return aplicar_formatacao_coluna(valor, tipo)
+    
+    # valor != valor identifica NaN/NaT vindos de colunas tipadas
+    if valor is None or valor == '' or valor != valor:
         return ''
     
     formatadores = {
@@ -85,6 +98,181 @@ def aplicar_formatacao(valor, tipo):
     formatador = formatadores.get(tipo, str)
     return formatador(valor)
 
+def _como_serie(valores):
+    """Converte lista/tupla/array em Series, preservando Series recebidas"""
+    if isinstance(valores, pd.Series):
+        return valores
+    return pd.Series(list(valores), dtype=object)
+
+def _formatar_coluna(valores, formatar_unicos, formatar_ausente):
+    """Formata cada valor distinto uma única vez e expande o resultado para a coluna
+    
+    formatar_unicos recebe uma Series com os valores distintos não nulos e
+    devolve os textos na mesma ordem; valores nulos (None/NaN/NaT) são
+    formatados um a um por formatar_ausente.
+    """
+    serie = _como_serie(valores)
+    codigos, unicos = pd.factorize(serie)
+    
+    resultado = np.empty(len(serie), dtype=object)
+    if len(unicos):
+        formatados = np.asarray(formatar_unicos(pd.Series(unicos)), dtype=object)
+        resultado[:] = formatados.take(codigos)
+    
+    ausentes = codigos == -1
+    if ausentes.any():
+        resultado[ausentes] = [formatar_ausente(valor) for valor in serie[ausentes]]
+    
+    return pd.Series(resultado, index=serie.index, dtype=object)
+
+def _mascarar_documentos(digitos):
+    """Aplica as máscaras de CNPJ (14 dígitos) e CPF (11 dígitos) a uma Series de dígitos"""
+    tamanho = digitos.str.len()
+    cnpj = (digitos.str[:2] + '.' + digitos.str[2:5] + '.' + digitos.str[5:8] + '/' +
+            digitos.str[8:12] + '-' + digitos.str[12:])
+    cpf = digitos.str[:3] + '.' + digitos.str[3:6] + '.' + digitos.str[6:9] + '-' + digitos.str[9:]
+    return tamanho, cnpj, cpf
+
+def _digitos(unicos):
+    """Mantém apenas os dígitos de cada valor"""
+    return unicos.astype(str).astype(object).str.replace(r'\D', '', regex=True)
+
+def formatar_moeda_coluna(valores):
+    """Versão de formatar_moeda para uma coluna inteira"""
+    return _formatar_coluna(valores, lambda unicos: unicos.map(formatar_moeda), formatar_moeda)
+
+def formatar_numero_coluna(valores, decimais=2):
+    """Versão de formatar_numero para uma coluna inteira"""
+    return _formatar_coluna(
+        valores,
+        lambda unicos: unicos.map(lambda valor: formatar_numero(valor, decimais)),
+        lambda valor: formatar_numero(valor, decimais)
+    )
+
+def formatar_data_coluna(valores):
+    """Versão de formatar_data para uma coluna inteira"""
+    def formatar_unicos(unicos):
+        if pd.api.types.is_datetime64_any_dtype(unicos):
+            return unicos.dt.strftime('%d/%m/%Y')
+        return unicos.map(formatar_data)
+    return _formatar_coluna(valores, formatar_unicos, formatar_data)
+
+def formatar_cnpj_coluna(valores):
+    """Versão de formatar_cnpj para uma coluna inteira"""
+    def formatar_unicos(unicos):
+        digitos = _digitos(unicos)
+        tamanho, cnpj, _ = _mascarar_documentos(digitos)
+        return cnpj.where(tamanho == 14, digitos)
+    return _formatar_coluna(valores, formatar_unicos, formatar_cnpj)
+
+def formatar_cpf_coluna(valores):
+    """Versão de formatar_cpf para uma coluna inteira"""
+    def formatar_unicos(unicos):
+        digitos = _digitos(unicos)
+        tamanho, _, cpf = _mascarar_documentos(digitos)
+        return cpf.where(tamanho == 11, digitos)
+    return _formatar_coluna(valores, formatar_unicos, formatar_cpf)
+
+def formatar_cnpj_cpf_coluna(valores):
+    """Versão de formatar_cnpj_cpf para uma coluna inteira"""
+    def formatar_unicos(unicos):
+        digitos = _digitos(unicos)
+        tamanho, cnpj, cpf = _mascarar_documentos(digitos)
+        return cnpj.where(tamanho == 14, cpf.where(tamanho == 11, digitos))
+    return _formatar_coluna(valores, formatar_unicos, formatar_cnpj_cpf)
+
+def aplicar_formatacao_coluna(valores, tipo):
+    """Aplica formatação a uma coluna inteira de acordo com o tipo do campo
+    
+    Equivale a aplicar aplicar_formatacao a cada valor: nulos e textos
+    vazios viram '', e cada valor distinto é formatado uma única vez.
+    """
+    serie = _como_serie(valores)
+    
+    formatadores = {
+        'moeda': formatar_moeda_coluna,
+        'numero': formatar_numero_coluna,
+        'data': formatar_data_coluna,
+        'cnpj': formatar_cnpj_coluna,
+        'cpf': formatar_cpf_coluna,
+        'cnpj_cpf': formatar_cnpj_cpf_coluna,
+        'texto': lambda valores: _formatar_coluna(valores, lambda unicos: unicos.astype(str), str)
+    }
+    
+    vazios = serie.isna().to_numpy(copy=True)
+    if serie.dtype == object or pd.api.types.is_string_dtype(serie):
+        vazios |= (serie == '').to_numpy(dtype=bool, na_value=False)
+    
+    resultado = pd.Series('', index=serie.index, dtype=object)
+    if not vazios.all():
+        formatador = formatadores.get(tipo, formatadores['texto'])
+        resultado[~vazios] = formatador(serie[~vazios]).to_numpy()
+    
+    return resultado
+
+def converter_decimal(valor):
+    """Converte texto numérico do XML em float (None se vazio ou inválido)"""
+    try:
+        if valor == '' or valor is None:
+            return None
+        return float(str(valor).replace(',', '.'))
+    except (TypeError, ValueError):
+        return None
+
+def converter_data(data_str):
+    """Converte data/hora ISO do XML em datetime, sem fuso horário
+    
+    O horário é mantido no fuso de emissão da nota; o offset é descartado
+    porque o Excel não armazena datas com fuso.
+    """
+    try:
+        if not data_str:
+            return None
+        return datetime.fromisoformat(data_str).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+def converter_documento(documento):
+    """Mantém apenas os dígitos de CNPJ/CPF"""
+    return re.sub(r'\D', '', str(documento))
+
+def converter_valor(valor, tipo):
+    """Converte o texto extraído do XML no tipo do campo
+    
+    moeda/numero viram float, data vira datetime e cnpj/cpf/cnpj_cpf viram
+    strings só com dígitos. A formatação brasileira (R$, DD/MM/AAAA,
+    máscaras) fica para a exibição ou gravação, via aplicar_formatacao.
+    Valores vazios viram None, exceto em campos de texto, que ficam ''
+    como na extração sem formatação.
+    """
+    conversores = {
+        'moeda': converter_decimal,
+        'numero': converter_decimal,
+        'data': converter_data,
+        'cnpj': converter_documento,
+        'cpf': converter_documento,
+        'cnpj_cpf': converter_documento,
+        'texto': str
+    }
+    
+    conversor = conversores.get(tipo, str)
+    if valor is None or valor == '':
+        return '' if conversor is str else None
+    return conversor(valor)
+
+def formatar_dataframe(df, tipos_colunas):
+    """Retorna cópia do DataFrame com as colunas formatadas para exibição
+    
+    tipos_colunas mapeia o label da coluna para o tipo do campo; colunas
+    sem tipo conhecido são mantidas como estão.
+    """
+    df_formatado = df.copy()
+    for coluna in df_formatado.columns:
+        tipo = tipos_colunas.get(coluna)
+        if tipo and tipo != 'texto':
+            df_formatado[coluna] = aplicar_formatacao_coluna(df_formatado[coluna], tipo)
+    return df_formatado
+
 def limpar_chave_nfe(chave):
     """Remove prefixo NFe da chave de acesso"""
     if chave:
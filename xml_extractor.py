@@ -1,18 +1,378 @@
 # xml_extractor.py
-"""Módulo para extração de dados de XMLs NF-e"""
+"""Módulo para extração de dados de XMLs NF-e, CT-e e eventos"""
 
+import json
+import re
 import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from io import BytesIO
+from time import perf_counter
+from xml.sax.saxutils import quoteattr
 from config import XML_NAMESPACES, CAMPOS_DISPONIVEIS, CAMPOS_PRODUTOS
-from utils import aplicar_formatacao, limpar_chave_nfe
+from config import CAMPOS_CTE, CAMPOS_EVENTO, CAMPOS_RETORNO_EVENTO
+from utils import converter_valor, limpar_chave_nfe
+
+try:
+    from lxml import etree as _lxml_etree
+except ImportError:
+    _lxml_etree = None
+
+# Backends de parse: 'lxml' (se instalado, com XPath pré-compilado) ou 'etree'
+BACKENDS = ('lxml', 'etree')
+BACKEND_PADRAO = 'lxml' if _lxml_etree is not None else 'etree'
+
+# Separa os valores de todos os slots na expressão XPath única de um plano
+# (não-caractere Unicode; se aparecer em algum valor, os slots são avaliados um a um)
+_SEPARADOR_XPATH = '\ufdd0'
+
+# Separa os elementos na saída da transformação XSLT de executar_filhos
+# (se aparecer em algum valor, cada elemento é consultado separadamente)
+_SEPARADOR_ITENS = '\ufdd1'
+
+# Versão da lógica de extração; incrementar invalida resultados em cache
+VERSAO_EXTRACAO = 2
+
+# Bytes iniciais inspecionados para ler a chave de acesso sem parse
+TAMANHO_INICIO_CHAVE = 4096
+
+_RE_ID_INF_NFE = re.compile(rb'<(?:[\w.-]+:)?infNFe\b[^>]*?\bId\s*=\s*["\']NFe(\d{44})["\']')
+_RE_NFE_PROC = re.compile(rb'<(?:[\w.-]+:)?nfeProc\b')
+
+def ler_chave_acesso(inicio):
+    """Lê a chave de acesso dos bytes iniciais de um XML, sem fazer o parse
+    
+    Retorna (chave, eh_proc), onde eh_proc indica que a nota vem dentro de
+    um nfeProc (versão autorizada, com protocolo). chave é None se o atributo
+    Id do infNFe não estiver nos bytes informados.
+    """
+    encontrado = _RE_ID_INF_NFE.search(inicio)
+    if encontrado is None:
+        return None, False
+    
+    eh_proc = _RE_NFE_PROC.search(inicio, 0, encontrado.start()) is not None
+    return encontrado.group(1).decode('ascii'), eh_proc
+
+def _criar_parser_lxml():
+    """Parser lxml sem resolução de entidades nem acesso à rede"""
+    return _lxml_etree.XMLParser(resolve_entities=False, no_network=True)
+
+def _validar_backend(backend):
+    """Retorna o backend informado (ou o padrão), conferindo se está disponível"""
+    backend = backend or BACKEND_PADRAO
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de parse desconhecido: {backend}")
+    if backend == 'lxml' and _lxml_etree is None:
+        raise ImportError("O backend lxml requer o pacote lxml (pip install lxml).")
+    return backend
+
+def _prefixo_namespace(tag):
+    """Retorna o prefixo '{namespace}' de uma tag, ou '' se não houver"""
+    return tag[:tag.index('}') + 1] if tag.startswith('{') else ''
+
+class _NoPlano:
+    """Nó da árvore de prefixos de um plano de extração"""
+    
+    __slots__ = ('filhos', 'textos', 'atributos', '_tags')
+    
+    def __init__(self):
+        self.filhos = {}
+        self.textos = []
+        self.atributos = []
+        self._tags = {}
+    
+    def filhos_com_tag(self, prefixo):
+        """Retorna (filhos, grupos) com as tags já qualificadas pelo namespace
+        
+        filhos são buscados pela tag exata; grupos (segmentos terminados em
+        '*', ex.: ICMS*) pelo primeiro filho cuja tag começa com o segmento.
+        """
+        tags = self._tags.get(prefixo)
+        if tags is None:
+            filhos = [(prefixo + segmento, filho) for segmento, filho in self.filhos.items()
+                      if not segmento.endswith('*')]
+            grupos = [(prefixo + segmento[:-1], filho) for segmento, filho in self.filhos.items()
+                      if segmento.endswith('*')]
+            tags = self._tags[prefixo] = (filhos, grupos)
+        return tags
+
+class PlanoExtracao:
+    """Plano de extração compilado a partir dos paths dos campos selecionados
+    
+    Os paths são organizados em uma árvore de prefixos, de modo que trechos
+    comuns (ex.: emit/enderEmit, total/ICMSTot) são percorridos uma única vez,
+    sempre por filhos diretos do elemento de origem.
+    
+    Um segmento terminado em '*' casa com o primeiro filho cuja tag começa
+    com ele: imposto/ICMS/ICMS*/vBC lê o grupo de ICMS da nota, seja ICMS00,
+    ICMS10 ou ICMSSN102, e todos os campos do grupo saem da mesma visita.
+    """
+    
+    def __init__(self, campos_ids, campos_config):
+        self.raiz = _NoPlano()
+        self.campos = []
+        self.total_slots = 0
+        self.paths = []
+        self._xpaths = {}
+        self._xslts = {}
+        
+        for campo_id in campos_ids:
+            if campo_id not in campos_config:
+                continue
+            config = campos_config[campo_id]
+            
+            # Caminhos alternativos (CNPJ|CPF) ocupam um slot cada
+            slots = [self._registrar(path) for path in config['path'].split('|')]
+            self.campos.append((campo_id, config['label'], config['tipo'], slots))
+    
+    def _registrar(self, path):
+        """Insere um path na árvore e retorna o slot do seu valor"""
+        slot = self.total_slots
+        self.total_slots += 1
+        self.paths.append(path)
+        
+        *segmentos, ultimo = path.split('/')
+        no = self.raiz
+        for segmento in segmentos:
+            no = no.filhos.setdefault(segmento, _NoPlano())
+        
+        if ultimo.startswith('@'):
+            no.atributos.append((ultimo[1:], slot))
+        else:
+            no.filhos.setdefault(ultimo, _NoPlano()).textos.append(slot)
+        
+        return slot
+    
+    def executar(self, element, prefixo=''):
+        """Executa o plano sobre o elemento e retorna (campo_id, label, tipo, valor)
+        
+        Elementos do lxml são consultados pelas expressões XPath compiladas;
+        os do ElementTree, pela árvore de prefixos. O resultado é o mesmo.
+        """
+        if _lxml_etree is not None and isinstance(element, _lxml_etree._Element):
+            valores = self._valores_xpath(element, prefixo)
+        else:
+            valores = [''] * self.total_slots
+            self._visitar(self.raiz, element, prefixo, valores)
+        
+        return self._resultado(valores)
+    
+    def executar_filhos(self, element, tag, prefixo=''):
+        """Executa o plano sobre cada filho direto do elemento com a tag (ex.: os det do infNFe)
+        
+        Retorna uma lista com o resultado de executar() de cada filho, na
+        ordem do documento. Com elementos do lxml, os valores de todos os
+        filhos saem de uma única transformação XSLT compilada do plano, em
+        vez de uma consulta XPath por filho e por grupo.
+        """
+        if _lxml_etree is not None and isinstance(element, _lxml_etree._Element):
+            linhas = self._valores_xslt(element, tag, prefixo)
+            if linhas is not None:
+                return [self._resultado(valores) for valores in linhas]
+        
+        return [self.executar(filho, prefixo) for filho in element.iterfind(prefixo + tag)]
+    
+    def _resultado(self, valores):
+        """Monta (campo_id, label, tipo, valor) com o primeiro slot preenchido de cada campo"""
+        resultado = []
+        for campo_id, label, tipo, slots in self.campos:
+            valor = ''
+            for slot in slots:
+                if valores[slot]:
+                    valor = valores[slot]
+                    break
+            resultado.append((campo_id, label, tipo, valor))
+        
+        return resultado
+    
+    def _valores_xpath(self, element, prefixo):
+        """Valores dos slots com uma avaliação XPath por consulta do plano"""
+        valores = [''] * self.total_slots
+        
+        for ancora, unica, por_slot, slots in self._xpaths_compilados(prefixo):
+            alvo = element
+            if ancora is not None:
+                encontrados = ancora(element)
+                if not encontrados:
+                    continue
+                alvo = encontrados[0]
+            
+            resultados = unica(alvo).split(_SEPARADOR_XPATH)
+            if len(resultados) != len(slots):
+                resultados = [xpath(alvo) for xpath in por_slot]
+            for slot, valor in zip(slots, resultados):
+                valores[slot] = valor
+        
+        return valores
+    
+    def _valores_xslt(self, element, tag, prefixo):
+        """Valores dos slots de cada filho com a tag, por uma transformação XSLT
+        
+        A saída traz o número de filhos e, para cada um, os valores dos
+        slots na ordem, cada um seguido de _SEPARADOR_XPATH, e
+        _SEPARADOR_ITENS ao fim do filho. Retorna None se algum valor
+        contiver um dos separadores.
+        """
+        chave = (prefixo, tag)
+        transformacao = self._xslts.get(chave)
+        if transformacao is None:
+            transformacao = self._xslts[chave] = self._compilar_xslt(tag, prefixo)
+        
+        total, _, corpo = str(transformacao(element)).partition(_SEPARADOR_ITENS)
+        total = int(total)
+        if (corpo.count(_SEPARADOR_ITENS) != total or
+                corpo.count(_SEPARADOR_XPATH) != total * self.total_slots):
+            return None
+        
+        return [item.split(_SEPARADOR_XPATH)[:-1] for item in corpo.split(_SEPARADOR_ITENS)[:-1]]
+    
+    def _compilar_xslt(self, tag, prefixo):
+        """Transformação XSLT que lê os slots de todos os filhos com a tag
+        
+        Cada âncora de grupo (ver _consultas) vira uma variável, localizada
+        uma vez por filho; os slots são lidos por value-of relativo a ela.
+        """
+        passo = 'n:{}' if prefixo else '{}'
+        variaveis = []
+        valores = [None] * self.total_slots
+        for indice, (ancora, itens) in enumerate(self._consultas(prefixo).items()):
+            if ancora is not None:
+                variaveis.append(f'<xsl:variable name="g{indice}" select={quoteattr(ancora)}/>')
+            for slot, relativo in itens:
+                if ancora is None:
+                    selecao = relativo
+                else:
+                    selecao = f'$g{indice}' if relativo == '.' else f'$g{indice}/{relativo}'
+                valores[slot] = (f'<xsl:value-of select={quoteattr(selecao)}/>'
+                                 f'<xsl:text>{_SEPARADOR_XPATH}</xsl:text>')
+        
+        namespace = f' xmlns:n={quoteattr(prefixo[1:-1])}' if prefixo else ''
+        filhos = quoteattr(f"*/{passo.format(tag)}")
+        folha = (
+            f'<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform"{namespace}>'
+            '<xsl:output method="text" encoding="UTF-8"/>'
+            '<xsl:template match="/">'
+            f'<xsl:value-of select="count({filhos[1:-1]})"/><xsl:text>{_SEPARADOR_ITENS}</xsl:text>'
+            f'<xsl:for-each select={filhos}>'
+            f'{"".join(variaveis)}{"".join(valores)}<xsl:text>{_SEPARADOR_ITENS}</xsl:text>'
+            '</xsl:for-each>'
+            '</xsl:template>'
+            '</xsl:stylesheet>'
+        )
+        return _lxml_etree.XSLT(_lxml_etree.XML(folha.encode('utf-8')))
+    
+    def _consultas(self, prefixo):
+        """Slots agrupados pela âncora: {ancora ou None: [(slot, caminho relativo)]}
+        
+        A âncora é o trecho do path até o último segmento de grupo (ex.:
+        imposto/ICMS/ICMS*); slots sem grupo ficam em None, relativos ao
+        próprio elemento. Cada passo pega o primeiro filho com a tag ([1]),
+        como find() no ElementTree.
+        """
+        passo = 'n:{}[1]' if prefixo else '{}[1]'
+        grupos = {}
+        for slot, path in enumerate(self.paths):
+            segmentos = path.split('/')
+            passos = [self._passo_xpath(segmento, passo, prefixo) for segmento in segmentos]
+            ultimo_grupo = max((posicao for posicao, segmento in enumerate(segmentos)
+                                if segmento.endswith('*')), default=-1)
+            ancora = '/'.join(passos[:ultimo_grupo + 1]) or None
+            relativo = '/'.join(passos[ultimo_grupo + 1:]) or '.'
+            grupos.setdefault(ancora, []).append((slot, relativo))
+        return grupos
+    
+    def _xpaths_compilados(self, prefixo):
+        """Consultas etree.XPath do plano, compiladas uma vez por namespace
+        
+        Os slots são agrupados pela âncora (ver _consultas), localizada uma
+        vez por elemento. Cada consulta é (ancora, unica, por_slot, slots):
+        por_slot tem uma expressão string() por slot, relativa à âncora, e
+        unica concatena todas com _SEPARADOR_XPATH; string() devolve o texto
+        ('' se ausente).
+        """
+        consultas = self._xpaths.get(prefixo)
+        if consultas is None:
+            namespaces = {'n': prefixo[1:-1]} if prefixo else None
+            
+            consultas = []
+            for ancora, itens in self._consultas(prefixo).items():
+                slots = [slot for slot, _ in itens]
+                expressoes = [f"string({relativo})" for _, relativo in itens]
+                por_slot = [_lxml_etree.XPath(expressao, namespaces=namespaces, smart_strings=False)
+                            for expressao in expressoes]
+                if len(expressoes) > 1:
+                    separador = f", '{_SEPARADOR_XPATH}', "
+                    unica = _lxml_etree.XPath(f"concat({separador.join(expressoes)})",
+                                              namespaces=namespaces, smart_strings=False)
+                else:
+                    unica = por_slot[0]
+                if ancora is not None:
+                    ancora = _lxml_etree.XPath(ancora, namespaces=namespaces)
+                consultas.append((ancora, unica, por_slot, slots))
+            
+            self._xpaths[prefixo] = consultas
+        return consultas
+    
+    def _passo_xpath(self, segmento, passo, prefixo):
+        """Passo XPath de um segmento de path (atributo, tag exata ou grupo)"""
+        if segmento.startswith('@'):
+            return segmento
+        if not segmento.endswith('*'):
+            return passo.format(segmento)
+        
+        inicio = f"starts-with(local-name(), '{segmento[:-1]}')"
+        if prefixo:
+            return f"n:*[{inicio}][1]"
+        return f"*[namespace-uri() = '' and {inicio}][1]"
+    
+    def _visitar(self, no, element, prefixo, valores):
+        """Preenche os slots do nó e desce pelos filhos encontrados"""
+        for nome, slot in no.atributos:
+            valores[slot] = element.get(nome, '')
+        for slot in no.textos:
+            valores[slot] = element.text or ''
+        
+        filhos, grupos = no.filhos_com_tag(prefixo)
+        for tag, filho in filhos:
+            sub = element.find(tag)
+            if sub is not None:
+                self._visitar(filho, sub, prefixo, valores)
+        
+        for inicio, filho in grupos:
+            for sub in element:
+                if sub.tag.startswith(inicio):
+                    self._visitar(filho, sub, prefixo, valores)
+                    break
 
 class NFeExtractor:
-    """Classe para extrair dados de XMLs NF-e"""
+    """Classe para extrair dados de XMLs NF-e
+    
+    Com formatar=True os valores saem tipados (float para moeda/numero,
+    datetime para data, só dígitos para CNPJ/CPF); a formatação brasileira
+    é aplicada apenas na exibição e na gravação. Com formatar=False os
+    valores saem como o texto original do XML.
+    
+    metricas, se informado (instrumentation.Metricas), acumula o tempo de
+    parse e de extração (que inclui a conversão de tipos) e conta notas,
+    itens e erros.
+    
+    backend escolhe o parser do modo não streaming: 'lxml' (pacote opcional,
+    com XPath e XSLT pré-compilados) ou 'etree' (xml.etree.ElementTree); o padrão é
+    lxml quando instalado. Os dois produzem o mesmo resultado. O modo
+    streaming e XMLs recebidos como str usam sempre o ElementTree.
+    """
     
-    def __init__(self, campos_selecionados_notas=None, campos_selecionados_produtos=None, formatar=True):
+    def __init__(self, campos_selecionados_notas=None, campos_selecionados_produtos=None, formatar=True,
+                 streaming=False, metricas=None, backend=None):
+        backend = _validar_backend(backend)
+        
         self.ns = XML_NAMESPACES
+        self.backend = backend
+        self._parser_lxml = _criar_parser_lxml() if backend == 'lxml' else None
+        self.metricas = metricas
         self.campos_notas = campos_selecionados_notas or []
         self.campos_produtos = campos_selecionados_produtos or []
         self.formatar = formatar
+        self.streaming = streaming
         
         # Cria dicionário unificado de campos
         self.campos_config_notas = {}
@@ -20,112 +380,392 @@ class NFeExtractor:
             self.campos_config_notas.update(categoria)
         
         self.campos_config_produtos = CAMPOS_PRODUTOS
+        
+        # Compila os paths selecionados uma única vez
+        self.plano_notas = PlanoExtracao(self.campos_notas, self.campos_config_notas)
+        self.plano_produtos = PlanoExtracao(self.campos_produtos, self.campos_config_produtos)
     
-    def _extrair_texto(self, element, path):
-        """Extrai texto de um elemento XML usando path"""
-        if element is None:
-            return ''
+    def assinatura(self):
+        """Identifica a configuração do extrator (campos, paths, tipos e formatação)
         
-        # Trata casos especiais
-        if path.startswith('@'):
-            # Atributo
-            attr_name = path[1:]
-            return element.get(attr_name, '').replace('NFe', '')
+        Dois extratores com a mesma assinatura produzem o mesmo resultado para
+        o mesmo XML, o que permite reaproveitar extrações em cache.
+        """
+        return json.dumps({
+            'versao': VERSAO_EXTRACAO,
+            'notas': [[campo_id, self.campos_config_notas[campo_id]] for campo_id in self.campos_notas
+                      if campo_id in self.campos_config_notas],
+            'produtos': [[campo_id, self.campos_config_produtos[campo_id]] for campo_id in self.campos_produtos
+                         if campo_id in self.campos_config_produtos],
+            'formatar': self.formatar,
+        }, sort_keys=True, ensure_ascii=False)
+    
+    def _localizar_inf_nfe(self, xml_content):
+        """Faz o parse do XML e retorna o elemento infNFe e o prefixo de namespace"""
+        if self._parser_lxml is not None and not isinstance(xml_content, str):
+            root = _lxml_etree.fromstring(xml_content, self._parser_lxml)
+        else:
+            root = ET.fromstring(xml_content)
         
-        # Trata múltiplos caminhos (CNPJ|CPF)
-        if '|' in path:
-            for p in path.split('|'):
-                result = self._extrair_texto(element, p)
-                if result:
-                    return result
-            return ''
+        # Resolve o namespace uma única vez a partir da raiz
+        prefixo = _prefixo_namespace(root.tag)
+        nome_raiz = root.tag[len(prefixo):]
         
-        # Busca com e sem namespace
-        found = element.find(f'.//nfe:{path}', self.ns)
-        if found is None:
-            found = element.find(f'.//{path}')
+        if nome_raiz == 'infNFe':
+            inf_nfe = root
+        elif nome_raiz == 'NFe':
+            inf_nfe = root.find(f'{prefixo}infNFe')
+        elif nome_raiz == 'nfeProc':
+            inf_nfe = root.find(f'{prefixo}NFe/{prefixo}infNFe')
+        else:
+            inf_nfe = None
         
-        return found.text if found is not None else ''
+        # Estruturas fora do padrão: busca em toda a árvore
+        if inf_nfe is None:
+            inf_nfe = root.find('.//nfe:infNFe', self.ns)
+            if inf_nfe is None:
+                inf_nfe = root.find('.//infNFe')
+            if inf_nfe is None:
+                return None, ''
+            prefixo = _prefixo_namespace(inf_nfe.tag)
+        
+        return inf_nfe, prefixo
     
-    def extrair_dados_nota(self, xml_content, arquivo_nome=''):
-        """Extrai dados da nota fiscal"""
-        try:
-            root = ET.fromstring(xml_content)
-            inf_nfe = root.find('.//nfe:infNFe', self.ns) or root.find('.//infNFe')
+    def _dados_de_inf_nfe(self, inf_nfe, prefixo, arquivo_nome):
+        """Monta o registro da nota a partir do infNFe já localizado"""
+        dados = {'Arquivo': arquivo_nome}
+        
+        for campo_id, label, tipo, valor in self.plano_notas.executar(inf_nfe, prefixo):
+            # Tratamento especial para chave
+            if campo_id == 'chave':
+                valor = limpar_chave_nfe(valor)
             
-            if inf_nfe is None:
-                return None
+            # Converte para o tipo do campo se habilitado
+            if self.formatar:
+                valor = converter_valor(valor, tipo)
             
-            dados = {'Arquivo': arquivo_nome}
+            dados[label] = valor
+        
+        return dados
+    
+    def _referencias_nota(self, dados_nota):
+        """Colunas de referência à nota repetidas em cada produto"""
+        referencias = {}
+        if 'Número NF' in dados_nota:
+            referencias['NF Número'] = dados_nota['Número NF']
+        if 'Chave de Acesso' in dados_nota:
+            referencias['NF Chave'] = dados_nota['Chave de Acesso']
+        referencias['Arquivo'] = dados_nota.get('Arquivo', '')
+        return referencias
+    
+    def _linha_produto(self, campos, referencias):
+        """Monta a linha de um produto a partir do resultado do plano sobre o seu det"""
+        produto = dict(referencias)
+        
+        # Extrai campos selecionados
+        for campo_id, label, tipo, valor in campos:
+            # Converte para o tipo do campo se habilitado
+            if self.formatar:
+                valor = converter_valor(valor, tipo)
             
-            # Extrai campos selecionados
-            for campo_id in self.campos_notas:
-                if campo_id in self.campos_config_notas:
-                    config = self.campos_config_notas[campo_id]
-                    label = config['label']
-                    path = config['path']
-                    tipo = config['tipo']
-                    
-                    # Tratamento especial para chave
-                    if campo_id == 'chave':
-                        valor = limpar_chave_nfe(inf_nfe.get('Id', ''))
-                    else:
-                        valor = self._extrair_texto(inf_nfe, path)
-                    
-                    # Aplica formatação se habilitado
-                    if self.formatar:
-                        valor = aplicar_formatacao(valor, tipo)
-                    
-                    dados[label] = valor
+            produto[label] = valor
+        
+        return produto
+    
+    def _produtos_de_inf_nfe(self, inf_nfe, prefixo, dados_nota):
+        """Monta as linhas de produtos a partir do infNFe já localizado"""
+        referencias = self._referencias_nota(dados_nota)
+        return [self._linha_produto(campos, referencias)
+                for campos in self.plano_produtos.executar_filhos(inf_nfe, 'det', prefixo)]
+    
+    def iterar_nota_streaming(self, fonte, arquivo_nome=''):
+        """Extrai a nota com parse incremental, sem manter a árvore inteira em memória
+        
+        fonte pode ser bytes ou um objeto de arquivo. Gera ('produto', linha) à
+        medida que cada det é fechado (o elemento é descartado em seguida) e,
+        ao final do infNFe, ('nota', dados_nota). Não gera nada se o XML não
+        contiver infNFe.
+        """
+        if isinstance(fonte, (bytes, bytearray, memoryview)):
+            fonte = BytesIO(fonte)
+        
+        # Só os filhos diretos do infNFe usados pelo plano de notas são mantidos
+        segmentos_nota = set(self.plano_notas.raiz.filhos)
+        extrair_produtos = bool(self.plano_produtos.campos)
+        
+        inf_nfe = None
+        prefixo = ''
+        nivel_inf = 0
+        nivel = 0
+        referencias = None
+        concluida = False
+        
+        for evento, elem in ET.iterparse(fonte, events=('start', 'end')):
+            if evento == 'start':
+                nivel += 1
+                if inf_nfe is None and elem.tag.endswith('infNFe'):
+                    prefixo = _prefixo_namespace(elem.tag)
+                    if elem.tag == f'{prefixo}infNFe':
+                        inf_nfe = elem
+                        nivel_inf = nivel
+                continue
             
-            return dados
+            nivel -= 1
             
-        except Exception as e:
-            print(f"Erro ao processar XML: {str(e)}")
-            return None
-    
-    def extrair_produtos(self, xml_content, dados_nota):
-        """Extrai produtos da nota fiscal"""
-        try:
-            root = ET.fromstring(xml_content)
-            inf_nfe = root.find('.//nfe:infNFe', self.ns) or root.find('.//infNFe')
+            if elem is inf_nfe:
+                yield 'nota', self._dados_de_inf_nfe(inf_nfe, prefixo, arquivo_nome)
+                inf_nfe.clear()
+                concluida = True
+                continue
             
-            if inf_nfe is None:
-                return []
+            if inf_nfe is None or concluida:
+                # Fora do infNFe (Signature, protNFe...): nada a reter
+                elem.clear()
+                continue
             
-            produtos = []
-            dets = inf_nfe.findall('.//nfe:det', self.ns) or inf_nfe.findall('.//det')
+            if nivel != nivel_inf:
+                continue
             
-            for det in dets:
-                produto = {}
-                
-                # Adiciona referência à nota
-                if 'Número NF' in dados_nota:
-                    produto['NF Número'] = dados_nota['Número NF']
-                if 'Chave de Acesso' in dados_nota:
-                    produto['NF Chave'] = dados_nota['Chave de Acesso']
-                produto['Arquivo'] = dados_nota.get('Arquivo', '')
-                
-                # Extrai campos selecionados
-                for campo_id in self.campos_produtos:
-                    if campo_id in self.campos_config_produtos:
-                        config = self.campos_config_produtos[campo_id]
-                        label = config['label']
-                        path = config['path']
-                        tipo = config['tipo']
-                        
-                        valor = self._extrair_texto(det, path)
-                        
-                        # Aplica formatação se habilitado
-                        if self.formatar:
-                            valor = aplicar_formatacao(valor, tipo)
-                        
-                        produto[label] = valor
+            # Filho direto do infNFe concluído
+            if elem.tag == f'{prefixo}det':
+                if extrair_produtos:
+                    if referencias is None:
+                        # ide e o atributo Id precedem os det no leiaute da NF-e
+                        dados_parciais = self._dados_de_inf_nfe(inf_nfe, prefixo, arquivo_nome)
+                        referencias = self._referencias_nota(dados_parciais)
+                    yield 'produto', self._linha_produto(self.plano_produtos.executar(elem, prefixo), referencias)
+                inf_nfe.remove(elem)
+            elif elem.tag[len(prefixo):] not in segmentos_nota:
+                inf_nfe.remove(elem)
+    
+    def _extrair_nota_streaming(self, fonte, arquivo_nome):
+        """Coleta a saída de iterar_nota_streaming em (dados_nota, produtos)"""
+        dados = None
+        produtos = []
+        
+        for tipo, registro in self.iterar_nota_streaming(fonte, arquivo_nome):
+            if tipo == 'produto':
+                produtos.append(registro)
+            else:
+                dados = registro
+        
+        return dados, produtos
+    
+    def extrair_nota_completa(self, xml_content, arquivo_nome=''):
+        """Extrai dados da nota e produtos com um único parse do XML
+        
+        Retorna a tupla (dados_nota, produtos). dados_nota é None quando o
+        XML não contém infNFe; erros de parse ou de extração são registrados
+        em metricas e propagados ao chamador. Com streaming=True
+        o parse é incremental (ver iterar_nota_streaming) e xml_content pode
+        ser também um objeto de arquivo.
+        """
+        etapa = 'parse_streaming' if self.streaming else 'parse'
+        inicio = perf_counter()
+        try:
+            if self.streaming:
+                dados, produtos = self._extrair_nota_streaming(xml_content, arquivo_nome)
+                fim_parse = perf_counter()
+            else:
+                inf_nfe, prefixo = self._localizar_inf_nfe(xml_content)
+                fim_parse = perf_counter()
                 
-                produtos.append(produto)
+                if inf_nfe is None:
+                    dados, produtos = None, []
+                else:
+                    etapa = 'extracao'
+                    dados = self._dados_de_inf_nfe(inf_nfe, prefixo, arquivo_nome)
+                    
+                    # Sem campos de produto selecionados não há por que percorrer os det
+                    if self.campos_produtos:
+                        produtos = self._produtos_de_inf_nfe(inf_nfe, prefixo, dados)
+                    else:
+                        produtos = []
+        
+        except Exception:
+            if self.metricas is not None:
+                self.metricas.erro(etapa)
+            raise
+        
+        if self.metricas is not None:
+            self._registrar_metricas(inicio, fim_parse, dados, produtos)
+        
+        return dados, produtos
+    
+    def _registrar_metricas(self, inicio, fim_parse, dados, produtos):
+        """Acumula tempos e contadores de uma nota em self.metricas"""
+        fim = perf_counter()
+        if self.streaming:
+            # No modo streaming parse e extração são intercalados
+            self.metricas.registrar('parse_streaming', fim - inicio)
+        else:
+            self.metricas.registrar('parse', fim_parse - inicio)
+            if dados is not None:
+                self.metricas.registrar('extracao', fim - fim_parse)
+        
+        if dados is None:
+            self.metricas.contar('xmls_sem_nfe')
+        else:
+            self.metricas.contar('notas')
+            self.metricas.contar('itens', len(produtos))
+    
+    def extrair_dados_nota(self, xml_content, arquivo_nome=''):
+        """Extrai dados da nota fiscal; None se o XML não contém infNFe"""
+        inf_nfe, prefixo = self._localizar_inf_nfe(xml_content)
+        
+        if inf_nfe is None:
+            return None
+        
+        return self._dados_de_inf_nfe(inf_nfe, prefixo, arquivo_nome)
+    
+    def extrair_produtos(self, xml_content, dados_nota):
+        """Extrai produtos da nota fiscal; lista vazia se o XML não contém infNFe"""
+        inf_nfe, prefixo = self._localizar_inf_nfe(xml_content)
+        
+        if inf_nfe is None:
+            return []
+        
+        return self._produtos_de_inf_nfe(inf_nfe, prefixo, dados_nota)
+
+class _ExtratorDocumento(ABC):
+    """Base dos extratores de documentos com um registro por XML (CT-e e eventos)
+    
+    Os valores saem tipados com formatar=True, como no NFeExtractor, e o
+    parse usa o mesmo backend. metricas, se informado, acumula o tempo de
+    parse e de extração e conta os documentos em self.contador.
+    """
+    
+    contador = 'documentos'
+    prefixo_chave = ''
+    
+    def __init__(self, formatar=True, metricas=None, backend=None):
+        backend = _validar_backend(backend)
+        self.backend = backend
+        self._parser_lxml = _criar_parser_lxml() if backend == 'lxml' else None
+        self.formatar = formatar
+        self.metricas = metricas
+    
+    def _parse(self, xml_content):
+        """Faz o parse do XML e retorna a raiz e o prefixo de namespace"""
+        if self._parser_lxml is not None and not isinstance(xml_content, str):
+            root = _lxml_etree.fromstring(xml_content, self._parser_lxml)
+        else:
+            root = ET.fromstring(xml_content)
+        return root, _prefixo_namespace(root.tag)
+    
+    def _preencher(self, registro, plano, element, prefixo):
+        """Acrescenta ao registro os campos do plano lidos do elemento"""
+        for campo_id, label, tipo, valor in plano.executar(element, prefixo):
+            if campo_id == 'chave' and self.prefixo_chave and valor.startswith(self.prefixo_chave):
+                valor = valor[len(self.prefixo_chave):]
             
-            return produtos
+            if self.formatar:
+                valor = converter_valor(valor, tipo)
             
-        except Exception as e:
-            print(f"Erro ao processar produtos: {str(e)}")
-            return []
\ No newline at end of file
+            registro[label] = valor
+    
+    @abstractmethod
+    def _registro(self, root, prefixo, arquivo_nome):
+        """Monta o registro do documento, ou retorna None se não houver dados"""
+    
+    def extrair(self, xml_content, arquivo_nome=''):
+        """Extrai o registro do documento; None se não houver dados
+        
+        Erros de parse ou de extração são registrados em metricas e
+        propagados ao chamador.
+        """
+        etapa = 'parse'
+        inicio = perf_counter()
+        try:
+            root, prefixo = self._parse(xml_content)
+            fim_parse = perf_counter()
+            etapa = 'extracao'
+            registro = self._registro(root, prefixo, arquivo_nome)
+        
+        except Exception:
+            if self.metricas is not None:
+                self.metricas.erro(etapa)
+            raise
+        
+        if self.metricas is not None:
+            self.metricas.registrar('parse', fim_parse - inicio)
+            self.metricas.registrar('extracao', perf_counter() - fim_parse)
+            self.metricas.contar(self.contador if registro is not None else 'xmls_sem_dados')
+        
+        return registro
+
+class CTeExtractor(_ExtratorDocumento):
+    """Extrai um registro por CT-e (infCte), com os campos de CAMPOS_CTE"""
+    
+    contador = 'ctes'
+    prefixo_chave = 'CTe'
+    
+    def __init__(self, campos=None, formatar=True, metricas=None, backend=None):
+        super().__init__(formatar, metricas, backend)
+        self.campos = list(CAMPOS_CTE) if campos is None else campos
+        self.plano = PlanoExtracao(self.campos, CAMPOS_CTE)
+    
+    def _registro(self, root, prefixo, arquivo_nome):
+        # cteProc/CTe/infCte, CTe/infCte, cteOSProc/CTeOS/infCte...
+        if root.tag == f'{prefixo}infCte':
+            inf_cte = root
+        else:
+            inf_cte = root.find(f'.//{prefixo}infCte')
+        if inf_cte is None:
+            return None
+        
+        registro = {'Arquivo': arquivo_nome}
+        self._preencher(registro, self.plano, inf_cte, prefixo)
+        return registro
+
+class EventoExtractor(_ExtratorDocumento):
+    """Extrai um registro por evento de NF-e ou CT-e (cancelamento, carta de correção...)
+    
+    Os campos de CAMPOS_EVENTO vêm do infEvento do evento; os de
+    CAMPOS_RETORNO_EVENTO, do infEvento do retorno (retEvento), presente
+    quando o evento vem dentro de um procEventoNFe/procEventoCTe.
+    """
+    
+    contador = 'eventos'
+    
+    def __init__(self, formatar=True, metricas=None, backend=None):
+        super().__init__(formatar, metricas, backend)
+        self.plano = PlanoExtracao(list(CAMPOS_EVENTO), CAMPOS_EVENTO)
+        self.plano_retorno = PlanoExtracao(list(CAMPOS_RETORNO_EVENTO), CAMPOS_RETORNO_EVENTO)
+    
+    def _localizar(self, root, prefixo):
+        """Retorna (infEvento do evento, infEvento do retorno ou None)"""
+        nome_raiz = root.tag[len(prefixo):]
+        if nome_raiz == 'infEvento':
+            return root, None
+        if nome_raiz.startswith('evento'):
+            return root.find(f'{prefixo}infEvento'), None
+        
+        inf_evento = None
+        retorno = None
+        for filho in root:
+            nome = filho.tag[len(prefixo):] if isinstance(filho.tag, str) else ''
+            if inf_evento is None and nome.startswith('evento'):
+                inf_evento = filho.find(f'{prefixo}infEvento')
+            elif retorno is None and nome.startswith('retEvento'):
+                retorno = filho.find(f'{prefixo}infEvento')
+        
+        if inf_evento is None:
+            inf_evento = root.find(f'.//{prefixo}infEvento')
+        return inf_evento, retorno
+    
+    def _registro(self, root, prefixo, arquivo_nome):
+        inf_evento, retorno = self._localizar(root, prefixo)
+        if inf_evento is None:
+            return None
+        
+        registro = {'Arquivo': arquivo_nome}
+        self._preencher(registro, self.plano, inf_evento, prefixo)
+        
+        # Sem retorno as colunas existem, vazias, para manter o formato da tabela
+        if retorno is None:
+            for _, label, _, _ in self.plano_retorno.campos:
+                registro[label] = None if self.formatar else ''
+        else:
+            self._preencher(registro, self.plano_retorno, retorno, prefixo)
+        return registro
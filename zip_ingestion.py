@@ -0,0 +1,141 @@
+# zip_ingestion.py
+"""Leitura de arquivos ZIP com uso de memória limitado
+
+Uploads grandes são copiados em blocos para um arquivo temporário em disco
+e o ZIP é lido por mmap: as páginas ficam no cache do sistema operacional,
+não na memória do processo, e cada membro só é descompactado quando o
+extrator o pede.
+"""
+
+import mmap
+import os
+import shutil
+import tempfile
+import zipfile
+
+# Uploads até este tamanho são lidos direto da memória, sem cópia em disco
+LIMITE_UPLOAD_EM_MEMORIA = 32 * 1024 * 1024
+
+# Tamanho dos blocos copiados do upload para o arquivo temporário
+TAMANHO_BLOCO_COPIA = 1024 * 1024
+
+class _LeitorMapeado:
+    """Interface de arquivo (read/seek/tell) sobre um mmap, como o zipfile espera"""
+    
+    def __init__(self, mapa):
+        self._mapa = mapa
+    
+    def read(self, tamanho=-1):
+        return self._mapa.read(tamanho if tamanho is not None and tamanho >= 0 else None)
+    
+    def seek(self, posicao, origem=os.SEEK_SET):
+        self._mapa.seek(posicao, origem)
+        return self._mapa.tell()
+    
+    def tell(self):
+        return self._mapa.tell()
+    
+    def seekable(self):
+        return True
+
+def _tamanho_upload(arquivo):
+    """Tamanho em bytes de um objeto de arquivo, sem lê-lo"""
+    tamanho = getattr(arquivo, 'size', None)
+    if tamanho is not None:
+        return tamanho
+    
+    posicao = arquivo.tell()
+    arquivo.seek(0, os.SEEK_END)
+    tamanho = arquivo.tell()
+    arquivo.seek(posicao)
+    return tamanho
+
+class ZipMapeado:
+    """ZIP aberto a partir de um caminho ou upload, lido por mmap quando está em disco
+    
+    origem pode ser um caminho ou um objeto de arquivo (como o UploadedFile
+    do Streamlit). Objetos maiores que limite_memoria são copiados em blocos
+    para um arquivo temporário, removido em fechar(). caminho fica com o
+    arquivo em disco usado (ou None, se o ZIP foi lido da memória), o que
+    permite a outros processos abrir o mesmo ZIP sem receber os bytes.
+    """
+    
+    def __init__(self, origem, limite_memoria=LIMITE_UPLOAD_EM_MEMORIA):
+        self.caminho = None
+        self._temporario = False
+        self._arquivo = None
+        self._mapa = None
+        
+        if isinstance(origem, (str, os.PathLike)):
+            self.caminho = os.fspath(origem)
+        elif _tamanho_upload(origem) > limite_memoria:
+            self.caminho = self._copiar_para_disco(origem)
+            self._temporario = True
+        
+        try:
+            fonte = origem
+            if self.caminho is not None:
+                self._arquivo = open(self.caminho, 'rb')
+                fonte = self._arquivo
+                # mmap não aceita arquivos vazios; o zipfile reporta o erro
+                if os.fstat(self._arquivo.fileno()).st_size:
+                    self._mapa = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+                    fonte = _LeitorMapeado(self._mapa)
+            
+            self.zip = zipfile.ZipFile(fonte, 'r')
+        except Exception:
+            self.fechar()
+            raise
+    
+    @staticmethod
+    def _copiar_para_disco(arquivo):
+        """Copia o upload em blocos para um arquivo temporário e retorna o caminho"""
+        arquivo.seek(0)
+        with tempfile.NamedTemporaryFile(prefix='nfe_upload_', suffix='.zip', delete=False) as destino:
+            shutil.copyfileobj(arquivo, destino, TAMANHO_BLOCO_COPIA)
+            return destino.name
+    
+    def membros_xml(self):
+        """Nomes dos membros .xml, na ordem do ZIP"""
+        return [nome for nome in self.zip.namelist() if nome.endswith('.xml')]
+    
+    def tamanho(self, nome):
+        """Tamanho descompactado de um membro"""
+        return self.zip.getinfo(nome).file_size
+    
+    def abrir(self, nome):
+        """Abre um membro para leitura incremental (descompacta conforme é lido)"""
+        return self.zip.open(nome)
+    
+    def ler(self, nome):
+        """Descompacta um membro inteiro"""
+        return self.zip.read(nome)
+    
+    def ler_inicio(self, nome, tamanho):
+        """Descompacta só os primeiros bytes de um membro"""
+        with self.zip.open(nome) as membro:
+            return membro.read(tamanho)
+    
+    def fechar(self):
+        """Fecha o ZIP e remove a cópia temporária, se houver"""
+        if getattr(self, 'zip', None) is not None:
+            self.zip.close()
+            self.zip = None
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+        if self._temporario:
+            try:
+                os.remove(self.caminho)
+            except OSError:
+                pass
+            self._temporario = False
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.fechar()